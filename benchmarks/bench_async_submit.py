@@ -0,0 +1,124 @@
+"""
+Teste de carga do POST /api/survey/{code}/submit: endpoint async (AsyncSession)
+versus a implementacao sync anterior (Session no threadpool do Starlette).
+
+Roda a aplicacao em processo via httpx.ASGITransport com C requisicoes simultaneas.
+A rota sync de referencia e registrada apenas neste script. O ganho aparece
+sobretudo com latencia de rede ate o banco (use --database-url com PostgreSQL);
+no SQLite local as escritas sao serializadas pelo proprio arquivo e, sem o limite
+de threads, os escritores simultaneos apenas disputam o lock do arquivo.
+
+Uso:
+    python benchmarks/bench_async_submit.py [--requests 2000] [--concurrency 200]
+                                            [--database-url postgresql://...]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--database-url", default=None)
+    return parser.parse_args()
+
+
+args = _parse_args()
+os.environ["TEST_DATABASE_URL"] = args.database_url or (
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='fluir_bench_'), 'bench.db')}"
+)
+
+import httpx  # noqa: E402
+from fastapi import Depends, HTTPException  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import main  # noqa: E402
+from database import (  # noqa: E402
+    SessionLocal, Survey, Respondent, async_engine, engine, generate_code, generate_uuid, get_db,
+    pack_answers, record_answers, record_respondents, reset_generated_recommendations,
+)
+
+RESPONSES = {str(i): (i % 5) + 1 for i in range(1, 42)}
+
+
+@main.app.post("/bench/sync-submit/{code}")
+def sync_submit(code: str, body: main.SubmitAnswers, db: Session = Depends(get_db)):
+    """Caminho sync anterior ao async, com as mesmas escritas do endpoint async no threadpool."""
+    survey = db.query(Survey).filter(Survey.code == code, Survey.is_active == True).first()
+    if not survey:
+        raise HTTPException(404)
+    if not record_respondents(db, survey.id, 1, only_active=True):
+        db.rollback()
+        raise HTTPException(404)
+    display_id = f"R{uuid.uuid4().hex[:8]}"
+    answers = pack_answers(body.responses)
+    db.add(Respondent(id=generate_uuid(), survey_id=survey.id, display_id=display_id, answers=answers))
+    record_answers(db, survey.id, answers)
+    reset_generated_recommendations(db, survey.id)
+    db.commit()
+    return {"ok": True, "display_id": display_id}
+
+
+def _new_survey() -> str:
+    db = SessionLocal()
+    try:
+        s = Survey(code=generate_code(), company_name="Bench", admin_code="bench")
+        db.add(s)
+        db.commit()
+        return s.code
+    finally:
+        db.close()
+
+
+async def run(label: str, url: str):
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(args.concurrency)
+    # Erros da aplicacao viram respostas 500 contadas como erro, sem abortar a rodada
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one():
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post(url, json={"responses": RESPONSES})
+                except Exception:
+                    errors += 1
+                    return
+                if r.status_code == 200:
+                    latencies.append(time.perf_counter() - t0)
+                else:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - t0
+    await async_engine.dispose()
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float("nan")
+
+    print(f"{label:<14}{len(latencies) / elapsed:>10.0f}{pct(0.50):>10.1f}{pct(0.99):>10.1f}{errors:>8}")
+
+
+def main_():
+    print(f"{args.requests} submissoes, {args.concurrency} simultaneas ({engine.url.drivername})\n")
+    print(f"{'endpoint':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'erros':>8}")
+    asyncio.run(run("sync", f"/bench/sync-submit/{_new_survey()}"))
+    asyncio.run(run("async", f"/api/survey/{_new_survey()}/submit"))
+
+
+if __name__ == "__main__":
+    main_()
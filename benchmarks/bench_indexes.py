@@ -0,0 +1,123 @@
+"""
+Benchmark dos indices quentes (migracao 1).
+
+Semeia um SQLite temporario com N respondentes (padrao 100k) distribuidos em varias
+pesquisas e mede as consultas de dashboard/paginacao, login e recomendacoes
+sem os indices e depois de run_migrations.
+
+Uso:
+    python benchmarks/bench_indexes.py [--respondents 100000] [--surveys 50] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmpdir = tempfile.mkdtemp(prefix="fluir_bench_")
+os.environ["TEST_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from sqlalchemy import text  # noqa: E402
+
+from database import Base, engine, Survey, Respondent, Recommendation, SchemaVersion, generate_uuid  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+QUERIES = {
+    "dashboard (respondentes da pesquisa, ordenados)": (
+        "SELECT id, answers FROM respondents WHERE survey_id = :sid ORDER BY submitted_at, id"
+    ),
+    "paginacao (keyset, 100 linhas)": (
+        "SELECT id FROM respondents WHERE survey_id = :sid AND submitted_at > :after "
+        "ORDER BY submitted_at, id LIMIT 100"
+    ),
+    "login (pesquisas do admin)": "SELECT id FROM surveys WHERE admin_code = :admin",
+    "recomendacoes (ordenadas)": (
+        "SELECT id FROM recommendations WHERE survey_id = :sid ORDER BY order_index"
+    ),
+}
+
+
+def seed(n_respondents: int, n_surveys: int):
+    rnd = random.Random(42)
+    # Tabelas sem os indices declarados nos models: simula banco anterior a migracao
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for name in ("ix_respondents_survey_submitted", "ix_surveys_admin_code", "ix_recommendations_survey_order"):
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    now = datetime.now(timezone.utc)
+    survey_ids = [generate_uuid() for _ in range(n_surveys)]
+    with engine.begin() as conn:
+        conn.execute(Survey.__table__.insert(), [
+            {"id": sid, "code": f"B{i:07d}", "company_name": f"Empresa {i}", "admin_code": f"admin{i % 10}",
+             "is_active": True, "data_version": 0, "respondent_count": 0}
+            for i, sid in enumerate(survey_ids)
+        ])
+        conn.execute(Recommendation.__table__.insert(), [
+            {"id": generate_uuid(), "survey_id": sid, "dimension_ids": "[]", "priority": "media",
+             "title": f"Rec {j}", "description": "", "is_custom": False, "order_index": j}
+            for sid in survey_ids for j in range(8)
+        ])
+        batch = []
+        for i in range(n_respondents):
+            batch.append({
+                "id": generate_uuid(), "survey_id": rnd.choice(survey_ids), "display_id": f"R{i}",
+                "answers": bytes(rnd.randint(1, 5) for _ in range(41)),
+                "submitted_at": now - timedelta(seconds=rnd.randint(0, 86400 * 90)),
+            })
+            if len(batch) == 5000:
+                conn.execute(Respondent.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(Respondent.__table__.insert(), batch)
+    return survey_ids
+
+
+def measure(survey_ids, repeat: int) -> dict:
+    rnd = random.Random(7)
+    after = datetime.now(timezone.utc) - timedelta(days=45)
+    results = {}
+    with engine.connect() as conn:
+        for label, sql in QUERIES.items():
+            timings = []
+            for _ in range(repeat):
+                params = {"sid": rnd.choice(survey_ids), "after": after, "admin": f"admin{rnd.randint(0, 9)}"}
+                t0 = time.perf_counter()
+                conn.execute(text(sql), params).all()
+                timings.append(time.perf_counter() - t0)
+            timings.sort()
+            results[label] = timings[len(timings) // 2] * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--respondents", type=int, default=100_000)
+    parser.add_argument("--surveys", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"Semeando {args.respondents} respondentes em {args.surveys} pesquisas ({engine.url})...")
+    survey_ids = seed(args.respondents, args.surveys)
+
+    before = measure(survey_ids, args.repeat)
+    SchemaVersion.__table__.create(engine, checkfirst=True)
+    t0 = time.perf_counter()
+    run_migrations(engine)
+    migrate_s = time.perf_counter() - t0
+    after = measure(survey_ids, args.repeat)
+
+    print(f"Migracoes aplicadas em {migrate_s:.2f}s\n")
+    print(f"{'consulta':<52}{'antes (ms)':>12}{'depois (ms)':>13}{'ganho':>9}")
+    for label in QUERIES:
+        speedup = before[label] / after[label] if after[label] else float("inf")
+        print(f"{label:<52}{before[label]:>12.2f}{after[label]:>13.2f}{speedup:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark das submissoes em rajada: caminho atual (commit por requisicao)
+versus group commit (submission_buffer).
+
+Dispara N submissoes com C requisicoes simultaneas contra o endpoint real
+POST /api/survey/{code}/submit (aplicacao em processo via httpx.ASGITransport),
+mede vazao e latencias e confere no banco que todas as aceitas foram gravadas.
+
+Uso:
+    python benchmarks/bench_submissions.py [--submissions 2000] [--concurrency 64]
+                                           [--database-url postgresql://...]
+Sem --database-url usa um SQLite temporario.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--database-url", default=None)
+    return parser.parse_args()
+
+
+args = _parse_args()
+os.environ["TEST_DATABASE_URL"] = args.database_url or (
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='fluir_bench_'), 'bench.db')}"
+)
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+import submission_buffer  # noqa: E402
+from database import init_db, SessionLocal, Survey, Respondent, async_engine, generate_code, engine  # noqa: E402
+
+RESPONSES = {str(i): (i % 5) + 1 for i in range(1, 42)}
+
+
+def _new_survey() -> Survey:
+    db = SessionLocal()
+    try:
+        s = Survey(code=generate_code(), company_name="Bench", admin_code="bench")
+        db.add(s)
+        db.commit()
+        db.refresh(s)
+        return s
+    finally:
+        db.close()
+
+
+def _rows(survey_id: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(Respondent).filter(Respondent.survey_id == survey_id).count()
+    finally:
+        db.close()
+
+
+async def _burst(code: str):
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one():
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post(f"/api/survey/{code}/submit", json={"responses": RESPONSES})
+                except Exception:
+                    errors += 1
+                    return
+                if r.status_code == 200:
+                    latencies.append(time.perf_counter() - t0)
+                else:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.submissions)))
+        elapsed = time.perf_counter() - t0
+    # Cada asyncio.run tem o seu loop: conexoes async nao passam de uma rodada para outra
+    await async_engine.dispose()
+    return latencies, errors, elapsed
+
+
+def run(label: str, batching: bool) -> bool:
+    submission_buffer.ENABLED = batching
+    survey = _new_survey()
+    batches_before = submission_buffer.stats()["batches"]
+    latencies, errors, elapsed = asyncio.run(_burst(survey.code))
+    latencies.sort()
+    rows = _rows(survey.id)
+    batches = submission_buffer.stats()["batches"] - batches_before
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float("nan")
+
+    print(f"{label:<22}{len(latencies) / elapsed:>10.0f}{pct(0.50):>10.1f}{pct(0.99):>10.1f}{errors:>8}"
+          f"{rows:>8}{batches:>8}")
+    ok = rows == len(latencies) and (batches > 0) == (batching and rows > 0)
+    if not ok:
+        print(f"  ATENCAO: {len(latencies)} aceitas, {rows} linhas gravadas, {batches} lotes")
+    return ok
+
+
+def main_():
+    init_db()
+    print(f"{args.submissions} submissoes, {args.concurrency} concorrentes ({engine.url.drivername})\n")
+    print(f"{'modo':<22}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'erros':>8}{'linhas':>8}{'lotes':>8}")
+    ok = run("commit por requisicao", batching=False)
+    ok = run("group commit", batching=True) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,69 @@
+"""
+Gerador deterministico de dados sinteticos para benchmarks.
+
+Cada respondente tem um fator latente de bem-estar; questoes de dimensoes de risco
+tendem a notas altas quando o bem-estar e baixo, as de protecao ao contrario, com
+vies por questao e ruido. Mesma semente -> mesmas respostas (em qualquer maquina).
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from copsoq_data import QUESTIONS, DIMENSIONS  # noqa: E402
+from copsoq_calculator import QUESTION_IDS  # noqa: E402
+
+INSERT_BATCH = 5000
+
+
+def answer_matrix(n: int, seed: int = 0) -> np.ndarray:
+    """Matriz N x 41 uint8 (1..5) na ordem de QUESTION_IDS."""
+    rng = np.random.default_rng(seed)
+    is_risk = np.array([DIMENSIONS[QUESTIONS[q]["dimension"]]["type"] == "risk" for q in QUESTION_IDS])
+    direction = np.where(is_risk, -1.0, 1.0)
+    bias = rng.normal(0.0, 0.35, size=len(QUESTION_IDS))
+    wellbeing = rng.normal(0.0, 1.0, size=(n, 1))
+    raw = 3.0 + 0.7 * wellbeing * direction + bias + rng.normal(0.0, 0.9, size=(n, len(QUESTION_IDS)))
+    return np.clip(np.rint(raw), 1, 5).astype(np.uint8)
+
+
+def seed_survey(n: int, seed: int = 0, admin_code: str = "bench", company_name: str = None) -> str:
+    """Cria uma pesquisa com n respondentes (INSERT em lote). Retorna o id da pesquisa."""
+    from database import SessionLocal, Survey, Respondent, generate_code, generate_uuid, record_answers
+
+    matrix = answer_matrix(n, seed)
+    db = SessionLocal()
+    try:
+        survey = Survey(
+            code=generate_code(8),
+            company_name=company_name or f"Bench {n}",
+            admin_code=admin_code,
+            respondent_count=n,
+        )
+        db.add(survey)
+        db.commit()
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        table = Respondent.__table__
+        for offset in range(0, n, INSERT_BATCH):
+            rows = [
+                {
+                    "id": generate_uuid(),
+                    "survey_id": survey.id,
+                    "display_id": f"R{i:06d}",
+                    "answers": matrix[i].tobytes(),
+                    "submitted_at": start + timedelta(seconds=i),
+                }
+                for i in range(offset, min(n, offset + INSERT_BATCH))
+            ]
+            db.execute(table.insert(), rows)
+        record_answers(db, survey.id, matrix)
+        db.commit()
+        return survey.id
+    finally:
+        db.close()
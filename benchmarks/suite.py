@@ -0,0 +1,241 @@
+"""
+Suite de benchmarks com dados sinteticos (pontuacao, dashboard, exportacao, submissao).
+
+Gera pesquisas de 100 / 1k / 10k / 50k respondentes (benchmarks/datagen.py), mede cada
+caminho algumas vezes e grava a mediana em JSON. Com --compare, falha (exit 1) se alguma
+metrica piorar mais que --threshold em relacao ao baseline.
+
+Uso:
+    python benchmarks/suite.py --output benchmarks/results.json
+    python benchmarks/suite.py --sizes 100,1000 --compare benchmarks/baseline.json --threshold 0.25
+    python benchmarks/suite.py --compare-only novo.json --compare baseline.json
+
+Sem --database-url usa um SQLite temporario.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DEFAULT_SIZES = (100, 1_000, 10_000, 50_000)
+SUBMIT_REQUESTS = 200
+# O deck inclui tabelas com todos os respondentes: acima disso o caso leva minutos por rodada
+PPTX_MAX_SIZE = 10_000
+CASES = ("scoring_scalar", "scoring_batch", "dashboard_cold", "dashboard_warm", "export_excel", "export_pptx", "submit")
+
+# "time": segundos (menor e melhor); "rate": operacoes/s (maior e melhor)
+TIME, RATE = "time", "rate"
+
+
+def _measure(fn, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return {"kind": TIME, "value": statistics.median(runs), "runs": runs}
+
+
+def run_suite(sizes, repeat: int, seed: int, cases=CASES, pptx_max_size: int = PPTX_MAX_SIZE) -> dict:
+    # Imports tardios: o banco precisa estar configurado (TEST_DATABASE_URL) antes
+    from fastapi.testclient import TestClient
+
+    import main
+    from copsoq_calculator import calc_dimension_scores, calc_dimension_scores_batch, aggregate_dimension_scores
+    from database import SessionLocal, Survey, Respondent, bump_data_version
+    from export_service import export_excel, export_pptx
+    from gemini_prose_service import generate_recommendations_prose
+    from benchmarks.datagen import seed_survey, answer_matrix
+
+    results = {}
+    client = TestClient(main.app)
+    for n in sizes:
+        print(f"[{n}] gerando dados...", flush=True)
+        survey_id = seed_survey(n, seed=seed)
+        db = SessionLocal()
+        survey = db.get(Survey, survey_id)
+        respondents = db.query(Respondent).filter(Respondent.survey_id == survey_id).all()
+        responses = [r.responses for r in respondents]
+        responses = [{int(k): v for k, v in resp.items()} for resp in responses]
+
+        def scoring_scalar():
+            main._aggregate_dim_scores([calc_dimension_scores(resp) for resp in responses])
+
+        matrix = answer_matrix(n, seed)
+
+        def scoring_batch():
+            scores, _ = calc_dimension_scores_batch(matrix)
+            aggregate_dimension_scores(scores)
+
+        params = {"admin_code": "bench"}
+        url = f"/api/admin/surveys/{survey_id}/dashboard"
+
+        def dashboard_cold():
+            # Invalida o snapshot: recalcula a partir das respostas
+            s = SessionLocal()
+            bump_data_version(s, survey_id)
+            s.commit()
+            s.close()
+            assert client.get(url, params=params).status_code == 200
+
+        def dashboard_warm():
+            assert client.get(url, params=params).status_code == 200
+
+        dashboard_warm()
+        db.expire_all()
+        data = main._get_export_data(db.get(Survey, survey_id), db)
+
+        def excel():
+            export_excel(
+                survey={"company_name": survey.company_name},
+                respondents_data=data["respondents_data"],
+                dim_scores_agg=data["dim_scores"],
+                kpis=data["kpis"],
+                summary=data["summary"],
+                recommendations=data["recommendations"],
+            )
+
+        def pptx():
+            prose = generate_recommendations_prose(data["recommendations"])
+            export_pptx(recommendations_prose=prose, **main._pptx_export_kwargs(survey, data))
+
+        size_cases = {
+            "scoring_scalar": scoring_scalar,
+            "scoring_batch": scoring_batch,
+            "dashboard_cold": dashboard_cold,
+            "dashboard_warm": dashboard_warm,
+            "export_excel": excel,
+            "export_pptx": pptx,
+        }
+        for name, fn in size_cases.items():
+            if name not in cases or (name == "export_pptx" and n > pptx_max_size):
+                continue
+            print(f"[{n}] {name}...", flush=True)
+            results[f"{name}/{n}"] = _measure(fn, repeat)
+        db.close()
+
+    if "submit" not in cases:
+        return results
+    print("[submit] throughput...", flush=True)
+    code = client.post("/api/admin/surveys", json={"company_name": "Bench submit", "admin_code": "bench"}).json()["code"]
+    body = {"responses": {str(q): 3 for q in range(1, 42)}}
+    rates = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(SUBMIT_REQUESTS):
+            assert client.post(f"/api/survey/{code}/submit", json=body).status_code == 200
+        rates.append(SUBMIT_REQUESTS / (time.perf_counter() - t0))
+    results["submit_throughput"] = {"kind": RATE, "value": statistics.median(rates), "runs": rates}
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare_results(current: dict, baseline: dict, threshold: float) -> list:
+    """Lista de regressoes (metricas que pioraram mais que threshold, ex.: 0.2 = 20%)."""
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        cur = current.get("results", {}).get(name)
+        if cur is None or not base.get("value"):
+            continue
+        if base["kind"] == RATE:
+            change = base["value"] / cur["value"] - 1 if cur["value"] else float("inf")
+        else:
+            change = cur["value"] / base["value"] - 1
+        if change > threshold:
+            regressions.append({"metric": name, "baseline": base["value"], "current": cur["value"], "change": change})
+    return regressions
+
+
+def _print_comparison(current: dict, baseline: dict, regressions: list) -> None:
+    flagged = {r["metric"] for r in regressions}
+    print(f"\n{'metrica':<28}{'baseline':>12}{'atual':>12}{'variacao':>10}")
+    for name, base in sorted(baseline.get("results", {}).items()):
+        cur = current.get("results", {}).get(name)
+        if cur is None:
+            continue
+        delta = cur["value"] / base["value"] - 1 if base["value"] else 0.0
+        mark = "  REGRESSAO" if name in flagged else ""
+        print(f"{name:<28}{base['value']:>12.4f}{cur['value']:>12.4f}{delta:>+9.1%}{mark}")
+
+
+def main_() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cases", default=",".join(CASES), help="casos a rodar (separados por virgula)")
+    parser.add_argument("--pptx-max-size", type=int, default=PPTX_MAX_SIZE)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--output", default=None, help="arquivo JSON de resultados")
+    parser.add_argument("--compare", default=None, help="baseline JSON para comparar")
+    parser.add_argument("--compare-only", default=None, help="resultado JSON ja gravado (nao roda a suite)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="piora tolerada (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.compare_only:
+        with open(args.compare_only, encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        os.environ["TEST_DATABASE_URL"] = args.database_url or (
+            f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='fluir_bench_'), 'bench.db')}"
+        )
+        # Sem chamadas ao Gemini nem cache de exportacao: mede so o trabalho local
+        for var in ("FLUIR_GEMINI_API_KEY", "GOOGLE_API_KEY"):
+            os.environ.pop(var, None)
+        os.environ.setdefault("FLUIR_EXPORT_CACHE_DIR", tempfile.mkdtemp(prefix="fluir_bench_exports_"))
+        sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+        cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+        current = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "sizes": sizes,
+                "repeat": args.repeat,
+                "seed": args.seed,
+                "cases": cases,
+                "pptx_max_size": args.pptx_max_size,
+            },
+            "results": run_suite(sizes, args.repeat, args.seed, cases, args.pptx_max_size),
+        }
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+            print(f"Resultados gravados em {args.output}")
+
+    if not args.compare:
+        for name, r in sorted(current["results"].items()):
+            unit = "s" if r["kind"] == TIME else "/s"
+            print(f"{name:<28}{r['value']:>12.4f} {unit}")
+        return 0
+
+    with open(args.compare, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_results(current, baseline, args.threshold)
+    _print_comparison(current, baseline, regressions)
+    if regressions:
+        print(f"\n{len(regressions)} metrica(s) piorou(aram) mais que {args.threshold:.0%}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -3,11 +3,35 @@ Fluir — Motor de Cálculo COPSOQ II
 Tercis, scores por dimensão e KPIs agregados.
 """
 
-from copsoq_data import DIMENSIONS
+import numpy as np
+
+from copsoq_data import DIMENSIONS, QUESTIONS
 
 LOWER_TERCILE = 2.33
 UPPER_TERCILE = 3.66
 
+# ───── Layout fixo das matrizes do motor vetorizado ─────
+# Colunas da matriz de respostas (N x 41) e da matriz de scores (N x 26).
+QUESTION_IDS = sorted(QUESTIONS)
+DIMENSION_IDS = list(DIMENSIONS)
+# Codigos de status usados nas matrizes; -1 = dimensao sem respostas.
+STATUS_CODES = ("green", "yellow", "red")
+STATUS_MISSING = -1
+
+
+def _build_dimension_matrix() -> np.ndarray:
+    """Matriz 41 x 26 de pertencimento questao -> dimensao (1 se a questao compoe a dimensao)."""
+    q_index = {q: i for i, q in enumerate(QUESTION_IDS)}
+    m = np.zeros((len(QUESTION_IDS), len(DIMENSION_IDS)), dtype=np.int64)
+    for j, dim_id in enumerate(DIMENSION_IDS):
+        for q in DIMENSIONS[dim_id]["questions"]:
+            m[q_index[q], j] = 1
+    return m
+
+
+DIMENSION_MATRIX = _build_dimension_matrix()
+_IS_RISK = np.array([DIMENSIONS[d]["type"] == "risk" for d in DIMENSION_IDS])
+
 
 def get_status(score: float, dim_type: str) -> str:
     """Retorna 'green', 'yellow' ou 'red' baseado nos tercis."""
@@ -93,3 +117,252 @@ def calc_summary(dim_scores: list) -> dict:
     total = len(dim_scores)
     health = round((green / total) * 100, 1) if total else 0
     return {"green": green, "yellow": yellow, "red": red, "total": total, "health_score": health}
+
+
+# ══════════════════════════════════════════════
+# MOTOR VETORIZADO (lote de respondentes)
+# ══════════════════════════════════════════════
+
+def build_response_matrix(responses_list) -> np.ndarray:
+    """Monta matriz N x 41 (uint8) a partir de dicts {question_id: valor}; 0 = sem resposta."""
+    matrix = np.zeros((len(responses_list), len(QUESTION_IDS)), dtype=np.uint8)
+    for i, responses in enumerate(responses_list):
+        matrix[i] = [responses.get(q, responses.get(str(q))) or 0 for q in QUESTION_IDS]
+    return matrix
+
+
+def classify_scores(scores: np.ndarray) -> np.ndarray:
+    """Versao vetorizada de get_status: retorna codigos (indices de STATUS_CODES) por dimensao.
+
+    scores tem as dimensoes na ultima axis (ordem de DIMENSION_IDS); NaN vira STATUS_MISSING.
+    """
+    low = scores < LOWER_TERCILE
+    high = scores > UPPER_TERCILE
+    codes = np.ones(scores.shape, dtype=np.int8)
+    codes[np.where(_IS_RISK, low, high)] = 0
+    codes[np.where(_IS_RISK, high, low)] = 2
+    codes[np.isnan(scores)] = STATUS_MISSING
+    return codes
+
+
+def calc_dimension_scores_batch(matrix: np.ndarray):
+    """
+    Calcula os 26 scores de N respondentes numa unica passada.
+    matrix: N x 41 (colunas em QUESTION_IDS, 0 = sem resposta).
+    Retorna (scores N x 26 float, NaN onde a dimensao nao tem respostas; status N x 26 int8).
+    """
+    matrix = np.asarray(matrix, dtype=np.int64)
+    sums = matrix @ DIMENSION_MATRIX
+    counts = (matrix > 0).astype(np.int64) @ DIMENSION_MATRIX
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = np.round(sums / counts, 2)
+    scores[counts == 0] = np.nan
+    return scores, classify_scores(scores)
+
+
+def aggregate_dimension_scores(scores: np.ndarray) -> list:
+    """Media por dimensao sobre todos os respondentes (equivalente ao agregado escalar).
+
+    Retorna a mesma estrutura de calc_dimension_scores, com o score medio e o status do tercil.
+    """
+    present = ~np.isnan(scores)
+    n = present.sum(axis=0)
+    totals = np.where(present, scores, 0.0).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = totals / n
+    return _dimension_results(means, n)
+
+
+def aggregate_dimension_scores_by_group(scores: np.ndarray, groups: np.ndarray, n_groups: int) -> list:
+    """aggregate_dimension_scores de cada grupo numa unica passada sobre a matriz.
+
+    groups: indice do grupo (0..n_groups-1) de cada linha de scores. Retorna uma lista por grupo.
+    """
+    present = ~np.isnan(scores)
+    n = np.zeros((n_groups, scores.shape[1]), dtype=np.int64)
+    totals = np.zeros((n_groups, scores.shape[1]))
+    np.add.at(n, groups, present)
+    np.add.at(totals, groups, np.where(present, scores, 0.0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = totals / n
+    return [_dimension_results(means[g], n[g]) for g in range(n_groups)]
+
+
+def _dimension_results(means: np.ndarray, n: np.ndarray) -> list:
+    """Lista no formato de calc_dimension_scores a partir das 26 medias (n = 0: dimensao ausente)."""
+    # round() do Python (arredondamento decimal exato) sobre os 26 valores, como no caminho escalar
+    rounded = np.array([round(float(v), 2) for v in means])
+    codes = classify_scores(rounded)
+    results = []
+    for j, dim_id in enumerate(DIMENSION_IDS):
+        if not n[j]:
+            continue
+        dim = DIMENSIONS[dim_id]
+        results.append({
+            "dimension_id": dim_id,
+            "name": dim["name"],
+            "score": float(rounded[j]),
+            "status": STATUS_CODES[codes[j]],
+            "type": dim["type"],
+            "category": dim["category"],
+            "description": dim["description"],
+        })
+    return results
+
+
+def dimension_maps(scores: np.ndarray, statuses: np.ndarray) -> list:
+    """Converte as matrizes do lote em [(scores_map, statuses_map), ...] por respondente."""
+    result = []
+    for row_scores, row_codes in zip(scores.tolist(), statuses.tolist()):
+        scores_map = {}
+        statuses_map = {}
+        for dim_id, score, code in zip(DIMENSION_IDS, row_scores, row_codes):
+            if code == STATUS_MISSING:
+                continue
+            scores_map[dim_id] = score
+            statuses_map[dim_id] = STATUS_CODES[code]
+        result.append((scores_map, statuses_map))
+    return result
+
+
+# ══════════════════════════════════════════════
+# COMPARACAO ENTRE ONDAS (pesquisas repetidas)
+# ══════════════════════════════════════════════
+
+# Quanto menor, melhor (transicao para um rank menor = melhora)
+_STATUS_RANK = {"green": 0, "yellow": 1, "red": 2}
+
+
+def _direction(delta: float, higher_is_better: bool) -> str:
+    if abs(delta) < 0.005:
+        return "stable"
+    return "improved" if (delta > 0) == higher_is_better else "worsened"
+
+
+def dimension_trends(waves: list) -> list:
+    """Scores, status, delta (ultima - primeira onda) e transicoes de status por dimensao.
+
+    waves: lista (em ordem cronologica) de dim_scores no formato de aggregate_dimension_scores.
+    Onda sem a dimensao entra como None e fica fora do delta e das transicoes.
+    """
+    maps = [{d["dimension_id"]: d for d in wave} for wave in waves]
+    result = []
+    for dim_id in DIMENSION_IDS:
+        entries = [m.get(dim_id) for m in maps]
+        present = [(i, e) for i, e in enumerate(entries) if e is not None]
+        if not present:
+            continue
+        dim = DIMENSIONS[dim_id]
+        transitions = []
+        for (i, prev), (j, cur) in zip(present, present[1:]):
+            if prev["status"] != cur["status"]:
+                transitions.append({
+                    "from_wave": i,
+                    "to_wave": j,
+                    "from": prev["status"],
+                    "to": cur["status"],
+                    "direction": "improved" if _STATUS_RANK[cur["status"]] < _STATUS_RANK[prev["status"]] else "worsened",
+                })
+        delta = round(present[-1][1]["score"] - present[0][1]["score"], 2)
+        result.append({
+            "dimension_id": dim_id,
+            "name": dim["name"],
+            "type": dim["type"],
+            "category": dim["category"],
+            "scores": [e["score"] if e else None for e in entries],
+            "statuses": [e["status"] if e else None for e in entries],
+            "delta": delta,
+            "direction": _direction(delta, higher_is_better=dim["type"] != "risk"),
+            "transitions": transitions,
+        })
+    return result
+
+
+def kpi_deltas(waves_kpis: list) -> dict:
+    """Por KPI: valores por onda, variacao entre ondas consecutivas e total (ultima - primeira)."""
+    result = {}
+    for key in ("safety_index", "wellbeing_index", "support_index", "development_index"):
+        values = [k[key]["value"] if k else None for k in waves_kpis]
+        present = [v for v in values if v is not None]
+        if not present:
+            continue
+        delta = round(present[-1] - present[0], 2)
+        result[key] = {
+            "label": next(k[key]["label"] for k in waves_kpis if k),
+            "values": values,
+            "statuses": [k[key]["status"] if k else None for k in waves_kpis],
+            "deltas": [round(b - a, 2) for a, b in zip(present, present[1:])],
+            "delta": delta,
+            # Todos os KPIs crescem no sentido bom (seguranca ja e 5 - risco)
+            "direction": _direction(delta, higher_is_better=True),
+        }
+    return result
+
+
+# ══════════════════════════════════════════════
+# HISTOGRAMAS (contagem de respostas 1-5 por questao)
+# ══════════════════════════════════════════════
+# Estatistica suficiente mantida por pesquisa (survey_question_histogram): os agregados
+# abaixo custam O(41 x 5), independente do numero de respondentes.
+
+SCALE_VALUES = np.arange(1, 6)
+
+
+def answer_counts(matrix) -> np.ndarray:
+    """Histograma 41 x 5 (int64) de uma matriz N x 41 de respostas; 0 (sem resposta) nao conta."""
+    m = np.asarray(matrix, dtype=np.int64).reshape(-1, len(QUESTION_IDS))
+    answered = (m >= 1) & (m <= 5)
+    q_index = np.broadcast_to(np.arange(len(QUESTION_IDS)), m.shape)
+    flat = q_index[answered] * len(SCALE_VALUES) + m[answered] - 1
+    return np.bincount(flat, minlength=len(QUESTION_IDS) * len(SCALE_VALUES)).reshape(len(QUESTION_IDS), len(SCALE_VALUES))
+
+
+def histogram_question_means(counts: np.ndarray) -> np.ndarray:
+    """Media por questao (41,), NaN onde nao ha respostas."""
+    n = counts.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (counts @ SCALE_VALUES) / n
+
+
+def histogram_medians(counts: np.ndarray) -> np.ndarray:
+    """Mediana por questao (41,): media dos dois valores centrais quando n e par; NaN sem respostas."""
+    n = counts.sum(axis=1)
+    cum = np.cumsum(counts, axis=1)
+    # Primeiro valor cuja contagem acumulada passa da posicao (0-based) dos elementos centrais
+    lower = (cum <= ((n - 1) // 2)[:, None]).sum(axis=1) + 1
+    upper = (cum <= (n // 2)[:, None]).sum(axis=1) + 1
+    medians = (lower + upper) / 2
+    medians[n == 0] = np.nan
+    return medians
+
+
+def histogram_dimension_scores(counts: np.ndarray) -> list:
+    """Scores agregados por dimensao a partir do histograma (mesma estrutura de aggregate_dimension_scores).
+
+    Score = media das medias das questoes da dimensao. Com questionarios completos equivale
+    a media dos scores por respondente, exceto pelo arredondamento por respondente do
+    caminho por linha (diferenca de no maximo 0.01 no valor final).
+    """
+    item_means = histogram_question_means(counts)
+    present = ~np.isnan(item_means)
+    n_items = present.astype(np.int64) @ DIMENSION_MATRIX
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = (np.where(present, item_means, 0.0) @ DIMENSION_MATRIX) / n_items
+    return _dimension_results(means, n_items)
+
+
+def answer_distribution(counts: np.ndarray) -> list:
+    """Por questao: contagens de 1 a 5, total, media e mediana."""
+    n = counts.sum(axis=1)
+    means = histogram_question_means(counts)
+    medians = histogram_medians(counts)
+    return [
+        {
+            "question_id": q,
+            "counts": counts[i].tolist(),
+            "n": int(n[i]),
+            "mean": round(float(means[i]), 2) if n[i] else None,
+            "median": float(medians[i]) if n[i] else None,
+        }
+        for i, q in enumerate(QUESTION_IDS)
+    ]
@@ -11,8 +11,15 @@ import random
 import string
 from datetime import datetime, timezone
 
-from sqlalchemy import create_engine, Column, String, Boolean, DateTime, Text, Integer, ForeignKey
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+import numpy as np
+from sqlalchemy import create_engine, delete, func, inspect, select, text, update, Column, String, Boolean, DateTime, Text, Integer, LargeBinary, ForeignKey, Index
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import aliased, declarative_base, sessionmaker, relationship
+from sqlalchemy.pool import NullPool
+
+from copsoq_calculator import QUESTION_IDS, SCALE_VALUES, answer_counts
 
 # Permite usar banco em memoria para testes (TEST_DATABASE_URL=sqlite:///:memory:)
 # Render injeta DATABASE_URL apontando para PostgreSQL (fromDatabase no render.yaml)
@@ -26,6 +33,30 @@ if "sqlite" in _url:
 engine = create_engine(_url, connect_args=_connect_args)
 DATABASE_URL = _url
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _async_url(url: str):
+    """Mesmo banco com driver assincrono: aiosqlite (dev/testes) ou asyncpg (producao)."""
+    u = make_url(url)
+    if u.get_backend_name() == "sqlite":
+        return u.set(drivername="sqlite+aiosqlite")
+    if u.get_backend_name() == "postgresql":
+        query = dict(u.query)
+        # asyncpg usa ssl= em vez do sslmode= da libpq
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        return u.set(drivername="postgresql+asyncpg", query=query)
+    return u
+
+
+# Endpoints async (respondente). SQLite: conexoes sao baratas e NullPool evita
+# reaproveitar conexoes entre event loops diferentes (ex.: TestClient); sem o limite
+# de threads do Starlette ha mais escritores simultaneos, entao o lock espera mais.
+async_engine = create_async_engine(
+    _async_url(_url),
+    **({"poolclass": NullPool, "connect_args": {"timeout": 30}} if "sqlite" in _url else {}),
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -39,40 +70,100 @@ def generate_code(length=6):
 
 # ───── Models ─────
 
+# Atributos opcionais do respondente (opcoes definidas por pesquisa) usados para segmentar resultados
+SEGMENT_FIELDS = ("department", "site", "tenure_band")
+
+
 class Survey(Base):
     __tablename__ = "surveys"
 
     id = Column(String, primary_key=True, default=generate_uuid)
     code = Column(String(8), unique=True, nullable=False, default=generate_code)
     company_name = Column(String(200), nullable=False, default="Empresa")
-    admin_code = Column(String(50), nullable=False, default="/admin")
+    admin_code = Column(String(50), nullable=False, default="/admin", index=True)
     thank_you_title = Column(String(200), default="Obrigado pela sua participação!")
     thank_you_message = Column(Text, default="Suas respostas foram registradas com sucesso. Elas são anônimas e confidenciais, e contribuirão para melhorar o ambiente de trabalho.")
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Incrementado a cada mudanca nos dados agregados (nova resposta, ajustes); invalida o snapshot
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Contador desnormalizado, mantido na mesma transacao das insercoes/exclusoes de respondentes
+    respondent_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # {"department": ["RH", "TI"], ...}: campos de SEGMENT_FIELDS perguntados no formulario
+    segment_options_json = Column(Text, nullable=True)
 
     respondents = relationship("Respondent", back_populates="survey", cascade="all, delete-orphan")
     recommendations = relationship("Recommendation", back_populates="survey", cascade="all, delete-orphan")
+    dashboard_snapshot = relationship("DashboardSnapshot", uselist=False, cascade="all, delete-orphan")
+    question_histogram = relationship("QuestionHistogram", cascade="all, delete-orphan")
+
+    @property
+    def segment_options(self) -> dict:
+        return json.loads(self.segment_options_json) if self.segment_options_json else {}
+
+    @segment_options.setter
+    def segment_options(self, value):
+        self.segment_options_json = json.dumps(value, ensure_ascii=False) if value else None
+
+
+def pack_answers(responses: dict) -> bytes:
+    """Empacota {question_id: valor} em 41 bytes na ordem de QUESTION_IDS (0 = sem resposta)."""
+    return bytes(int(responses.get(q, responses.get(str(q))) or 0) for q in QUESTION_IDS)
 
 
 class Respondent(Base):
     __tablename__ = "respondents"
+    __table_args__ = (
+        Index("ix_respondents_survey_submitted", "survey_id", "submitted_at", "id"),
+        Index("ix_respondents_survey_department", "survey_id", "department"),
+        Index("ix_respondents_survey_site", "survey_id", "site"),
+        Index("ix_respondents_survey_tenure_band", "survey_id", "tenure_band"),
+    )
 
     id = Column(String, primary_key=True, default=generate_uuid)
     survey_id = Column(String, ForeignKey("surveys.id"), nullable=False)
     display_id = Column(String(10), nullable=False)
-    responses_json = Column(Text, nullable=False)   # JSON: {"1": 3, "2": 4, ...}
+    responses_json = Column(Text, nullable=True)    # Legado: {"1": 3, "2": 4, ...}; migrado para answers
+    answers = Column(LargeBinary, nullable=True)     # 41 bytes na ordem de QUESTION_IDS (pack_answers)
     submitted_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Segmentacao (SEGMENT_FIELDS); NULL = nao informado
+    department = Column(String(100), nullable=True)
+    site = Column(String(100), nullable=True)
+    tenure_band = Column(String(100), nullable=True)
 
     survey = relationship("Survey", back_populates="respondents")
 
     @property
     def responses(self):
+        if self.answers is not None:
+            return {str(q): v for q, v in zip(QUESTION_IDS, self.answers) if v}
         return json.loads(self.responses_json) if self.responses_json else {}
 
     @responses.setter
     def responses(self, value):
-        self.responses_json = json.dumps(value)
+        self.answers = pack_answers(value)
+        self.responses_json = None
+
+    def answers_row(self) -> np.ndarray:
+        """Respostas como linha NumPy (41,) uint8, na ordem de QUESTION_IDS."""
+        if self.answers is not None:
+            return np.frombuffer(self.answers, dtype=np.uint8)
+        return np.frombuffer(pack_answers(self.responses), dtype=np.uint8)
+
+    @staticmethod
+    def answers_matrix(respondents) -> np.ndarray:
+        """Matriz N x 41 uint8 de uma lista de Respondent (ou de blobs de answers)."""
+        blobs = []
+        for r in respondents:
+            if isinstance(r, (bytes, bytearray, memoryview)):
+                blobs.append(bytes(r))
+            elif r.answers is not None:
+                blobs.append(r.answers)
+            else:
+                blobs.append(pack_answers(r.responses))
+        if not blobs:
+            return np.zeros((0, len(QUESTION_IDS)), dtype=np.uint8)
+        return np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(len(blobs), len(QUESTION_IDS))
 
 
 class AdminRecoveryEmail(Base):
@@ -84,8 +175,31 @@ class AdminRecoveryEmail(Base):
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
 
+class EmailOutbox(Base):
+    """Fila de emails enviados em segundo plano (ver mail_outbox.py).
+    Guarda so o tipo e o destinatario; o conteudo e montado no envio."""
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index("ix_email_outbox_status_next", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(30), nullable=False)            # recover_code
+    to_address = Column(String(255), nullable=False)
+    status = Column(String(10), nullable=False, default="pending")   # pending, sending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    # Proxima tentativa; enquanto 'sending', prazo do lease do worker que reservou
+    next_attempt_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    sent_at = Column(DateTime, nullable=True)
+
+
 class Recommendation(Base):
     __tablename__ = "recommendations"
+    __table_args__ = (
+        Index("ix_recommendations_survey_order", "survey_id", "order_index"),
+    )
 
     id = Column(String, primary_key=True, default=generate_uuid)
     survey_id = Column(String, ForeignKey("surveys.id"), nullable=False)
@@ -99,10 +213,260 @@ class Recommendation(Base):
     survey = relationship("Survey", back_populates="recommendations")
 
 
+class DashboardSnapshot(Base):
+    """Agregado materializado do dashboard (dim_scores, kpis, summary, respondents_data).
+
+    Valido enquanto data_version for igual ao de Survey.data_version.
+    """
+    __tablename__ = "dashboard_snapshots"
+
+    survey_id = Column(String, ForeignKey("surveys.id"), primary_key=True)
+    data_version = Column(Integer, nullable=False)
+    payload_json = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    @property
+    def payload(self):
+        return json.loads(self.payload_json)
+
+    @payload.setter
+    def payload(self, value):
+        self.payload_json = json.dumps(value)
+
+
+class QuestionHistogram(Base):
+    """Quantas vezes cada valor (1-5) foi respondido em cada questao da pesquisa.
+
+    Mantido na mesma transacao das insercoes/exclusoes de respondentes (record_answers);
+    linha ausente = contagem zero.
+    """
+    __tablename__ = "survey_question_histogram"
+
+    survey_id = Column(String, ForeignKey("surveys.id"), primary_key=True)
+    question_id = Column(Integer, primary_key=True)
+    value = Column(Integer, primary_key=True)
+    frequency = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class ProseCacheEntry(Base):
+    """Prosa de recomendacoes gerada pelo Gemini, enderecada pelo hash do conteudo (ver prose_cache)."""
+    __tablename__ = "prose_cache"
+
+    key = Column(String(64), primary_key=True)
+    model = Column(String(100), nullable=False)
+    payload_json = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    last_used_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+
+class SchemaVersion(Base):
+    """Migracoes aplicadas (ver migrations.py)."""
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+def bump_data_version(db, survey_id: str) -> None:
+    """Incrementa Survey.data_version no proprio UPDATE (seguro para submissoes simultaneas)."""
+    db.query(Survey).filter(Survey.id == survey_id).update(
+        {Survey.data_version: Survey.data_version + 1}, synchronize_session=False
+    )
+
+
+def _record_respondents_stmt(survey_id: str, delta: int, only_active: bool = False):
+    stmt = update(Survey).where(Survey.id == survey_id)
+    if only_active:
+        stmt = stmt.where(Survey.is_active.is_(True))
+    return (
+        stmt
+        .values(
+            respondent_count=Survey.respondent_count + delta,
+            data_version=Survey.data_version + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _reset_generated_recommendations_stmt(survey_id: str):
+    # Um unico DELETE: so remove se a pesquisa nao tiver nenhuma recomendacao customizada
+    custom = aliased(Recommendation)
+    has_custom = (
+        select(custom.id)
+        .where(custom.survey_id == survey_id, custom.is_custom == True)
+        .exists()
+    )
+    return (
+        delete(Recommendation)
+        .where(Recommendation.survey_id == survey_id, ~has_custom)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def record_respondents(db, survey_id: str, delta: int = 1, only_active: bool = False) -> int:
+    """Ajusta respondent_count e incrementa data_version num unico UPDATE atomico.
+
+    Retorna as linhas afetadas: 0 se a pesquisa nao existe ou, com only_active, esta encerrada
+    (os envios usam isso para reconferir no banco o que veio do survey_cache).
+    """
+    return db.execute(_record_respondents_stmt(survey_id, delta, only_active)).rowcount
+
+
+def reset_generated_recommendations(db, survey_id: str) -> None:
+    """Descarta recomendacoes geradas (sem customizacoes) para serem recalculadas no dashboard."""
+    db.execute(_reset_generated_recommendations_stmt(survey_id))
+
+
+async def record_respondents_async(db, survey_id: str, delta: int = 1, only_active: bool = False) -> int:
+    return (await db.execute(_record_respondents_stmt(survey_id, delta, only_active))).rowcount
+
+
+async def reset_generated_recommendations_async(db, survey_id: str) -> None:
+    await db.execute(_reset_generated_recommendations_stmt(survey_id))
+
+
+def _answer_counts_stmt(survey_id: str, counts: np.ndarray):
+    """Upsert (um unico INSERT ... ON CONFLICT) somando um histograma 41 x 5; None se vazio."""
+    rows = [
+        {"survey_id": survey_id, "question_id": QUESTION_IDS[q], "value": int(SCALE_VALUES[v]), "frequency": int(n)}
+        for (q, v), n in np.ndenumerate(counts)
+        if n
+    ]
+    if not rows:
+        return None
+    dialect_insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(QuestionHistogram).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[QuestionHistogram.survey_id, QuestionHistogram.question_id, QuestionHistogram.value],
+        set_={"frequency": QuestionHistogram.frequency + stmt.excluded.frequency},
+    )
+
+
+def _record_answers_stmt(survey_id: str, answers, sign: int = 1):
+    """answers: blob de 41 bytes, linha (41,) ou matriz N x 41 de respostas."""
+    if isinstance(answers, (bytes, bytearray, memoryview)):
+        answers = np.frombuffer(bytes(answers), dtype=np.uint8)
+    return _answer_counts_stmt(survey_id, sign * answer_counts(answers))
+
+
+def record_answers(db, survey_id: str, answers, sign: int = 1) -> None:
+    """Soma (sign=1) ou subtrai (sign=-1) respostas do histograma da pesquisa."""
+    stmt = _record_answers_stmt(survey_id, answers, sign)
+    if stmt is not None:
+        db.execute(stmt)
+
+
+async def record_answers_async(db, survey_id: str, answers, sign: int = 1) -> None:
+    stmt = _record_answers_stmt(survey_id, answers, sign)
+    if stmt is not None:
+        await db.execute(stmt)
+
+
+def record_answer_counts(db, survey_id: str, counts: np.ndarray) -> None:
+    """Soma um histograma 41 x 5 ja acumulado (ex.: importacao em lotes)."""
+    stmt = _answer_counts_stmt(survey_id, counts)
+    if stmt is not None:
+        db.execute(stmt)
+
+
+def question_histogram(db, survey_id: str) -> np.ndarray:
+    """Histograma 41 x 5 da pesquisa (colunas: valores 1-5; linhas: QUESTION_IDS)."""
+    counts = np.zeros((len(QUESTION_IDS), len(SCALE_VALUES)), dtype=np.int64)
+    q_index = {q: i for i, q in enumerate(QUESTION_IDS)}
+    rows = db.query(QuestionHistogram.question_id, QuestionHistogram.value, QuestionHistogram.frequency).filter(
+        QuestionHistogram.survey_id == survey_id
+    )
+    for question_id, value, frequency in rows:
+        if question_id in q_index and 1 <= value <= len(SCALE_VALUES):
+            counts[q_index[question_id], value - 1] = frequency
+    return counts
+
+
+def rebuild_question_histogram(db, survey_id: str, batch_size: int = 5000) -> None:
+    """Recalcula o histograma a partir dos respondentes (backfill / correcao). Nao faz commit."""
+    db.query(QuestionHistogram).filter(QuestionHistogram.survey_id == survey_id).delete(synchronize_session=False)
+    counts = np.zeros((len(QUESTION_IDS), len(SCALE_VALUES)), dtype=np.int64)
+    rows = db.query(Respondent.answers, Respondent.responses_json).filter(Respondent.survey_id == survey_id)
+    blobs = []
+    for answers, responses_json in rows.yield_per(batch_size):
+        if answers is None:
+            answers = pack_answers(json.loads(responses_json) if responses_json else {})
+        blobs.append(answers)
+        if len(blobs) >= batch_size:
+            counts += answer_counts(Respondent.answers_matrix(blobs))
+            blobs = []
+    counts += answer_counts(Respondent.answers_matrix(blobs))
+    if counts.any():
+        db.add_all(
+            QuestionHistogram(survey_id=survey_id, question_id=QUESTION_IDS[q], value=v + 1, frequency=int(n))
+            for (q, v), n in np.ndenumerate(counts)
+            if n
+        )
+
+
+def respondent_counts(db, survey_ids=None) -> dict:
+    """Contagem real de respondentes por pesquisa numa unica consulta GROUP BY."""
+    query = db.query(Respondent.survey_id, func.count(Respondent.id)).group_by(Respondent.survey_id)
+    if survey_ids is not None:
+        survey_ids = list(survey_ids)
+        if not survey_ids:
+            return {}
+        query = query.filter(Respondent.survey_id.in_(survey_ids))
+    return {survey_id: count for survey_id, count in query}
+
+
+def reconcile_respondent_counts(db=None) -> int:
+    """Corrige respondent_count divergente da contagem real; retorna quantas pesquisas foram ajustadas."""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        actual = respondent_counts(db)
+        fixed = 0
+        for survey_id, stored in db.query(Survey.id, Survey.respondent_count):
+            count = actual.get(survey_id, 0)
+            if stored != count:
+                db.query(Survey).filter(Survey.id == survey_id).update(
+                    {Survey.respondent_count: count}, synchronize_session=False
+                )
+                fixed += 1
+        db.commit()
+        return fixed
+    finally:
+        if own_session:
+            db.close()
+
+
 # ───── Init ─────
 
+def _add_missing_columns():
+    """Adiciona colunas novas dos models em tabelas ja existentes (create_all nao altera tabelas)."""
+    insp = inspect(engine)
+    existing_tables = set(insp.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_cols = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing_cols:
+                    continue
+                col_type = col.type.compile(dialect=engine.dialect)
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"
+                if col.server_default is not None:
+                    ddl += f" DEFAULT {col.server_default.arg}"
+                conn.execute(text(ddl))
+
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    # Import tardio: migrations usa os models e helpers deste modulo
+    from migrations import run_migrations, schema_lock
+    # Todo o DDL sob o mesmo lock: a migracao 5 depende das colunas de _add_missing_columns
+    with schema_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        _add_missing_columns()
+        run_migrations(engine)
+    reconcile_respondent_counts()
 
 
 def get_db():
@@ -111,3 +475,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,148 @@
+"""
+Fluir — Perfil de SQL por requisicao (opt-in: FLUIR_DB_PROFILE=1)
+Hooks de cursor nos engines (sync e async) somam consultas e tempo de banco na
+requisicao corrente (contextvar; o threadpool do Starlette e o greenlet do
+AsyncSession herdam o contexto). A resposta ganha Server-Timing e
+X-Fluir-DB-Queries; o mesmo formato de SQL repetido muitas vezes numa requisicao
+(consulta dentro de loop, N+1) e marcado em X-Fluir-DB-Repeated e no log.
+Threads de fundo (writer de submissoes, sender de email) nao sao atribuidas.
+Limitacao: os cabecalhos saem antes do corpo. Em StreamingResponse (ex.: /responses
+em NDJSON com yield_per), as consultas feitas durante o streaming ficam fora dos
+cabecalhos e sao registradas numa linha de log ao fim da resposta ("DB no streaming").
+"""
+
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+ENABLED = os.getenv("FLUIR_DB_PROFILE", "").lower() in ("1", "true", "yes")
+# Mesmo formato de SQL executado ao menos isso numa requisicao = provavel N+1
+REPEAT_THRESHOLD = int(os.getenv("FLUIR_DB_PROFILE_REPEAT", "5"))
+
+logger = logging.getLogger(__name__)
+
+# IN (?, ?, ?) expandido varia com o numero de parametros: mesmo formato
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """SQL sem diferencas de espaco e de tamanho de listas IN."""
+    return _IN_LIST.sub("(?...)", _SPACES.sub(" ", statement).strip())
+
+
+@dataclass
+class RequestProfile:
+    queries: int = 0
+    db_seconds: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.queries += 1
+        self.db_seconds += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = None) -> List[Tuple[str, int]]:
+        """(formato, vezes) dos SQL repetidos acima do limite, do mais frequente ao menos."""
+        threshold = REPEAT_THRESHOLD if threshold is None else threshold
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("fluir_db_profile", default=None)
+
+
+def current() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("fluir_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None:
+        return
+    starts = conn.info.get("fluir_query_start")
+    if starts:
+        profile.record(statement, time.perf_counter() - starts.pop())
+
+
+_installed = set()
+
+
+def install(*engines) -> None:
+    """Registra os hooks (idempotente). AsyncEngine: os eventos ficam no sync_engine."""
+    for engine in engines:
+        target = getattr(engine, "sync_engine", engine)
+        if id(target) in _installed:
+            continue
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target, "after_cursor_execute", _after_cursor_execute)
+        _installed.add(id(target))
+
+
+def server_timing(profile: RequestProfile) -> str:
+    return f'db;dur={profile.db_seconds * 1000:.1f};desc="{profile.queries} queries"'
+
+
+class DBProfileMiddleware:
+    """ASGI puro: abre o perfil da requisicao e grava os cabecalhos no inicio da resposta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile()
+        token = _current.set(profile)
+        # Consultas ja refletidas nos cabecalhos (o resto e do corpo em streaming)
+        at_headers = None
+
+        async def send_wrapper(message):
+            nonlocal at_headers
+            if message["type"] == "http.response.start":
+                at_headers = (profile.queries, profile.db_seconds, dict(profile.shapes))
+                repeated = profile.repeated()
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(profile).encode()))
+                headers.append((b"x-fluir-db-queries", str(profile.queries).encode()))
+                if repeated:
+                    headers.append((b"x-fluir-db-repeated", ", ".join(str(n) for _, n in repeated).encode()))
+                    for shape, n in repeated:
+                        logger.warning(
+                            "Provavel N+1 em %s %s: %sx %s", scope["method"], scope["path"], n, shape[:300],
+                        )
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+        if at_headers is not None and profile.queries > at_headers[0]:
+            _log_streamed(scope, profile, *at_headers)
+
+
+def _log_streamed(scope, profile: RequestProfile, queries: int, db_seconds: float, shapes_at_headers: dict) -> None:
+    """Consultas feitas depois dos cabecalhos (corpo em streaming): so no log."""
+    logger.info(
+        "DB no streaming de %s %s: +%s queries, %.1f ms (total %s queries)",
+        scope["method"], scope["path"], profile.queries - queries,
+        (profile.db_seconds - db_seconds) * 1000, profile.queries,
+    )
+    for shape, n in profile.repeated():
+        # Ja avisado junto com os cabecalhos
+        if shapes_at_headers.get(shape, 0) >= REPEAT_THRESHOLD:
+            continue
+        logger.warning("Provavel N+1 em %s %s (streaming): %sx %s", scope["method"], scope["path"], n, shape[:300])
@@ -0,0 +1,100 @@
+"""
+Fluir — Cache em disco dos arquivos exportados (.xlsx / .pptx)
+Chave: tipo + pesquisa + data_version + hash das recomendacoes + PPT_FORMAT_VERSION + data.
+Eviction LRU por tamanho total (mtime atualizado a cada acerto).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+CACHE_DIR = Path(os.getenv("FLUIR_EXPORT_CACHE_DIR") or Path(tempfile.gettempdir()) / "fluir_export_cache")
+MAX_BYTES = int(float(os.getenv("FLUIR_EXPORT_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def recommendations_hash(recommendations: List[Dict[str, Any]]) -> str:
+    """Hash do conteudo das recomendacoes que aparece no arquivo exportado."""
+    content = [
+        [r.get("priority") or "", r.get("title") or "", r.get("description") or "", r.get("dimension_ids") or ""]
+        for r in recommendations or []
+    ]
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def make_key(kind: str, survey_id: str, data_version: int, recs_hash: str, format_version: str, date: str) -> str:
+    raw = "|".join([kind, survey_id, str(data_version), recs_hash, format_version, date])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def etag_for(key: str) -> str:
+    """ETag forte do artefato (a chave ja identifica o conteudo de forma unica)."""
+    return f'"{key[:32]}"'
+
+
+def _path(key: str) -> Path:
+    return CACHE_DIR / f"{key}.bin"
+
+
+def get(key: str) -> Optional[bytes]:
+    path = _path(key)
+    try:
+        data = path.read_bytes()
+        os.utime(path)  # marca como usado recentemente (LRU)
+    except OSError:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    with _lock:
+        _stats["hits"] += 1
+    return data
+
+
+def put(key: str, data: bytes) -> None:
+    """Grava o artefato de forma atomica e remove os menos usados acima de MAX_BYTES."""
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, _path(key))
+    except OSError as exc:
+        logger.warning("Export cache store failed: %s", exc)
+        return
+    with _lock:
+        _stats["stores"] += 1
+        _evict()
+
+
+def _evict() -> None:
+    entries = []
+    for path in CACHE_DIR.glob("*.bin"):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= MAX_BYTES:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        _stats["evictions"] += 1
+
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,136 @@
+"""
+Fluir — Fila de jobs de exportacao PPTX
+A montagem do deck (python-pptx + matplotlib) roda num ProcessPoolExecutor limitado,
+fora do threadpool que atende os respondentes. Jobs identicos (mesma chave de
+artefato) da mesma pesquisa sao deduplicados enquanto estiverem em andamento; um job
+concluido so e reaproveitado se o deck foi para o export_cache (prosa definitiva).
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import export_cache
+import metrics
+from export_service import export_pptx
+from gemini_prose_service import generate_recommendations_prose, prose_is_final
+
+JOB_QUEUED = "queued"
+JOB_PROSE = "prose"
+JOB_RENDERING = "rendering"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+
+# Progresso aproximado (%) exibido para cada etapa.
+JOB_PROGRESS = {JOB_QUEUED: 0, JOB_PROSE: 20, JOB_RENDERING: 50, JOB_DONE: 100, JOB_ERROR: 100}
+
+MAX_WORKERS = int(os.getenv("FLUIR_EXPORT_WORKERS", "2"))
+# Jobs concluidos mantidos em memoria (com o arquivo) para download posterior.
+MAX_FINISHED_JOBS = 32
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExportJob:
+    id: str
+    survey_id: str
+    key: str
+    status: str = JOB_QUEUED
+    error: Optional[str] = None
+    content: Optional[bytes] = field(default=None, repr=False)
+    # True quando o deck esta no export_cache; False = prosa de fallback, provisorio
+    cached: bool = False
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_DONE, JOB_ERROR)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": JOB_PROGRESS[self.status],
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+_lock = threading.Lock()
+_jobs: "OrderedDict[str, ExportJob]" = OrderedDict()
+_coordinator = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fluir-export")
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            # spawn: o processo web tem threads ativas, fork nao e seguro
+            _process_pool = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def _forget_finished() -> None:
+    finished = [job_id for job_id, job in _jobs.items() if job.finished]
+    for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+
+def _run(job: ExportJob, export_kwargs: Dict[str, Any], recommendations: List[Dict[str, Any]]) -> None:
+    try:
+        job.status = JOB_PROSE
+        prose = generate_recommendations_prose(recommendations)
+        job.status = JOB_RENDERING
+        with metrics.EXPORT_RENDER_SECONDS.time(format="pptx", source="job"):
+            buf = _get_process_pool().submit(export_pptx, recommendations_prose=prose, **export_kwargs).result()
+        job.content = buf.getvalue()
+        if prose_is_final(recommendations):
+            export_cache.put(job.key, job.content)
+            job.cached = True
+        job.status = JOB_DONE
+    except Exception as exc:
+        logger.warning("PPTX export job %s failed: %s", job.id, exc, exc_info=True)
+        job.error = str(exc) or exc.__class__.__name__
+        job.status = JOB_ERROR
+
+
+def submit_pptx_job(
+    survey_id: str,
+    key: str,
+    export_kwargs: Dict[str, Any],
+    recommendations: List[Dict[str, Any]],
+) -> ExportJob:
+    """Agenda a geracao do PPTX (ou reaproveita job identico / artefato em cache)."""
+    with _lock:
+        for job in _jobs.values():
+            if job.survey_id == survey_id and job.key == key and (not job.finished or job.cached):
+                return job
+        job = ExportJob(id=uuid.uuid4().hex, survey_id=survey_id, key=key)
+        _jobs[job.id] = job
+        _forget_finished()
+
+    cached = export_cache.get(key)
+    if cached is not None:
+        job.content = cached
+        job.cached = True
+        job.status = JOB_DONE
+        return job
+
+    _coordinator.submit(_run, job, export_kwargs, list(recommendations))
+    return job
+
+
+def get_job(job_id: str) -> Optional[ExportJob]:
+    with _lock:
+        return _jobs.get(job_id)
@@ -20,6 +20,7 @@ from pptx.enum.shapes import MSO_SHAPE
 from pptx.util import Pt, Inches
 
 from copsoq_data import DIMENSIONS
+from report_charts import render_bar_png, render_radar_png
 
 from ppt_copy import (
     FECHAMENTO_CTA,
@@ -286,54 +287,12 @@ def _build_category_scores(dim_scores_agg: List[Dict[str, Any]]) -> Dict[str, Di
 
 def _render_radar_chart(category_scores: Dict[str, Dict[str, Any]]) -> io.BytesIO:
     """Gera grafico radar (8 categorias) como PNG em BytesIO."""
-    import math
-    import matplotlib
-    matplotlib.use("Agg")
-    import matplotlib.pyplot as plt
-    import numpy as np
-    labels = list(category_scores.keys())
-    values = [category_scores[l]["avg"] for l in labels]
-    colors_map = {"green": "#6B9F7E", "yellow": "#D4A843", "red": "#C46B6B"}
-    point_colors = [colors_map.get(category_scores[l]["status"], "#D4A843") for l in labels]
-    num = len(labels)
-    angles = [2 * math.pi * i / num for i in range(num)]
-    values += [values[0]]
-    angles += [angles[0]]
-    fig, ax = plt.subplots(figsize=(8, 6), subplot_kw=dict(projection="polar"))
-    ax.plot(angles, values, "o-", linewidth=2, color="#6B82A8")
-    ax.fill(angles, values, alpha=0.15, color="#6B82A8")
-    ax.set_xticks(angles[:-1])
-    ax.set_xticklabels(labels, size=9, wrap=True)
-    ax.set_ylim(0, 5)
-    ax.set_yticks([1, 2, 3, 4, 5])
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=120, bbox_inches="tight")
-    plt.close(fig)
-    buf.seek(0)
-    return buf
+    return io.BytesIO(render_radar_png(category_scores))
 
 
 def _render_bar_chart(dim_scores_agg: List[Dict[str, Any]]) -> io.BytesIO:
     """Gera grafico de barras horizontais (26 dimensoes) como PNG em BytesIO."""
-    import matplotlib
-    matplotlib.use("Agg")
-    import matplotlib.pyplot as plt
-    colors_map = {"green": "#6B9F7E", "yellow": "#D4A843", "red": "#C46B6B"}
-    labels = [d.get("name", "")[:20] for d in dim_scores_agg]
-    values = [d.get("score", 0) for d in dim_scores_agg]
-    colors = [colors_map.get(d.get("status", "yellow"), "#D4A843") for d in dim_scores_agg]
-    fig, ax = plt.subplots(figsize=(12, 8))
-    y_pos = range(len(labels))
-    ax.barh(y_pos, values, color=colors, height=0.7)
-    ax.set_yticks(y_pos)
-    ax.set_yticklabels(labels, fontsize=9)
-    ax.set_xlim(0, 5)
-    ax.set_xlabel("Score")
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=120, bbox_inches="tight")
-    plt.close(fig)
-    buf.seek(0)
-    return buf
+    return io.BytesIO(render_bar_png(dim_scores_agg))
 
 
 def _add_kpi_cards_slide(prs: Presentation, kpis: Dict[str, Any]) -> None:
@@ -1,6 +1,14 @@
 import json
 import os
-from typing import Dict, List, Literal, TypedDict
+from typing import Dict, List, Literal, Optional, TypedDict
+
+import metrics
+import prose_cache
+
+# Modelo usado na geracao; faz parte da chave do cache de prosa.
+GEMINI_MODEL = "gemini-3.5-flash"
+# Incrementar ao alterar _build_prompt para invalidar a prosa ja armazenada em cache.
+PROMPT_VERSION = "1"
 
 
 class RecommendationItem(TypedDict, total=False):
@@ -164,14 +172,55 @@ def _fallback_prose(grouped: Dict[PriorityKey, List[RecommendationItem]]) -> Dic
     return result
 
 
+def _api_key() -> str:
+    return os.getenv("FLUIR_GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or ""
+
+
+def _cache_key(grouped: Dict[PriorityKey, List[RecommendationItem]]) -> str:
+    return prose_cache.make_key(grouped, _build_prompt(grouped), GEMINI_MODEL, PROMPT_VERSION)
+
+
+def prose_is_immediate(recommendations: List[RecommendationItem]) -> bool:
+    """True quando a prosa nao depende do Gemini (sem recomendacoes ou sem chave de API)."""
+    return not _api_key() or not any(_group_by_priority(recommendations or []).values())
+
+
+def fallback_recommendations_prose(recommendations: List[RecommendationItem]) -> Dict[PriorityKey, str]:
+    """Texto corrido do fallback, sem chamar a API (usado enquanto a prosa da IA e gerada)."""
+    return _fallback_prose(_group_by_priority(recommendations or []))
+
+
+def recommendations_cache_key(recommendations: List[RecommendationItem]) -> str:
+    """Chave de conteudo (prose_cache) da prosa destas recomendacoes."""
+    return _cache_key(_group_by_priority(recommendations or []))
+
+
+def cached_recommendations_prose(recommendations: List[RecommendationItem]) -> Optional[Dict[PriorityKey, str]]:
+    """Prosa do Gemini ja presente no cache para estas recomendacoes, ou None."""
+    return prose_cache.get(recommendations_cache_key(recommendations))
+
+
+def prose_is_final(recommendations: List[RecommendationItem]) -> bool:
+    """True quando a prosa destas recomendacoes nao vai mudar (sem IA ou ja gerada pelo Gemini).
+
+    False indica que o resultado atual e o fallback por falha temporaria da API.
+    """
+    # Reconferencia apos a geracao: peek nao conta de novo a consulta ja feita
+    return prose_is_immediate(recommendations) or prose_cache.peek(recommendations_cache_key(recommendations)) is not None
+
+
 def generate_recommendations_prose(
     recommendations: List[RecommendationItem],
+    check_cache: bool = True,
 ) -> Dict[PriorityKey, str]:
     """Gera texto corrido de recomendacoes usando Google Gemini, com fallback seguro.
 
     - Nao faz nenhuma chamada se nao houver recomendacoes.
     - Se a chave FLUIR_GEMINI_API_KEY nao estiver configurada, utiliza apenas o fallback.
     - Se ocorrer qualquer erro na API ou no parse do JSON, retorna o fallback.
+    - Respostas validas do Gemini ficam em cache (prose_cache) pelo hash do conteudo;
+      o fallback nunca e armazenado, para que uma falha temporaria nao fique fixada.
+    - check_cache=False: o chamador ja consultou o cache (e errou); evita contar duas vezes.
     """
     grouped = _group_by_priority(recommendations or [])
 
@@ -183,12 +232,17 @@ def generate_recommendations_prose(
             "medio_prazo": "",
         }
 
-    api_key = os.getenv("FLUIR_GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    api_key = _api_key()
     if not api_key:
         # Sem chave configurada, nao tentamos chamar a API externa.
         return _fallback_prose(grouped)
 
     prompt = _build_prompt(grouped)
+    cache_key = _cache_key(grouped)
+    if check_cache:
+        cached = prose_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
     try:
         # Import lazily para evitar quebrar o import do projeto
@@ -197,13 +251,15 @@ def generate_recommendations_prose(
 
         client = genai.Client(api_key=api_key)
 
-        response = client.models.generate_content(
-            model="gemini-3.5-flash",
-            contents=prompt,
-        )
+        with metrics.GEMINI_SECONDS.time():
+            response = client.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+            )
 
         raw_text = (response.text or "").strip()
         if not raw_text:
+            metrics.GEMINI_CALLS.inc(result="empty")
             return _fallback_prose(grouped)
 
         try:
@@ -220,6 +276,7 @@ def generate_recommendations_prose(
             try:
                 data = json.loads(cleaned)
             except Exception:
+                metrics.GEMINI_CALLS.inc(result="invalid_json")
                 return _fallback_prose(grouped)
 
         # Monta estrutura final garantindo todas as chaves.
@@ -228,9 +285,12 @@ def generate_recommendations_prose(
             "curto_prazo": str(data.get("curto_prazo", "")).strip(),
             "medio_prazo": str(data.get("medio_prazo", "")).strip(),
         }
+        metrics.GEMINI_CALLS.inc(result="ok")
+        prose_cache.put(cache_key, GEMINI_MODEL, result)
         return result
 
     except Exception:
         # Qualquer problema (rede, autenticacao, mudanca de API) cai no fallback.
+        metrics.GEMINI_CALLS.inc(result="error")
         return _fallback_prose(grouped)
 
@@ -0,0 +1,92 @@
+"""
+Fluir — Utilitarios de cache HTTP (ETag / If-None-Match, payloads pre-comprimidos)
+"""
+
+import gzip
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+from starlette.responses import Response
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara If-None-Match com o ETag atual (lista separada por virgula, '*' e prefixo W/)."""
+    if not if_none_match:
+        return False
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def strong_etag(content: bytes) -> str:
+    """ETag forte derivado do conteudo: igual em todos os workers e deploys com o mesmo payload."""
+    return '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """True se Accept-Encoding aceita gzip (ignora gzip;q=0)."""
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.replace(" ", "").lower()
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+@dataclass(frozen=True)
+class StaticPayload:
+    """Corpo serializado uma unica vez, com variante gzip (opcional) e ETags por representacao."""
+    body: bytes
+    gzip_body: Optional[bytes]
+    etag: str
+    gzip_etag: Optional[str]
+    media_type: str
+
+
+def precompressed(body: bytes, media_type: str, compress: bool = True) -> StaticPayload:
+    """compress=False para formatos ja comprimidos (png, jpg): so a variante identidade."""
+    etag = strong_etag(body)
+    if not compress:
+        return StaticPayload(body=body, gzip_body=None, etag=etag, gzip_etag=None, media_type=media_type)
+    # mtime=0: bytes gzip deterministicos, mesmo ETag em todos os workers
+    gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+    return StaticPayload(
+        body=body,
+        gzip_body=gzip_body,
+        etag=etag,
+        gzip_etag=etag[:-1] + '-gz"',
+        media_type=media_type,
+    )
+
+
+def static_response(request, payload: StaticPayload, cache_control: str) -> Response:
+    """Serve o payload pre-serializado: 304 se o cliente ja tem qualquer variante, gzip se aceito."""
+    use_gzip = payload.gzip_body is not None and accepts_gzip(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": payload.gzip_etag if use_gzip else payload.etag,
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, payload.etag) or (
+        payload.gzip_etag is not None and etag_matches(if_none_match, payload.gzip_etag)
+    ):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(payload.gzip_body, media_type=payload.media_type, headers=headers)
+    return Response(payload.body, media_type=payload.media_type, headers=headers)
@@ -0,0 +1,347 @@
+"""
+Fluir — Envio de emails em segundo plano (tabela email_outbox)
+Os endpoints apenas enfileiram (tipo + destinatario) e retornam; um sender em thread
+reserva lotes, monta cada mensagem com o renderer do tipo e envia por uma conexao SMTP
+persistente, com novas tentativas e backoff exponencial. O renderer pode descartar a
+linha (ex.: email nao cadastrado), o que mantem o endpoint identico para qualquer email.
+Pedidos repetidos para o mesmo destinatario sao absorvidos (RESEND_INTERVAL_S), cada
+cliente tem um limite de pedidos por janela e linhas antigas sao apagadas pelo sender.
+"""
+
+import logging
+import os
+import smtplib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import or_
+
+from database import SessionLocal, EmailOutbox
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+BATCH_SIZE = int(os.getenv("FLUIR_MAIL_BATCH", "20"))
+MAX_ATTEMPTS = int(os.getenv("FLUIR_MAIL_MAX_ATTEMPTS", "5"))
+# Backoff: BACKOFF_BASE_S * 2^(tentativas-1), limitado a BACKOFF_MAX_S
+BACKOFF_BASE_S = float(os.getenv("FLUIR_MAIL_BACKOFF_S", "30"))
+BACKOFF_MAX_S = 3600.0
+POLL_INTERVAL_S = float(os.getenv("FLUIR_MAIL_POLL_S", "10"))
+# Linha 'sending' de um worker que morreu volta a ser elegivel apos o lease
+LEASE_S = 300
+# Servidores derrubam conexoes ociosas; acima disso reconecta em vez de reaproveitar
+SMTP_IDLE_S = float(os.getenv("FLUIR_SMTP_IDLE_S", "60"))
+SMTP_TIMEOUT_S = 30
+# Mesmo tipo e destinatario: no maximo um email por intervalo
+RESEND_INTERVAL_S = float(os.getenv("FLUIR_MAIL_RESEND_S", "300"))
+# Pedidos por cliente (IP) na janela; contado por processo
+CLIENT_LIMIT = int(os.getenv("FLUIR_MAIL_CLIENT_LIMIT", "10"))
+CLIENT_WINDOW_S = 3600.0
+# Linhas enviadas ou com falha definitiva sao apagadas depois disso
+RETENTION_S = float(os.getenv("FLUIR_MAIL_RETENTION_DAYS", "30")) * 86400
+PRUNE_INTERVAL_S = 3600.0
+
+logger = logging.getLogger(__name__)
+
+# kind -> renderer(db, to_address) -> (assunto, texto) ou None para descartar
+Renderer = Callable[[object, str], Optional[Tuple[str, str]]]
+_renderers: Dict[str, Renderer] = {}
+
+_wakeup = threading.Event()
+_lock = threading.Lock()
+_sender: Optional[threading.Thread] = None
+# cliente -> (inicio da janela, pedidos); ordem de insercao = ordem de inicio da janela
+_clients: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+_last_prune = 0.0
+_stats = {
+    "enqueued": 0, "collapsed": 0, "throttled": 0, "sent": 0, "skipped": 0,
+    "retries": 0, "failed": 0, "connections": 0, "pruned": 0,
+}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def smtp_settings() -> Optional[dict]:
+    """Configuracao SMTP do ambiente; None se o envio nao estiver configurado."""
+    host = os.getenv("SMTP_HOST")
+    user = os.getenv("SMTP_USER")
+    sender = os.getenv("SMTP_FROM") or user
+    if not host or not sender:
+        return None
+    return {
+        "host": host,
+        "port": int(os.getenv("SMTP_PORT", "587")),
+        "user": user,
+        "password": os.getenv("SMTP_PASS"),
+        "from": sender,
+        "starttls": os.getenv("SMTP_STARTTLS", "1").lower() not in ("0", "false", "no"),
+    }
+
+
+def register_renderer(kind: str, renderer: Renderer) -> None:
+    _renderers[kind] = renderer
+
+
+def allow_client(client: str) -> bool:
+    """False quando o cliente passou de CLIENT_LIMIT pedidos em CLIENT_WINDOW_S."""
+    now = time.monotonic()
+    with _lock:
+        while _clients and next(iter(_clients.values()))[0] <= now - CLIENT_WINDOW_S:
+            _clients.popitem(last=False)
+        start, count = _clients.get(client, (now, 0))
+        if count >= CLIENT_LIMIT:
+            _stats["throttled"] += 1
+            return False
+        _clients[client] = (start, count + 1)
+        return True
+
+
+def enqueue(db, kind: str, to_address: str) -> bool:
+    """Grava a linha na sessao do chamador; commit e notify() ficam com ele.
+
+    Retorna False (nada gravado) se ja ha email do mesmo tipo para o destinatario na fila
+    ou pedido nos ultimos RESEND_INTERVAL_S.
+    """
+    recent = (
+        db.query(EmailOutbox.id)
+        .filter(
+            EmailOutbox.kind == kind,
+            EmailOutbox.to_address == to_address,
+            or_(
+                EmailOutbox.status.in_((STATUS_PENDING, STATUS_SENDING)),
+                EmailOutbox.created_at >= _now() - timedelta(seconds=RESEND_INTERVAL_S),
+            ),
+        )
+        .first()
+    )
+    if recent is not None:
+        _stats["collapsed"] += 1
+        return False
+    db.add(EmailOutbox(kind=kind, to_address=to_address, status=STATUS_PENDING, next_attempt_at=_now()))
+    _stats["enqueued"] += 1
+    return True
+
+
+def notify() -> None:
+    """Chamar apos o commit do enqueue."""
+    ensure_sender()
+    _wakeup.set()
+
+
+class SmtpConnection:
+    """Conexao SMTP reaproveitada entre lotes; reconecta se caiu ou ficou ociosa demais."""
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        s = self.settings
+        server = smtplib.SMTP(s["host"], s["port"], timeout=SMTP_TIMEOUT_S)
+        server.ehlo()
+        if s["starttls"]:
+            server.starttls()
+            server.ehlo()
+        if s["user"] and s["password"]:
+            server.login(s["user"], s["password"])
+        _stats["connections"] += 1
+        return server
+
+    def _alive(self) -> bool:
+        if self._server is None or time.monotonic() - self._last_used > SMTP_IDLE_S:
+            return False
+        try:
+            return self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def send(self, to_address: str, message: str) -> None:
+        if not self._alive():
+            self.close()
+            self._server = self._connect()
+        try:
+            self._server.sendmail(self.settings["from"], [to_address], message)
+        except smtplib.SMTPServerDisconnected:
+            # Queda entre o NOOP e o envio: uma reconexao antes de contar como falha
+            self._server = self._connect()
+            self._server.sendmail(self.settings["from"], [to_address], message)
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+_connection: Optional[SmtpConnection] = None
+
+
+def _get_connection(settings: dict) -> SmtpConnection:
+    global _connection
+    if _connection is None or _connection.settings != settings:
+        if _connection is not None:
+            _connection.close()
+        _connection = SmtpConnection(settings)
+    return _connection
+
+
+def _build_message(settings: dict, to_address: str, subject: str, text: str) -> str:
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = settings["from"]
+    msg["To"] = to_address
+    msg.attach(MIMEText(text, "plain", "utf-8"))
+    return msg.as_string()
+
+
+def _claim_batch(db) -> list:
+    """Reserva ate BATCH_SIZE linhas vencidas (UPDATE condicional: seguro com varios workers)."""
+    now = _now()
+    candidates = (
+        db.query(EmailOutbox)
+        .filter(
+            or_(EmailOutbox.status == STATUS_PENDING, EmailOutbox.status == STATUS_SENDING),
+            EmailOutbox.next_attempt_at <= now,
+        )
+        .order_by(EmailOutbox.id)
+        .limit(BATCH_SIZE)
+        .all()
+    )
+    claimed = []
+    lease_until = now + timedelta(seconds=LEASE_S)
+    for row in candidates:
+        updated = (
+            db.query(EmailOutbox)
+            .filter(
+                EmailOutbox.id == row.id,
+                EmailOutbox.status == row.status,
+                EmailOutbox.next_attempt_at == row.next_attempt_at,
+            )
+            .update({EmailOutbox.status: STATUS_SENDING, EmailOutbox.next_attempt_at: lease_until}, synchronize_session=False)
+        )
+        if updated:
+            claimed.append(row.id)
+    db.commit()
+    if not claimed:
+        return []
+    return db.query(EmailOutbox).filter(EmailOutbox.id.in_(claimed)).order_by(EmailOutbox.id).all()
+
+
+def _is_permanent(exc: Exception) -> bool:
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in exc.recipients.values())
+    code = getattr(exc, "smtp_code", None)
+    return isinstance(code, int) and 500 <= code < 600
+
+
+def process_once() -> int:
+    """Envia um lote. Retorna quantas linhas foram reservadas (0 = nada a fazer)."""
+    settings = smtp_settings()
+    if settings is None:
+        return 0
+    db = SessionLocal()
+    try:
+        rows = _claim_batch(db)
+        if not rows:
+            return 0
+        connection = _get_connection(settings)
+        for row in rows:
+            renderer = _renderers.get(row.kind)
+            rendered = renderer(db, row.to_address) if renderer else None
+            if rendered is None:
+                # Destinatario nao elegivel (ou tipo desconhecido): nada a enviar nem a guardar
+                db.delete(row)
+                db.commit()
+                _stats["skipped"] += 1
+                continue
+            try:
+                connection.send(row.to_address, _build_message(settings, row.to_address, *rendered))
+            except Exception as exc:
+                row.attempts += 1
+                row.last_error = f"{type(exc).__name__}: {exc}"[:1000]
+                if row.attempts >= MAX_ATTEMPTS or _is_permanent(exc):
+                    row.status = STATUS_FAILED
+                    _stats["failed"] += 1
+                    logger.warning("Email %s (%s) falhou definitivamente: %s", row.id, row.kind, exc)
+                else:
+                    delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (row.attempts - 1))
+                    row.status = STATUS_PENDING
+                    row.next_attempt_at = _now() + timedelta(seconds=delay)
+                    _stats["retries"] += 1
+                if not _is_permanent(exc):
+                    # Conexao possivelmente corrompida: a proxima mensagem reconecta
+                    connection.close()
+            else:
+                row.attempts += 1
+                row.status = STATUS_SENT
+                row.sent_at = _now()
+                row.last_error = None
+                _stats["sent"] += 1
+            db.commit()
+        return len(rows)
+    finally:
+        db.close()
+
+
+def prune() -> int:
+    """Apaga linhas enviadas ou com falha definitiva mais antigas que RETENTION_S."""
+    db = SessionLocal()
+    try:
+        deleted = (
+            db.query(EmailOutbox)
+            .filter(
+                EmailOutbox.status.in_((STATUS_SENT, STATUS_FAILED)),
+                EmailOutbox.created_at < _now() - timedelta(seconds=RETENTION_S),
+            )
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+    finally:
+        db.close()
+    _stats["pruned"] += deleted
+    return deleted
+
+
+def _sender_loop() -> None:
+    global _last_prune
+    while True:
+        _wakeup.clear()
+        try:
+            while process_once():
+                pass
+            if time.monotonic() - _last_prune >= PRUNE_INTERVAL_S:
+                _last_prune = time.monotonic()
+                prune()
+        except Exception:
+            logger.exception("Falha no sender de emails")
+        _wakeup.wait(POLL_INTERVAL_S)
+
+
+def ensure_sender() -> None:
+    """Inicia a thread do sender (uma por processo) se o SMTP estiver configurado."""
+    global _sender
+    if smtp_settings() is None:
+        return
+    with _lock:
+        if _sender is None or not _sender.is_alive():
+            _sender = threading.Thread(target=_sender_loop, name="fluir-mail-sender", daemon=True)
+            _sender.start()
+
+
+def stats() -> dict:
+    return dict(_stats)
@@ -7,36 +7,63 @@ import io
 import json
 import logging
 import os
-import smtplib
 import base64
+import secrets
+import binascii
 import uuid
 from datetime import datetime, timezone
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from fastapi import FastAPI, HTTPException, Depends, File, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from starlette.middleware.base import BaseHTTPMiddleware
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
+import numpy as np
 import qrcode
 from pydantic import BaseModel, Field
 from collections import defaultdict
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from database import init_db, get_db, SessionLocal, Survey, Respondent, Recommendation, AdminRecoveryEmail, generate_uuid, generate_code
+from database import SEGMENT_FIELDS, engine, async_engine, init_db, get_db, get_async_db, SessionLocal, Survey, Respondent, Recommendation, AdminRecoveryEmail, DashboardSnapshot, bump_data_version, record_respondents, record_respondents_async, record_answers, record_answers_async, question_histogram, reset_generated_recommendations, reset_generated_recommendations_async, respondent_counts, pack_answers, generate_uuid, generate_code
 from copsoq_data import QUESTIONS, DIMENSIONS, CATEGORIES, SCALE_LABELS
-from copsoq_calculator import calc_dimension_scores, calc_kpis, calc_summary, get_status
+from copsoq_calculator import (
+    calc_kpis, calc_summary, get_status,
+    calc_dimension_scores_batch, aggregate_dimension_scores, aggregate_dimension_scores_by_group, dimension_maps,
+    histogram_dimension_scores, answer_distribution, dimension_trends, kpi_deltas,
+)
 from recommendations_engine import generate_recommendations
 from export_service import export_excel, export_pptx, PPT_FORMAT_VERSION
-from gemini_prose_service import generate_recommendations_prose
+from gemini_prose_service import generate_recommendations_prose, prose_is_final
+from http_cache import etag_matches, precompressed, static_response
+import export_cache
+from export_jobs import submit_pptx_job, get_job as get_export_job, JOB_DONE
+from prose_jobs import request_prose, PROSE_READY
+import submission_buffer
+import survey_cache
+import mail_outbox
+import metrics
+import db_profiler
+import prose_cache
+from static_assets import AssetRegistry, PAGE_CACHE_CONTROL
+from response_import import ImportFormatError, import_responses
 
 EXPECTED_QUESTIONS = len(QUESTIONS)
 
+# Segmentacao: rotulos exibidos no formulario e limites das opcoes configuradas por pesquisa
+SEGMENT_LABELS = {"department": "Departamento / Area", "site": "Unidade", "tenure_band": "Tempo de empresa"}
+MAX_SEGMENT_OPTIONS = 50
+# Segmentos menores que isso nao aparecem no dashboard (anonimato)
+MIN_SEGMENT_SIZE = int(os.getenv("FLUIR_MIN_SEGMENT_SIZE", "5"))
+# Proxies na frente da aplicacao que acrescentam ao X-Forwarded-For (Render: 1). 0 = usa o
+# IP da conexao. Entradas a esquerda das dos proxies vem do cliente e sao ignoradas.
+TRUSTED_PROXY_HOPS = int(os.getenv("FLUIR_TRUSTED_PROXY_HOPS", "0"))
+
 # ────── App ──────
 
 app = FastAPI(title="Fluir", description="Bem-estar que move resultados", version="1.0.0")
@@ -109,10 +136,17 @@ class OriginCheckMiddleware(BaseHTTPMiddleware):
 
 
 app.add_middleware(OriginCheckMiddleware)
+if db_profiler.ENABLED:
+    db_profiler.install(engine, async_engine)
+app.add_middleware(db_profiler.DBProfileMiddleware)
+# Ultimo adicionado = mais externo: a latencia inclui os demais middlewares
+app.add_middleware(metrics.MetricsMiddleware)
 
 static_path = Path(__file__).parent / "static"
 static_path.mkdir(exist_ok=True)
 app.mount("/static", StaticFiles(directory=str(static_path)), name="static")
+# HTML e assets lidos uma vez, comprimidos e com URLs versionadas pelo conteudo
+assets = AssetRegistry(static_path)
 
 init_db()
 
@@ -152,9 +186,13 @@ class SurveySettings(BaseModel):
     thank_you_message: Optional[str] = None
     is_active: Optional[bool] = None
     company_name: Optional[str] = None
+    # {"department": ["RH", "TI"], ...}; lista vazia deixa de perguntar o campo
+    segment_options: Optional[Dict[str, List[str]]] = None
 
 class SubmitAnswers(BaseModel):
     responses: Dict[str, int]
+    # Segmentacao opcional: {"department": "RH", ...}, valores entre as opcoes da pesquisa
+    attributes: Dict[str, Optional[str]] = Field(default_factory=dict)
 
 class RecoverCodeRequest(BaseModel):
     email: str = Field(..., max_length=255)
@@ -165,25 +203,35 @@ class RecoverCodeRequest(BaseModel):
 # ════════════════════════════════════════════
 
 @app.get("/", response_class=HTMLResponse)
-async def root():
-    return (static_path / "login.html").read_text(encoding="utf-8")
+async def root(request: Request):
+    return static_response(request, assets.page("login.html"), PAGE_CACHE_CONTROL)
 
 
 @app.get("/landing", response_class=HTMLResponse)
-async def landing_page():
-    return (static_path / "landing.html").read_text(encoding="utf-8")
+async def landing_page(request: Request):
+    return static_response(request, assets.page("landing.html"), PAGE_CACHE_CONTROL)
 
 
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_page():
-    return (static_path / "admin.html").read_text(encoding="utf-8")
+async def admin_page(request: Request):
+    return static_response(request, assets.page("admin.html"), PAGE_CACHE_CONTROL)
 
 @app.get("/survey/{code}", response_class=HTMLResponse)
-async def survey_page(code: str, db: Session = Depends(get_db)):
-    survey = db.query(Survey).filter(Survey.code == code).first()
+async def survey_page(code: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    survey = await survey_cache.get_by_code_async(db, code)
     if not survey or not survey.is_active:
         raise HTTPException(404, "Pesquisa não encontrada ou encerrada.")
-    return (static_path / "survey.html").read_text(encoding="utf-8")
+    return static_response(request, assets.page("survey.html"), PAGE_CACHE_CONTROL)
+
+
+@app.get("/assets/{digest}/{path:path}")
+async def static_asset(digest: str, path: str, request: Request):
+    """Asset com hash do conteudo na URL (ver static_assets): cache imutavel."""
+    found = assets.asset(digest, path)
+    if found is None:
+        raise HTTPException(404)
+    payload, cache_control = found
+    return static_response(request, payload, cache_control)
 
 
 # ──── Diagnostico: versao do backend (para debug de export em build antigo) ────
@@ -218,57 +266,64 @@ def _resolve_admin_code() -> str:
 
 GLOBAL_ADMIN_CODE = _resolve_admin_code()
 
+metrics.register_collector("fluir_survey_cache", survey_cache.stats)
+metrics.register_collector("fluir_prose_cache", prose_cache.stats)
+metrics.register_collector("fluir_export_cache", export_cache.stats)
+metrics.register_collector("fluir_submit_buffer", submission_buffer.stats)
+metrics.register_collector("fluir_mail_outbox", mail_outbox.stats)
+
+
+@app.get("/api/admin/metrics")
+def admin_metrics(admin_code: str = Query(...)):
+    """Metricas do processo no formato texto do Prometheus (apenas com o codigo admin global)."""
+    if not secrets.compare_digest(admin_code, GLOBAL_ADMIN_CODE):
+        raise HTTPException(401, "Codigo de acesso invalido.")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE, headers={"Cache-Control": "no-store"})
+
+
 @app.post("/api/admin/login")
 def admin_login(body: AdminLogin, db: Session = Depends(get_db)):
     # Accept global admin code OR any code that matches existing surveys
     surveys = db.query(Survey).filter(Survey.admin_code == body.admin_code).all()
     if body.admin_code != GLOBAL_ADMIN_CODE and not surveys:
         raise HTTPException(401, "Codigo de acesso invalido.")
-    return {"ok": True, "admin_code": body.admin_code, "surveys": [_survey_brief(s, db) for s in surveys]}
+    return {"ok": True, "admin_code": body.admin_code, "surveys": _survey_briefs(surveys, db)}
+
+
+RECOVER_CODE_MESSAGE = "Se o email estiver cadastrado, voce recebera a chave em instantes."
 
 
 @app.post("/api/admin/recover-code")
-def recover_code(body: RecoverCodeRequest, db: Session = Depends(get_db)):
-    """Envia a chave de acesso para o email se estiver cadastrado. Resposta generica para evitar enumeracao."""
+def recover_code(body: RecoverCodeRequest, request: Request, db: Session = Depends(get_db)):
+    """Enfileira o envio da chave de acesso. Resposta generica e mesmo trabalho para
+    qualquer email: a verificacao do cadastro acontece no sender (evita enumeracao).
+    Limitado por IP; pedidos repetidos para o mesmo email sao absorvidos pela fila."""
+    if not mail_outbox.allow_client(_client_ip(request)):
+        raise HTTPException(429, "Muitas solicitacoes. Tente novamente mais tarde.")
     email = body.email.strip().lower()
-    if not email:
-        return {"message": "Se o email estiver cadastrado, voce recebera a chave em instantes."}
+    if email and mail_outbox.smtp_settings() is not None:
+        if mail_outbox.enqueue(db, "recover_code", email):
+            db.commit()
+            mail_outbox.notify()
+    return {"message": RECOVER_CODE_MESSAGE}
 
+
+def _render_recover_code_email(db: Session, email: str) -> Optional[Tuple[str, str]]:
+    """Mensagem de recuperacao; None (descarta) se o email nao estiver cadastrado."""
     exists = db.query(AdminRecoveryEmail).filter(AdminRecoveryEmail.email == email).first()
     if not exists:
-        return {"message": "Se o email estiver cadastrado, voce recebera a chave em instantes."}
-
-    admin_code = GLOBAL_ADMIN_CODE
-    smtp_host = os.getenv("SMTP_HOST")
-    smtp_port = int(os.getenv("SMTP_PORT", "587"))
-    smtp_user = os.getenv("SMTP_USER")
-    smtp_pass = os.getenv("SMTP_PASS")
-    smtp_from = os.getenv("SMTP_FROM") or smtp_user
-
-    if not smtp_host or not smtp_user or not smtp_pass:
-        return {"message": "Se o email estiver cadastrado, voce recebera a chave em instantes."}
-
-    try:
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = "Fluir - Recuperacao de chave de acesso"
-        msg["From"] = smtp_from
-        msg["To"] = email
-        text = f"""Fluir - Bem-estar que move resultados
+        return None
+    text = f"""Fluir - Bem-estar que move resultados
 
-Sua chave de acesso administrativo: {admin_code}
+Sua chave de acesso administrativo: {GLOBAL_ADMIN_CODE}
 
 Guarde esta informacao em local seguro. Nao compartilhe com terceiros."""
-        msg.attach(MIMEText(text, "plain", "utf-8"))
-        with smtplib.SMTP(smtp_host, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_pass)
-            server.sendmail(smtp_from, email, msg.as_string())
-    except Exception as exc:
-        logging.getLogger(__name__).warning(
-            "Recover code email failed: %s", exc, exc_info=True
-        )
+    return "Fluir - Recuperacao de chave de acesso", text
 
-    return {"message": "Se o email estiver cadastrado, voce recebera a chave em instantes."}
+
+mail_outbox.register_renderer("recover_code", _render_recover_code_email)
+# Retoma emails pendentes de execucoes anteriores
+mail_outbox.ensure_sender()
 
 
 @app.post("/api/admin/surveys")
@@ -295,15 +350,32 @@ def create_survey(body: SurveyCreate, db: Session = Depends(get_db)):
 @app.get("/api/admin/surveys")
 def list_surveys(admin_code: str = Query(...), db: Session = Depends(get_db)):
     surveys = db.query(Survey).filter(Survey.admin_code == admin_code).all()
-    return [_survey_brief(s, db) for s in surveys]
+    return _survey_briefs(surveys, db)
 
 
 @app.post("/api/admin/surveys/delete")
 def delete_survey(survey_id: str = Query(...), admin_code: str = Query(...), db: Session = Depends(get_db)):
     """Exclui permanentemente a pesquisa e todos os dados (respondentes, recomendacoes)."""
     survey = _get_survey_auth(survey_id, admin_code, db)
+    code = survey.code
     db.delete(survey)
     db.commit()
+    survey_cache.invalidate(code)
+    return {"ok": True}
+
+
+@app.post("/api/admin/surveys/{survey_id}/respondents/delete")
+def delete_respondent(survey_id: str, display_id: str = Query(...), admin_code: str = Query(...), db: Session = Depends(get_db)):
+    """Remove um respondente (ex.: resposta duplicada ou de teste) e atualiza o contador."""
+    survey = _get_survey_auth(survey_id, admin_code, db)
+    respondent = db.query(Respondent).filter(Respondent.survey_id == survey.id, Respondent.display_id == display_id).first()
+    if not respondent:
+        raise HTTPException(404, "Respondente nao encontrado.")
+    db.delete(respondent)
+    record_respondents(db, survey.id, -1)
+    record_answers(db, survey.id, respondent.answers_row(), sign=-1)
+    reset_generated_recommendations(db, survey.id)
+    db.commit()
     return {"ok": True}
 
 
@@ -324,36 +396,101 @@ def update_settings(survey_id: str, body: SurveySettings, admin_code: str = Quer
         survey.is_active = body.is_active
     if body.company_name is not None:
         survey.company_name = body.company_name
+    if body.segment_options is not None:
+        survey.segment_options = _clean_segment_options(body.segment_options)
+    bump_data_version(db, survey.id)
     db.commit()
+    survey_cache.invalidate(survey.code)
     return {"ok": True}
 
 
+def _clean_segment_options(options: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    cleaned = {}
+    for field_name, values in options.items():
+        if field_name not in SEGMENT_FIELDS:
+            raise HTTPException(400, f"Campo de segmentacao invalido: {field_name}. Use: {', '.join(SEGMENT_FIELDS)}.")
+        values = list(dict.fromkeys(v.strip() for v in values if v and v.strip()))
+        if len(values) > MAX_SEGMENT_OPTIONS or any(len(v) > 100 for v in values):
+            raise HTTPException(400, f"{field_name}: no maximo {MAX_SEGMENT_OPTIONS} opcoes de ate 100 caracteres.")
+        if values:
+            cleaned[field_name] = values
+    return cleaned
+
+
+@app.post("/api/admin/surveys/{survey_id}/import")
+def import_survey_responses(
+    survey_id: str,
+    file: UploadFile = File(...),
+    admin_code: str = Query(...),
+    skip_invalid: bool = Query(False),
+    dry_run: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    """Importa respostas de um CSV/XLSX (questionarios em papel). Ver response_import.
+
+    Por padrao, qualquer linha invalida cancela a importacao (422 com os erros por linha);
+    skip_invalid=true importa as validas. dry_run=true so valida ("imported" = linhas validas).
+    """
+    survey = _get_survey_auth(survey_id, admin_code, db)
+    try:
+        report = import_responses(db, survey, file.file, file.filename, skip_invalid=skip_invalid, dry_run=dry_run)
+    except ImportFormatError as exc:
+        raise HTTPException(400, str(exc))
+    if report.imported and not dry_run:
+        metrics.SUBMISSIONS.inc(report.imported, mode="import", result="ok")
+    status_code = 422 if report.invalid and not report.imported and not dry_run else 200
+    return JSONResponse(report.to_dict(), status_code=status_code)
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Linhas lidas do cursor do servidor por lote no modo NDJSON.
+NDJSON_CHUNK_SIZE = 500
+
+
 @app.get("/api/admin/surveys/{survey_id}/responses")
-def get_responses(survey_id: str, admin_code: str = Query(...), db: Session = Depends(get_db)):
+def get_responses(
+    survey_id: str,
+    request: Request,
+    admin_code: str = Query(...),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """Scores por respondente, em ordem (submitted_at, id).
+
+    - limit/cursor: paginacao por keyset; o cursor da proxima pagina vem no header X-Next-Cursor.
+    - Accept: application/x-ndjson: uma linha JSON por respondente, lida em lotes (yield_per).
+    """
     survey = _get_survey_auth(survey_id, admin_code, db)
-    respondents = db.query(Respondent).filter(Respondent.survey_id == survey_id).order_by(Respondent.submitted_at).all()
-    result = []
-    for r in respondents:
-        responses = {int(k): int(v) for k, v in r.responses.items()}
-        dim_scores = calc_dimension_scores(responses)
-        scores_map = {d["dimension_id"]: d["score"] for d in dim_scores}
-        statuses_map = {d["dimension_id"]: d["status"] for d in dim_scores}
-        result.append({
-            "display_id": r.display_id,
-            "submitted_at": r.submitted_at.isoformat() if r.submitted_at else None,
-            "scores": scores_map,
-            "statuses": statuses_map,
-        })
-    return result
+    after = _decode_cursor(cursor)
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(_iter_responses_ndjson(survey.id, after, limit), media_type=NDJSON_MEDIA_TYPE)
+
+    query = _responses_query(db, survey.id, after)
+    respondents = query.limit(limit + 1).all() if limit else query.all()
+    headers = {}
+    if limit and len(respondents) > limit:
+        respondents = respondents[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(respondents[-1])
+    return JSONResponse(_responses_rows(respondents), headers=headers)
 
 
 @app.get("/api/admin/surveys/{survey_id}/dashboard")
-def get_dashboard(survey_id: str, admin_code: str = Query(...), db: Session = Depends(get_db)):
+def get_dashboard(
+    survey_id: str,
+    admin_code: str = Query(...),
+    respondents_limit: Optional[int] = Query(None, ge=0),
+    group_by: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """Dashboard completo; com group_by (department, site, tenure_band) inclui os resultados por segmento."""
+    if group_by is not None and group_by not in SEGMENT_FIELDS:
+        raise HTTPException(400, f"group_by deve ser um de: {', '.join(SEGMENT_FIELDS)}.")
     survey = _get_survey_auth(survey_id, admin_code, db)
-    respondents = db.query(Respondent).filter(Respondent.survey_id == survey_id).order_by(Respondent.submitted_at).all()
+    aggregate = _survey_aggregate(survey, db)
 
-    if not respondents:
-        return {
+    if not aggregate["respondents_data"]:
+        empty = {
             "company_name": survey.company_name,
             "total_respondents": 0,
             "dim_scores": [],
@@ -365,26 +502,18 @@ def get_dashboard(survey_id: str, admin_code: str = Query(...), db: Session = De
                 "curto_prazo": "",
                 "medio_prazo": "",
             },
+            "prose_status": PROSE_READY,
             "respondents": [],
         }
+        if group_by:
+            empty["segments"] = _segment_results(survey, db, group_by)
+        return empty
 
-    # Aggregate scores e dados por respondente (para tabela transposta)
-    all_dim_scores = []
-    respondents_data = []
-    for r in respondents:
-        responses = {int(k): int(v) for k, v in r.responses.items()}
-        ds = calc_dimension_scores(responses)
-        all_dim_scores.append(ds)
-        respondents_data.append({
-            "display_id": r.display_id,
-            "scores": {d["dimension_id"]: d["score"] for d in ds},
-            "statuses": {d["dimension_id"]: d["status"] for d in ds},
-        })
-
-    agg = _aggregate_dim_scores(all_dim_scores)
-    kpis = calc_kpis(agg)
-    summary = calc_summary(agg)
-    summary["total_respondents"] = len(respondents)
+    respondents_data = aggregate["respondents_data"]
+    agg = aggregate["dim_scores"]
+    kpis = aggregate["kpis"]
+    summary = dict(aggregate["summary"])
+    summary["total_respondents"] = len(respondents_data)
 
     # Recommendations
     existing_recs = db.query(Recommendation).filter(Recommendation.survey_id == survey_id).order_by(Recommendation.order_index).all()
@@ -399,19 +528,163 @@ def get_dashboard(survey_id: str, admin_code: str = Query(...), db: Session = De
             rec["order_index"] = i
         db.commit()
 
-    # Gera texto corrido consultivo (IA) a partir das recomendacoes estruturadas.
-    recommendations_prose = generate_recommendations_prose(recs)
+    # Texto corrido consultivo (IA): gerado em segundo plano; enquanto isso vai o fallback
+    # com prose_status "pending" e o painel consulta /dashboard/prose.
+    prose_status, recommendations_prose = request_prose(recs)
 
-    return {
+    result = {
         "company_name": survey.company_name,
-        "total_respondents": len(respondents),
+        "total_respondents": len(respondents_data),
         "dim_scores": agg,
         "kpis": kpis,
         "summary": summary,
         "recommendations": recs,
         "recommendations_prose": recommendations_prose,
+        "prose_status": prose_status,
         "respondents": respondents_data,
     }
+    # Tabela por respondente parcial: o restante e paginado em /responses a partir do cursor.
+    if respondents_limit is not None and len(respondents_data) > respondents_limit:
+        result["respondents"] = respondents_data[:respondents_limit]
+        last = _responses_query(db, survey.id).offset(respondents_limit - 1).first() if respondents_limit else None
+        result["respondents_next_cursor"] = _encode_cursor(last) if last else ""
+    if group_by:
+        result["segments"] = _segment_results(survey, db, group_by)
+    return result
+
+
+def _batch_scores(rows) -> np.ndarray:
+    """Scores N x 26 de linhas (answers, responses_json) lidas direto da tabela."""
+    blobs = [a if a is not None else pack_answers(json.loads(raw) if raw else {}) for a, raw in rows]
+    scores, _ = calc_dimension_scores_batch(Respondent.answers_matrix(blobs))
+    return scores
+
+
+MAX_COMPARE_WAVES = 12
+
+
+@app.get("/api/admin/compare")
+def compare_surveys(
+    survey_ids: List[str] = Query(...),
+    admin_code: str = Query(...),
+    db: Session = Depends(get_db),
+):
+    """Comparacao longitudinal entre ondas (pesquisas repetidas da mesma empresa).
+
+    Ondas em ordem cronologica (created_at). Os respondentes de todas as pesquisas sao
+    lidos numa unica consulta e agregados numa unica passada vetorizada.
+    """
+    survey_ids = list(dict.fromkeys(survey_ids))
+    if not 2 <= len(survey_ids) <= MAX_COMPARE_WAVES:
+        raise HTTPException(400, f"Informe de 2 a {MAX_COMPARE_WAVES} pesquisas.")
+    surveys = db.query(Survey).filter(Survey.id.in_(survey_ids)).all()
+    if len(surveys) != len(survey_ids):
+        raise HTTPException(404, "Pesquisa nao encontrada.")
+    if admin_code != GLOBAL_ADMIN_CODE and any(s.admin_code != admin_code for s in surveys):
+        raise HTTPException(403, "Acesso negado.")
+    surveys.sort(key=lambda s: (s.created_at or datetime.min, s.id))
+    wave_index = {s.id: i for i, s in enumerate(surveys)}
+
+    rows = (
+        db.query(Respondent.survey_id, Respondent.answers, Respondent.responses_json)
+        .filter(Respondent.survey_id.in_(survey_ids))
+        .all()
+    )
+    groups = np.array([wave_index[sid] for sid, _, _ in rows], dtype=np.int64)
+    sizes = np.bincount(groups, minlength=len(surveys))
+    if rows:
+        waves_dim_scores = aggregate_dimension_scores_by_group(
+            _batch_scores([(a, raw) for _, a, raw in rows]), groups, len(surveys)
+        )
+    else:
+        waves_dim_scores = [[] for _ in surveys]
+    waves_kpis = [calc_kpis(d) if d else {} for d in waves_dim_scores]
+
+    return {
+        "waves": [
+            {
+                "survey_id": s.id,
+                "company_name": s.company_name,
+                "created_at": s.created_at.isoformat() if s.created_at else None,
+                "respondents": int(sizes[i]),
+                "dim_scores": waves_dim_scores[i],
+                "kpis": waves_kpis[i],
+                "summary": calc_summary(waves_dim_scores[i]),
+            }
+            for i, s in enumerate(surveys)
+        ],
+        "dimensions": dimension_trends(waves_dim_scores),
+        "kpi_deltas": kpi_deltas(waves_kpis),
+    }
+
+
+def _segment_results(survey: Survey, db: Session, field_name: str) -> Dict[str, Any]:
+    """Scores/KPIs por valor do atributo: uma consulta e uma passada vetorizada sobre a matriz.
+
+    Segmentos com menos de MIN_SEGMENT_SIZE respondentes sao omitidos. Se o total omitido
+    tambem ficar abaixo do minimo, omite ainda o menor segmento visivel: do contrario o
+    grupo omitido poderia ser obtido subtraindo os segmentos visiveis do total.
+    """
+    column = getattr(Respondent, field_name)
+    rows = db.query(Respondent.answers, Respondent.responses_json, column).filter(Respondent.survey_id == survey.id).all()
+    result = {"field": field_name, "min_size": MIN_SEGMENT_SIZE, "groups": [], "suppressed_groups": 0, "suppressed_respondents": 0}
+    if not rows:
+        return result
+
+    scores = _batch_scores([(a, raw) for a, raw, _ in rows])
+    # NULL (nao informado) vira "" para o np.unique e volta como None na resposta
+    values, groups, sizes = np.unique(np.array([v or "" for _, _, v in rows], dtype=object), return_inverse=True, return_counts=True)
+    visible = sizes >= MIN_SEGMENT_SIZE
+    while 0 < sizes[~visible].sum() < MIN_SEGMENT_SIZE and visible.any():
+        visible[np.where(visible, sizes, np.iinfo(sizes.dtype).max).argmin()] = False
+
+    for value, size, dim_scores, shown in zip(values, sizes, aggregate_dimension_scores_by_group(scores, groups, len(values)), visible):
+        if not shown:
+            continue
+        result["groups"].append({
+            "value": value or None,
+            "respondents": int(size),
+            "dim_scores": dim_scores,
+            "kpis": calc_kpis(dim_scores),
+            "summary": calc_summary(dim_scores),
+        })
+    result["suppressed_groups"] = int((~visible).sum())
+    result["suppressed_respondents"] = int(sizes[~visible].sum())
+    return result
+
+
+@app.get("/api/admin/surveys/{survey_id}/dashboard/prose")
+def get_dashboard_prose(survey_id: str, admin_code: str = Query(...), db: Session = Depends(get_db)):
+    """Consulta leve da prosa de recomendacoes gerada em segundo plano para o dashboard."""
+    survey = _get_survey_auth(survey_id, admin_code, db)
+    data = _get_export_data(survey, db)
+    prose_status, recommendations_prose = request_prose(data["recommendations"])
+    return {"prose_status": prose_status, "recommendations_prose": recommendations_prose}
+
+
+@app.get("/api/admin/surveys/{survey_id}/distribution")
+def get_distribution(survey_id: str, admin_code: str = Query(...), db: Session = Depends(get_db)):
+    """Resultados agregados e distribuicao das respostas por questao, do histograma da pesquisa.
+
+    Nao le os respondentes: o custo nao depende do numero de respostas.
+    """
+    survey = _get_survey_auth(survey_id, admin_code, db)
+    counts = question_histogram(db, survey.id)
+    dim_scores = histogram_dimension_scores(counts)
+    questions = answer_distribution(counts)
+    for q in questions:
+        meta = QUESTIONS[q["question_id"]]
+        q["text"] = meta["text"]
+        q["dimension"] = meta["dimension"]
+        q["scale"] = meta["scale"]
+    return {
+        "company_name": survey.company_name,
+        "total_respondents": survey.respondent_count or 0,
+        "dim_scores": dim_scores,
+        "kpis": calc_kpis(dim_scores) if dim_scores else {},
+        "summary": calc_summary(dim_scores),
+        "questions": questions,
+    }
 
 
 @app.get("/api/admin/surveys/{survey_id}/qrcode")
@@ -426,43 +699,82 @@ def get_qrcode(survey_id: str, admin_code: str = Query(...), base_url: str = Que
     return {"qr_base64": f"data:image/png;base64,{b64}", "survey_url": url}
 
 
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PPTX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+
 @app.get("/api/admin/surveys/{survey_id}/export/excel")
-def export_excel_endpoint(survey_id: str, admin_code: str = Query(...), db: Session = Depends(get_db)):
+def export_excel_endpoint(survey_id: str, request: Request, admin_code: str = Query(...), db: Session = Depends(get_db)):
     survey = _get_survey_auth(survey_id, admin_code, db)
     data = _get_export_data(survey, db)
-    # Para o Excel mantemos o detalhamento das recomendacoes em lista estruturada.
-    buf = export_excel(
-        survey={"company_name": survey.company_name},
-        respondents_data=data["respondents_data"],
-        dim_scores_agg=data["dim_scores"],
-        kpis=data["kpis"],
-        summary=data["summary"],
-        recommendations=data["recommendations"],
-    )
-    return StreamingResponse(buf, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                             headers={"Content-Disposition": f'attachment; filename="fluir_{survey.company_name}_{datetime.now().strftime("%Y%m%d")}.xlsx"'})
+    key = _export_cache_key("xlsx", survey, data)
+    not_modified = _not_modified(request, key)
+    if not_modified is not None:
+        return not_modified
+
+    content = export_cache.get(key)
+    if content is None:
+        # Para o Excel mantemos o detalhamento das recomendacoes em lista estruturada.
+        with metrics.EXPORT_RENDER_SECONDS.time(format="xlsx", source="request"):
+            content = export_excel(
+                survey={"company_name": survey.company_name},
+                respondents_data=data["respondents_data"],
+                dim_scores_agg=data["dim_scores"],
+                kpis=data["kpis"],
+                summary=data["summary"],
+                recommendations=data["recommendations"],
+            ).getvalue()
+        export_cache.put(key, content)
+    return _export_response(content, XLSX_MEDIA_TYPE, survey, "xlsx", key)
 
 
 @app.get("/api/admin/surveys/{survey_id}/export/pptx")
-def export_pptx_endpoint(survey_id: str, admin_code: str = Query(...), db: Session = Depends(get_db)):
+def export_pptx_endpoint(survey_id: str, request: Request, admin_code: str = Query(...), db: Session = Depends(get_db)):
     """Gera relatorio em PowerPoint (.pptx) com a analise e recomendacoes em prosa."""
     survey = _get_survey_auth(survey_id, admin_code, db)
     data = _get_export_data(survey, db)
-    recommendations_prose = generate_recommendations_prose(data["recommendations"])
-    buf = export_pptx(
-        survey={"company_name": survey.company_name},
-        respondents_data=data["respondents_data"],
-        dim_scores_agg=data["dim_scores"],
-        kpis=data["kpis"],
-        summary=data["summary"],
-        recommendations=data["recommendations"],
-        recommendations_prose=recommendations_prose,
-    )
-    return StreamingResponse(
-        buf,
-        media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        headers={"Content-Disposition": f'attachment; filename="fluir_{survey.company_name}_{datetime.now().strftime("%Y%m%d")}.pptx"'},
+    key = _export_cache_key("pptx", survey, data)
+    not_modified = _not_modified(request, key)
+    if not_modified is not None:
+        return not_modified
+
+    content = export_cache.get(key)
+    if content is None:
+        recommendations_prose = generate_recommendations_prose(data["recommendations"])
+        with metrics.EXPORT_RENDER_SECONDS.time(format="pptx", source="request"):
+            content = export_pptx(recommendations_prose=recommendations_prose, **_pptx_export_kwargs(survey, data)).getvalue()
+        # Deck com prosa de fallback (falha temporaria do Gemini) nao e armazenado
+        # nem recebe ETag: senao o 304 prenderia o cliente a ele ate a chave mudar.
+        if not prose_is_final(data["recommendations"]):
+            return _export_response(content, PPTX_MEDIA_TYPE, survey, "pptx", key, final=False)
+        export_cache.put(key, content)
+    return _export_response(content, PPTX_MEDIA_TYPE, survey, "pptx", key)
+
+
+@app.post("/api/admin/surveys/{survey_id}/export/pptx/jobs", status_code=202)
+def create_pptx_export_job(survey_id: str, admin_code: str = Query(...), db: Session = Depends(get_db)):
+    """Agenda a geracao do PPTX em segundo plano (process pool); jobs identicos sao reaproveitados."""
+    survey = _get_survey_auth(survey_id, admin_code, db)
+    data = _get_export_data(survey, db)
+    job = submit_pptx_job(
+        survey.id,
+        _export_cache_key("pptx", survey, data),
+        _pptx_export_kwargs(survey, data),
+        data["recommendations"],
     )
+    return job.to_dict()
+
+
+@app.get("/api/admin/surveys/{survey_id}/export/pptx/jobs/{job_id}")
+def get_pptx_export_job(survey_id: str, job_id: str, admin_code: str = Query(...), db: Session = Depends(get_db)):
+    """Status do job; quando concluido, devolve o arquivo .pptx."""
+    survey = _get_survey_auth(survey_id, admin_code, db)
+    job = get_export_job(job_id)
+    if job is None or job.survey_id != survey.id:
+        raise HTTPException(404, "Job de exportacao nao encontrado.")
+    if job.status == JOB_DONE:
+        return _export_response(job.content, PPTX_MEDIA_TYPE, survey, "pptx", job.key, final=job.cached)
+    return job.to_dict()
 
 
 # ════════════════════════════════════════════
@@ -470,18 +782,22 @@ def export_pptx_endpoint(survey_id: str, admin_code: str = Query(...), db: Sessi
 # ════════════════════════════════════════════
 
 @app.get("/api/survey/{code}/info")
-def survey_info(code: str, db: Session = Depends(get_db)):
-    survey = db.query(Survey).filter(Survey.code == code, Survey.is_active == True).first()
-    if not survey:
+async def survey_info(code: str, db: AsyncSession = Depends(get_async_db)):
+    survey = await survey_cache.get_by_code_async(db, code)
+    if not survey or not survey.is_active:
         raise HTTPException(404, "Pesquisa não encontrada ou encerrada.")
-    return {"company_name": survey.company_name, "code": survey.code}
+    return {
+        "company_name": survey.company_name,
+        "code": survey.code,
+        "segments": [
+            {"field": f, "label": SEGMENT_LABELS[f], "options": survey.segment_options[f]}
+            for f in SEGMENT_FIELDS
+            if f in survey.segment_options
+        ],
+    }
 
 
-@app.get("/api/survey/{code}/questions")
-def survey_questions(code: str, db: Session = Depends(get_db)):
-    survey = db.query(Survey).filter(Survey.code == code, Survey.is_active == True).first()
-    if not survey:
-        raise HTTPException(404, "Pesquisa não encontrada ou encerrada.")
+def _questionnaire_pages() -> List[Dict[str, Any]]:
     pages = []
     for cat in CATEGORIES:
         questions = []
@@ -500,36 +816,88 @@ def survey_questions(code: str, db: Session = Depends(get_db)):
     return pages
 
 
+# Questionario e estatico durante a vida do processo: serializado (e comprimido) uma vez.
+QUESTIONNAIRE = precompressed(
+    json.dumps(_questionnaire_pages(), ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    "application/json",
+)
+# ETag forte deriva do conteudo: mudancas no questionario geram outro ETag no proximo deploy
+QUESTIONNAIRE_CACHE_CONTROL = "public, max-age=86400"
+
+
+@app.get("/api/survey/{code}/questions")
+async def survey_questions(code: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    survey = await survey_cache.get_by_code_async(db, code)
+    if not survey or not survey.is_active:
+        raise HTTPException(404, "Pesquisa não encontrada ou encerrada.")
+    return static_response(request, QUESTIONNAIRE, QUESTIONNAIRE_CACHE_CONTROL)
+
+
 @app.post("/api/survey/{code}/submit")
-def submit_survey(code: str, body: SubmitAnswers, db: Session = Depends(get_db)):
-    survey = db.query(Survey).filter(Survey.code == code, Survey.is_active == True).first()
-    if not survey:
+async def submit_survey(code: str, body: SubmitAnswers, db: AsyncSession = Depends(get_async_db)):
+    survey = await survey_cache.get_by_code_async(db, code)
+    if not survey or not survey.is_active:
         raise HTTPException(404, "Pesquisa não encontrada ou encerrada.")
+    mode = "batched" if submission_buffer.ENABLED else "direct"
 
     if len(body.responses) < EXPECTED_QUESTIONS:
+        metrics.SUBMISSIONS.inc(mode=mode, result="invalid")
         raise HTTPException(400, f"Todas as {EXPECTED_QUESTIONS} questões devem ser respondidas. Recebidas: {len(body.responses)}")
 
     for q_id, val in body.responses.items():
         if not (1 <= val <= 5):
+            metrics.SUBMISSIONS.inc(mode=mode, result="invalid")
             raise HTTPException(400, f"Questão {q_id}: valor deve ser entre 1 e 5.")
 
+    attributes = {}
+    for field_name, value in body.attributes.items():
+        if not value:
+            continue  # "Prefiro nao informar"
+        if value not in survey.segment_options.get(field_name, ()):
+            metrics.SUBMISSIONS.inc(mode=mode, result="invalid")
+            raise HTTPException(400, f"Valor invalido para {field_name}.")
+        attributes[field_name] = value
+
     # UUID curto evita colisao em submissoes simultaneas (sem migracao de schema)
     display_id = f"R{uuid.uuid4().hex[:8]}"
 
-    respondent = Respondent(
-        id=generate_uuid(),
-        survey_id=survey.id,
-        display_id=display_id,
-        responses_json=json.dumps(body.responses),
-    )
-    db.add(respondent)
+    if submission_buffer.ENABLED:
+        # Group commit: o writer grava em lote e so libera a resposta apos o commit.
+        # Encerra a transacao de leitura antes de esperar, devolvendo a conexao ao pool
+        # (com muitas requisicoes aguardando, o writer ficaria sem conexao).
+        await db.rollback()
+        try:
+            await submission_buffer.submit_async(survey.id, display_id, pack_answers(body.responses), attributes)
+        except submission_buffer.SubmissionTimeout:
+            metrics.SUBMISSIONS.inc(mode="batched", result="timeout")
+            raise HTTPException(503, "Sistema sobrecarregado. Tente enviar novamente.")
+        except submission_buffer.SurveyClosed:
+            survey_cache.invalidate(code)
+            metrics.SUBMISSIONS.inc(mode="batched", result="closed")
+            raise HTTPException(404, "Pesquisa não encontrada ou encerrada.")
+    else:
+        # O cache pode estar defasado (encerrada/excluida em outro worker): o UPDATE do
+        # contador so afeta pesquisa ativa e vem antes do INSERT do respondente
+        if not await record_respondents_async(db, survey.id, 1, only_active=True):
+            await db.rollback()
+            survey_cache.invalidate(code)
+            metrics.SUBMISSIONS.inc(mode="direct", result="closed")
+            raise HTTPException(404, "Pesquisa não encontrada ou encerrada.")
+        respondent = Respondent(
+            id=generate_uuid(),
+            survey_id=survey.id,
+            display_id=display_id,
+            answers=pack_answers(body.responses),
+            **attributes,
+        )
+        db.add(respondent)
+        await record_answers_async(db, survey.id, respondent.answers)
 
-    # Regenerate recommendations if we had existing ones
-    existing_custom = db.query(Recommendation).filter(Recommendation.survey_id == survey.id, Recommendation.is_custom == True).all()
-    if not existing_custom:
-        db.query(Recommendation).filter(Recommendation.survey_id == survey.id).delete()
+        # Regenerate recommendations if we had existing ones
+        await reset_generated_recommendations_async(db, survey.id)
 
-    db.commit()
+        await db.commit()
+    metrics.SUBMISSIONS.inc(mode=mode, result="ok")
 
     return {
         "ok": True,
@@ -540,8 +908,8 @@ def submit_survey(code: str, body: SubmitAnswers, db: Session = Depends(get_db))
 
 
 @app.get("/api/survey/{code}/thanks")
-def survey_thanks(code: str, db: Session = Depends(get_db)):
-    survey = db.query(Survey).filter(Survey.code == code).first()
+async def survey_thanks(code: str, db: AsyncSession = Depends(get_async_db)):
+    survey = await survey_cache.get_by_code_async(db, code)
     if not survey:
         raise HTTPException(404)
     return {"title": survey.thank_you_title, "message": survey.thank_you_message}
@@ -551,6 +919,16 @@ def survey_thanks(code: str, db: Session = Depends(get_db)):
 # HELPERS
 # ════════════════════════════════════════════
 
+def _client_ip(request: Request) -> str:
+    """IP do cliente: a entrada do X-Forwarded-For gravada pelo proxy confiavel mais externo
+    (contando da direita), nunca a mais a esquerda, que o proprio cliente pode forjar."""
+    peer = request.client.host if request.client else ""
+    if TRUSTED_PROXY_HOPS <= 0:
+        return peer
+    hops = [h.strip() for h in ",".join(request.headers.getlist("x-forwarded-for")).split(",") if h.strip()]
+    return hops[-TRUSTED_PROXY_HOPS] if len(hops) >= TRUSTED_PROXY_HOPS else peer
+
+
 def _get_survey_auth(survey_id: str, admin_code: str, db: Session) -> Survey:
     survey = db.query(Survey).filter(Survey.id == survey_id).first()
     if not survey:
@@ -560,8 +938,15 @@ def _get_survey_auth(survey_id: str, admin_code: str, db: Session) -> Survey:
     return survey
 
 
-def _survey_brief(s: Survey, db: Session) -> Dict[str, Any]:
-    count = db.query(Respondent).filter(Respondent.survey_id == s.id).count()
+def _survey_briefs(surveys: List[Survey], db: Session) -> List[Dict[str, Any]]:
+    """Resumo de varias pesquisas com as contagens de respondentes numa unica consulta."""
+    counts = respondent_counts(db, [s.id for s in surveys])
+    return [_survey_brief(s, db, counts.get(s.id, 0)) for s in surveys]
+
+
+def _survey_brief(s: Survey, db: Session, count: Optional[int] = None) -> Dict[str, Any]:
+    if count is None:
+        count = s.respondent_count or 0
     return {
         "id": s.id,
         "code": s.code,
@@ -576,11 +961,12 @@ def _survey_detail(s: Survey, db: Session) -> Dict[str, Any]:
     brief = _survey_brief(s, db)
     brief["thank_you_title"] = s.thank_you_title
     brief["thank_you_message"] = s.thank_you_message
+    brief["segment_options"] = s.segment_options
     return brief
 
 
 def _aggregate_dim_scores(all_scores: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
-    """Average dimension scores across all respondents."""
+    """Average dimension scores across all respondents (caminho escalar; referencia do motor vetorizado)."""
     totals = defaultdict(lambda: {"scores": [], "type": None, "name": None, "category": None, "description": None})
     for respondent_scores in all_scores:
         for d in respondent_scores:
@@ -607,26 +993,161 @@ def _aggregate_dim_scores(all_scores: List[List[Dict[str, Any]]]) -> List[Dict[s
     return result
 
 
-def _get_export_data(survey: Survey, db: Session) -> Dict[str, Any]:
-    respondents = db.query(Respondent).filter(Respondent.survey_id == survey.id).order_by(Respondent.submitted_at).all()
+def _survey_aggregate(survey: Survey, db: Session) -> Dict[str, Any]:
+    """Scores agregados, KPIs, resumo e dados por respondente, servidos do snapshot quando valido.
+
+    O snapshot e recalculado quando Survey.data_version mudou desde a ultima materializacao.
+    """
+    version = survey.data_version or 0
+    snapshot = db.query(DashboardSnapshot).filter(DashboardSnapshot.survey_id == survey.id).first()
+    if snapshot is not None and snapshot.data_version == version:
+        return snapshot.payload
+
+    respondents = _responses_query(db, survey.id).all()
     if not respondents:
-        return {"dim_scores": [], "kpis": {}, "summary": {"green": 0, "yellow": 0, "red": 0, "total": 0}, "recommendations": [], "respondents_data": []}
+        return {"dim_scores": [], "kpis": {}, "summary": {"green": 0, "yellow": 0, "red": 0, "total": 0}, "respondents_data": []}
 
-    all_dim_scores = []
-    respondents_data = []
-    for r in respondents:
-        responses = {int(k): int(v) for k, v in r.responses.items()}
-        ds = calc_dimension_scores(responses)
-        all_dim_scores.append(ds)
-        respondents_data.append({
+    scores, statuses = calc_dimension_scores_batch(Respondent.answers_matrix(respondents))
+    respondents_data = [
+        {"display_id": r.display_id, "scores": scores_map, "statuses": statuses_map}
+        for r, (scores_map, statuses_map) in zip(respondents, dimension_maps(scores, statuses))
+    ]
+
+    agg = aggregate_dimension_scores(scores)
+    payload = {
+        "dim_scores": agg,
+        "kpis": calc_kpis(agg),
+        "summary": calc_summary(agg),
+        "respondents_data": respondents_data,
+    }
+
+    if snapshot is None:
+        snapshot = DashboardSnapshot(survey_id=survey.id)
+        db.add(snapshot)
+    snapshot.data_version = version
+    snapshot.payload = payload
+    snapshot.created_at = datetime.now(timezone.utc)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Outro worker materializou o mesmo snapshot em paralelo; o resultado e equivalente.
+        db.rollback()
+    return payload
+
+
+def _responses_query(db: Session, survey_id: str, after: Optional[tuple] = None):
+    """Respondentes em ordem de keyset (submitted_at, id), opcionalmente apos um cursor."""
+    query = db.query(Respondent).filter(Respondent.survey_id == survey_id)
+    if after is not None:
+        ts, rid = after
+        query = query.filter(or_(
+            Respondent.submitted_at > ts,
+            and_(Respondent.submitted_at == ts, Respondent.id > rid),
+        ))
+    return query.order_by(Respondent.submitted_at, Respondent.id)
+
+
+def _encode_cursor(r: Respondent) -> str:
+    raw = json.dumps([r.submitted_at.isoformat() if r.submitted_at else None, r.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    if not cursor:
+        return None
+    try:
+        ts, rid = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return (datetime.fromisoformat(ts) if ts else None, str(rid))
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(400, "Cursor invalido.")
+
+
+def _responses_rows(respondents: List[Respondent]) -> List[Dict[str, Any]]:
+    scores, statuses = calc_dimension_scores_batch(Respondent.answers_matrix(respondents))
+    return [
+        {
             "display_id": r.display_id,
-            "scores": {d["dimension_id"]: d["score"] for d in ds},
-            "statuses": {d["dimension_id"]: d["status"] for d in ds},
-        })
+            "submitted_at": r.submitted_at.isoformat() if r.submitted_at else None,
+            "scores": scores_map,
+            "statuses": statuses_map,
+        }
+        for r, (scores_map, statuses_map) in zip(respondents, dimension_maps(scores, statuses))
+    ]
+
+
+def _iter_responses_ndjson(survey_id: str, after: Optional[tuple], limit: Optional[int]):
+    """Gera linhas NDJSON com sessao propria e cursor do servidor (memoria constante)."""
+    db = SessionLocal()
+    try:
+        query = _responses_query(db, survey_id, after)
+        if limit:
+            query = query.limit(limit)
+        chunk = []
+        for r in query.yield_per(NDJSON_CHUNK_SIZE):
+            chunk.append(r)
+            if len(chunk) >= NDJSON_CHUNK_SIZE:
+                yield "".join(json.dumps(row) + "\n" for row in _responses_rows(chunk))
+                chunk = []
+                db.expunge_all()
+        if chunk:
+            yield "".join(json.dumps(row) + "\n" for row in _responses_rows(chunk))
+    finally:
+        db.close()
+
+
+def _export_cache_key(kind: str, survey: Survey, data: Dict[str, Any]) -> str:
+    return export_cache.make_key(
+        kind,
+        survey.id,
+        survey.data_version or 0,
+        export_cache.recommendations_hash(data["recommendations"]),
+        PPT_FORMAT_VERSION,
+        datetime.now().strftime("%Y%m%d"),
+    )
+
+
+def _pptx_export_kwargs(survey: Survey, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Argumentos de export_pptx (exceto a prosa), serializaveis para o process pool."""
+    return {
+        "survey": {"company_name": survey.company_name},
+        "respondents_data": data["respondents_data"],
+        "dim_scores_agg": data["dim_scores"],
+        "kpis": data["kpis"],
+        "summary": data["summary"],
+        "recommendations": data["recommendations"],
+    }
+
+
+def _not_modified(request: Request, key: str) -> Optional[Response]:
+    """304 quando o cliente ja tem o arquivo desta versao (If-None-Match)."""
+    etag = export_cache.etag_for(key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+def _export_response(content: bytes, media_type: str, survey: Survey, ext: str, key: str, final: bool = True) -> Response:
+    """final=False: arquivo provisorio (prosa de fallback), sem ETag e sem cache no cliente."""
+    headers = {
+        "Content-Disposition": f'attachment; filename="fluir_{survey.company_name}_{datetime.now().strftime("%Y%m%d")}.{ext}"',
+    }
+    if final:
+        headers["ETag"] = export_cache.etag_for(key)
+        headers["Cache-Control"] = "private, no-cache"
+    else:
+        headers["Cache-Control"] = "no-store"
+    return Response(content, media_type=media_type, headers=headers)
+
+
+def _get_export_data(survey: Survey, db: Session) -> Dict[str, Any]:
+    aggregate = _survey_aggregate(survey, db)
+    if not aggregate["respondents_data"]:
+        return {"dim_scores": [], "kpis": {}, "summary": {"green": 0, "yellow": 0, "red": 0, "total": 0}, "recommendations": [], "respondents_data": []}
 
-    agg = _aggregate_dim_scores(all_dim_scores)
-    kpis = calc_kpis(agg)
-    summary = calc_summary(agg)
+    agg = aggregate["dim_scores"]
+    kpis = aggregate["kpis"]
+    summary = aggregate["summary"]
+    respondents_data = aggregate["respondents_data"]
 
     recs = db.query(Recommendation).filter(Recommendation.survey_id == survey.id).order_by(Recommendation.order_index).all()
     recs_list = [{"title": r.title, "description": r.description, "priority": r.priority, "dimension_ids": r.dimension_ids, "is_custom": r.is_custom} for r in recs]
@@ -0,0 +1,249 @@
+"""
+Fluir — Metricas de runtime no formato texto do Prometheus
+Registro em memoria por processo (sem dependencias): contadores e histogramas com
+labels, um middleware ASGI que mede latencia por rota/status e coletores que
+expoem os stats dos caches e filas no momento da leitura. Com varios workers,
+cada processo tem os seus numeros (o scraper soma pelas series).
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+ENABLED = os.getenv("FLUIR_METRICS", "1").lower() not in ("0", "false", "no")
+
+# Segundos; cobre de assets em memoria (ms) a exportacoes PPTX (dezenas de s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Rota nao encontrada: um unico label em vez do caminho (evita explosao de series)
+UNMATCHED_ROUTE = "<unmatched>"
+
+_lock = threading.Lock()
+_metrics: List["_Metric"] = []
+# Funcoes chamadas na leitura: devolvem {nome: valor} ja prefixado
+_collectors: List[Tuple[str, Callable[[], Dict[str, object]]]] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple, object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            series = sorted(self._series.items())
+            lines.extend(self._render_series(series))
+        return lines
+
+    def clear(self) -> None:
+        with _lock:
+            self._series.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, series):
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in series]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        # Contagem por bucket (nao cumulativa); a soma acumulada e feita so na leitura
+        idx = bisect_left(self.buckets, value)
+        with _lock:
+            entry = self._series.get(key)
+            if entry is None:
+                entry = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][idx] += 1
+            entry[1] += value
+
+    def time(self, **labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> int:
+        entry = self._series.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def _render_series(self, series):
+        lines = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self._t0, **self.labels)
+        return False
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def counter(name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+    return _register(Counter(name, help_text, labels))
+
+
+def gauge(name: str, help_text: str, labels: Iterable[str] = ()) -> Gauge:
+    return _register(Gauge(name, help_text, labels))
+
+
+def histogram(name: str, help_text: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help_text, labels, buckets))
+
+
+def register_collector(prefix: str, fn: Callable[[], Dict[str, object]]) -> None:
+    """fn() -> stats numericos (ex.: survey_cache.stats); expostos como gauges prefix_chave."""
+    _collectors.append((prefix, fn))
+
+
+# ────── Metricas da aplicacao ──────
+
+HTTP_REQUEST_SECONDS = histogram(
+    "fluir_http_request_duration_seconds", "Latencia das requisicoes HTTP por rota e status.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = gauge("fluir_http_requests_in_flight", "Requisicoes HTTP em andamento.")
+GEMINI_CALLS = counter(
+    "fluir_gemini_calls_total", "Chamadas a API do Gemini por resultado (ok, empty, invalid_json, error).",
+    ("result",),
+)
+GEMINI_SECONDS = histogram("fluir_gemini_call_duration_seconds", "Duracao das chamadas a API do Gemini.")
+EXPORT_RENDER_SECONDS = histogram(
+    "fluir_export_render_duration_seconds", "Renderizacoes de exportacao (cache miss) por formato e origem.",
+    ("format", "source"),
+)
+SUBMISSIONS = counter(
+    "fluir_submissions_total", "Submissoes de questionario por modo (direct, batched, import) e resultado.",
+    ("mode", "result"),
+)
+
+
+def _render_collectors() -> List[str]:
+    lines = []
+    for prefix, fn in _collectors:
+        try:
+            values = fn()
+        except Exception:
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            name = f"{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+    return lines
+
+
+def render() -> str:
+    """Todas as metricas no formato de exposicao texto 0.0.4."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    lines.extend(_render_collectors())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsMiddleware:
+    """ASGI puro (sem BaseHTTPMiddleware): mede do inicio ao ultimo byte da resposta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # O roteador grava a rota no scope: usa o template (/api/survey/{code}/info)
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - t0,
+                method=scope["method"],
+                route=getattr(route, "path", None) or UNMATCHED_ROUTE,
+                status=status,
+            )
@@ -0,0 +1,175 @@
+"""
+Fluir — Migracoes de schema versionadas
+Cada migracao roda uma unica vez, em ordem, e fica registrada em schema_version.
+create_all continua criando tabelas novas; aqui ficam indices e conversoes de dados
+que create_all nao aplica em bancos ja existentes.
+"""
+
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from database import QuestionHistogram, Respondent, SchemaVersion, Survey, pack_answers, rebuild_question_histogram
+
+logger = logging.getLogger(__name__)
+
+# Chave arbitraria do pg_advisory_lock: serializa workers subindo ao mesmo tempo
+_PG_LOCK_KEY = 7_150_311
+# Engines cujo lock ja e mantido por esta thread (init_db envolve run_migrations)
+_held = threading.local()
+
+
+@contextmanager
+def schema_lock(engine):
+    """pg_advisory_lock em volta de DDL de inicializacao; reentrante na mesma thread.
+
+    Sem isso, workers subindo juntos disputam create_all / ADD COLUMN e um deles
+    cai com tabela ou coluna duplicada. No SQLite nao faz nada.
+    """
+    held = getattr(_held, "engines", None)
+    if held is None:
+        held = _held.engines = set()
+    if engine.dialect.name != "postgresql" or id(engine) in held:
+        yield
+        return
+    lock_conn = engine.connect()
+    lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": _PG_LOCK_KEY})
+    held.add(id(engine))
+    try:
+        yield
+    finally:
+        held.discard(id(engine))
+        lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _PG_LOCK_KEY})
+        lock_conn.close()
+
+
+def hot_path_indexes(engine):
+    """Indices das consultas quentes: dashboard/export/paginacao, login e recomendacoes."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_respondents_survey_submitted "
+            "ON respondents (survey_id, submitted_at, id)"
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_surveys_admin_code ON surveys (admin_code)"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_recommendations_survey_order "
+            "ON recommendations (survey_id, order_index)"
+        ))
+
+
+def relax_responses_json(engine):
+    """Remove NOT NULL de respondents.responses_json em bancos criados antes do formato compacto."""
+    insp = inspect(engine)
+    legacy_cols = insp.get_columns("respondents")
+    col = next((c for c in legacy_cols if c["name"] == "responses_json"), None)
+    if col is None or col["nullable"]:
+        return
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            # SQLite nao suporta ALTER COLUMN: recria a tabela com o schema atual.
+            # Nomes de indice sao globais no SQLite; os da tabela antiga saem antes do create.
+            # So as colunas que a tabela antiga tem (as demais ficam com o default)
+            present = {c["name"] for c in legacy_cols}
+            cols = ", ".join(c.name for c in Respondent.__table__.columns if c.name in present)
+            conn.execute(text("ALTER TABLE respondents RENAME TO respondents_legacy"))
+            legacy_indexes = conn.execute(text(
+                "SELECT name FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = 'respondents_legacy' AND sql IS NOT NULL"
+            )).scalars().all()
+            for name in legacy_indexes:
+                conn.execute(text(f'DROP INDEX "{name}"'))
+            Respondent.__table__.create(conn)
+            conn.execute(text(f"INSERT INTO respondents ({cols}) SELECT {cols} FROM respondents_legacy"))
+            conn.execute(text("DROP TABLE respondents_legacy"))
+        else:
+            conn.execute(text("ALTER TABLE respondents ALTER COLUMN responses_json DROP NOT NULL"))
+
+
+def pack_legacy_responses(engine, batch_size: int = 1000):
+    """Converte responses_json (texto) em answers (41 bytes) e limpa o texto."""
+    table = Respondent.__table__
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                table.select()
+                .with_only_columns(table.c.id, table.c.responses_json)
+                .where(table.c.answers.is_(None), table.c.responses_json.is_not(None))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return
+            for row_id, raw in rows:
+                try:
+                    responses = json.loads(raw) if raw else {}
+                except ValueError:
+                    responses = {}
+                conn.execute(
+                    table.update()
+                    .where(table.c.id == row_id)
+                    .values(answers=pack_answers(responses), responses_json=None)
+                )
+
+
+def backfill_question_histograms(engine):
+    """Preenche survey_question_histogram das pesquisas que ja tinham respondentes."""
+    QuestionHistogram.__table__.create(engine, checkfirst=True)
+    with Session(engine) as db:
+        survey_ids = [sid for (sid,) in db.query(Survey.id).filter(Survey.respondents.any())]
+        for survey_id in survey_ids:
+            rebuild_question_histogram(db, survey_id)
+            # Um commit por pesquisa: transacoes curtas em bases grandes
+            db.commit()
+
+
+def segment_indexes(engine):
+    """Indices das colunas de segmentacao (as colunas vem de _add_missing_columns)."""
+    existing = {c["name"] for c in inspect(engine).get_columns("respondents")}
+    with engine.begin() as conn:
+        for column in ("department", "site", "tenure_band"):
+            if column not in existing:
+                continue
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_respondents_survey_{column} ON respondents (survey_id, {column})"
+            ))
+
+
+# (versao, nome, funcao) — somente acrescentar ao final; nunca renumerar
+MIGRATIONS = [
+    (1, "hot_path_indexes", hot_path_indexes),
+    (2, "relax_responses_json", relax_responses_json),
+    (3, "pack_legacy_responses", pack_legacy_responses),
+    (4, "backfill_question_histograms", backfill_question_histograms),
+    (5, "segment_indexes", segment_indexes),
+]
+
+
+def applied_versions(engine) -> set:
+    table = SchemaVersion.__table__
+    with engine.connect() as conn:
+        return set(conn.execute(table.select().with_only_columns(table.c.version)).scalars())
+
+
+def run_migrations(engine, migrations=None) -> list:
+    """Aplica as migracoes pendentes em ordem. Retorna as versoes aplicadas nesta chamada."""
+    migrations = sorted(migrations if migrations is not None else MIGRATIONS, key=lambda m: m[0])
+    with schema_lock(engine):
+        SchemaVersion.__table__.create(engine, checkfirst=True)
+        done = applied_versions(engine)
+        applied = []
+        table = SchemaVersion.__table__
+        for version, name, fn in migrations:
+            if version in done:
+                continue
+            logger.info("Aplicando migracao %s (%s)", version, name)
+            fn(engine)
+            with engine.begin() as conn:
+                conn.execute(table.insert().values(
+                    version=version, name=name, applied_at=datetime.now(timezone.utc),
+                ))
+            applied.append(version)
+        return applied
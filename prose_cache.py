@@ -0,0 +1,176 @@
+"""
+Fluir — Cache da prosa de recomendacoes (Gemini)
+Enderecado pelo conteudo: hash das recomendacoes agrupadas + prompt + modelo.
+LRU em memoria na frente da tabela prose_cache, com TTL e limite de tamanho.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import SessionLocal, ProseCacheEntry
+
+# TTL das entradas (segundos); padrao 30 dias.
+TTL_SECONDS = int(os.getenv("FLUIR_PROSE_CACHE_TTL", str(30 * 24 * 3600)))
+# Limite de linhas na tabela; as menos usadas recentemente sao removidas.
+MAX_ENTRIES = int(os.getenv("FLUIR_PROSE_CACHE_MAX", "500"))
+# Limite do LRU em memoria (por processo).
+MEMORY_ENTRIES = int(os.getenv("FLUIR_PROSE_CACHE_MEMORY", "64"))
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_memory: "OrderedDict[str, Tuple[float, Dict[str, str]]]" = OrderedDict()
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def make_key(grouped: Dict[str, Any], prompt: str, model: str, prompt_version: str) -> str:
+    """Hash SHA-256 do conteudo que determina a prosa (recomendacoes agrupadas, prompt e modelo)."""
+    content = {
+        key: [[rec.get("title") or "", rec.get("description") or ""] for rec in items]
+        for key, items in grouped.items()
+    }
+    raw = json.dumps(
+        {"model": model, "prompt_version": prompt_version, "grouped": content, "prompt": prompt},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _as_utc(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _remember(key: str, expires_at: float, value: Dict[str, str]) -> None:
+    with _lock:
+        _memory[key] = (expires_at, value)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def get(key: str) -> Optional[Dict[str, str]]:
+    """Retorna a prosa em cache (memoria, depois tabela) ou None se ausente/expirada."""
+    return _lookup(key, count=True)
+
+
+def peek(key: str) -> Optional[Dict[str, str]]:
+    """Como get, sem contar acerto/falta: para reconferir uma chave ja consultada
+    (ex.: prose_is_final apos a geracao), sem inflar os contadores."""
+    return _lookup(key, count=False)
+
+
+def _lookup(key: str, count: bool) -> Optional[Dict[str, str]]:
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                _memory.move_to_end(key)
+                if count:
+                    _stats["memory_hits"] += 1
+                return dict(entry[1])
+            del _memory[key]
+
+    db = SessionLocal()
+    try:
+        row = db.query(ProseCacheEntry).filter(ProseCacheEntry.key == key).first()
+        if row is not None:
+            expires_at = _as_utc(row.created_at).timestamp() + TTL_SECONDS
+            if expires_at > now:
+                value = json.loads(row.payload_json)
+                row.last_used_at = datetime.now(timezone.utc)
+                db.commit()
+                _remember(key, expires_at, value)
+                if count:
+                    with _lock:
+                        _stats["db_hits"] += 1
+                return dict(value)
+            db.delete(row)
+            db.commit()
+    except SQLAlchemyError as exc:
+        db.rollback()
+        logger.warning("Prose cache lookup failed: %s", exc)
+    finally:
+        db.close()
+
+    if count:
+        with _lock:
+            _stats["misses"] += 1
+    return None
+
+
+def put(key: str, model: str, value: Dict[str, str]) -> None:
+    """Armazena a prosa na memoria e na tabela, aplicando expiracao e o limite de tamanho."""
+    now = datetime.now(timezone.utc)
+    _remember(key, now.timestamp() + TTL_SECONDS, dict(value))
+
+    db = SessionLocal()
+    try:
+        row = db.query(ProseCacheEntry).filter(ProseCacheEntry.key == key).first()
+        if row is None:
+            row = ProseCacheEntry(key=key)
+            db.add(row)
+        row.model = model
+        row.payload_json = json.dumps(value, ensure_ascii=False)
+        row.created_at = now
+        row.last_used_at = now
+        db.commit()
+
+        evicted = (
+            db.query(ProseCacheEntry)
+            .filter(ProseCacheEntry.created_at < now - timedelta(seconds=TTL_SECONDS))
+            .delete(synchronize_session=False)
+        )
+        overflow = db.query(ProseCacheEntry).count() - MAX_ENTRIES
+        if overflow > 0:
+            oldest = [
+                k for (k,) in db.query(ProseCacheEntry.key)
+                .order_by(ProseCacheEntry.last_used_at)
+                .limit(overflow)
+            ]
+            evicted += (
+                db.query(ProseCacheEntry)
+                .filter(ProseCacheEntry.key.in_(oldest))
+                .delete(synchronize_session=False)
+            )
+        db.commit()
+        with _lock:
+            _stats["stores"] += 1
+            _stats["evictions"] += evicted
+    except SQLAlchemyError as exc:
+        db.rollback()
+        logger.warning("Prose cache store failed: %s", exc)
+    finally:
+        db.close()
+
+
+def stats() -> Dict[str, int]:
+    """Contadores de acertos/faltas desde o inicio do processo (uma contagem por consulta logica)."""
+    with _lock:
+        result = dict(_stats)
+        result["memory_entries"] = len(_memory)
+    return result
+
+
+def clear() -> None:
+    """Esvazia o LRU em memoria e a tabela, e zera os contadores."""
+    with _lock:
+        _memory.clear()
+        for k in _stats:
+            _stats[k] = 0
+    db = SessionLocal()
+    try:
+        db.query(ProseCacheEntry).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,112 @@
+"""
+Fluir — Geracao da prosa de recomendacoes em segundo plano
+O dashboard responde imediatamente com o texto de fallback e a prosa do Gemini
+e produzida por um pool de threads; o painel consulta /dashboard/prose ate ficar pronta.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from gemini_prose_service import (
+    cached_recommendations_prose,
+    fallback_recommendations_prose,
+    generate_recommendations_prose,
+    prose_is_final,
+    prose_is_immediate,
+    recommendations_cache_key,
+)
+
+PROSE_READY = "ready"
+PROSE_PENDING = "pending"
+
+# Jobs concluidos mantidos em memoria. Prosa final sai no primeiro acesso (dai em diante
+# vem do prose_cache); fallback apos falha do Gemini fica RETRY_AFTER_S, para o painel
+# nao disparar nova geracao a cada consulta, e depois a proxima consulta tenta de novo.
+MAX_FINISHED_JOBS = 128
+RETRY_AFTER_S = float(os.getenv("FLUIR_PROSE_RETRY_S", "60"))
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("FLUIR_PROSE_WORKERS", "2")),
+    thread_name_prefix="fluir-prose",
+)
+_lock = threading.Lock()
+_jobs: "OrderedDict[str, Future]" = OrderedDict()
+
+
+def _forget_finished() -> None:
+    finished = [k for k, f in _jobs.items() if f.done()]
+    for key in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[key]
+
+
+def _generate(recommendations: List[Dict]) -> Tuple[Dict[str, str], bool]:
+    """(prosa, final). O cache acabou de ser consultado pelo chamador: nao consulta de novo."""
+    prose = generate_recommendations_prose(recommendations, False)
+    return prose, prose_is_final(recommendations)
+
+
+def _mark_finished(future: Future) -> None:
+    future.finished_at = time.monotonic()
+
+
+def _outcome(future: Future, recommendations: List[Dict]) -> Tuple[Dict[str, str], bool]:
+    """(prosa, final) de um job concluido; excecao vira fallback nao final."""
+    try:
+        return future.result()
+    except Exception as exc:
+        logger.warning("Background prose generation failed: %s", exc)
+        return fallback_recommendations_prose(recommendations), False
+
+
+def _retry_due(future: Future) -> bool:
+    """Job concluido com fallback ha mais de RETRY_AFTER_S."""
+    if not future.done() or (future.exception() is None and future.result()[1]):
+        return False
+    return time.monotonic() - getattr(future, "finished_at", time.monotonic()) >= RETRY_AFTER_S
+
+
+def request_prose(recommendations: List[Dict]) -> Tuple[str, Dict[str, str]]:
+    """Retorna (status, prosa) sem bloquear no Gemini.
+
+    - 'ready' com a prosa final quando nao ha IA envolvida, quando ha cache ou o job terminou;
+    - 'pending' com o texto de fallback, agendando a geracao (uma por conteudo) se necessario.
+    Cada chamada consulta o prose_cache no maximo uma vez; com job em andamento, nenhuma
+    (as consultas do painel nao inflam as faltas).
+    """
+    if prose_is_immediate(recommendations):
+        return PROSE_READY, generate_recommendations_prose(recommendations)
+
+    key = recommendations_cache_key(recommendations)
+    with _lock:
+        future = _jobs.get(key)
+        if future is not None and _retry_due(future):
+            # Fallback antigo: descarta para agendar nova tentativa
+            del _jobs[key]
+            future = None
+    if future is None:
+        cached = cached_recommendations_prose(recommendations)
+        if cached is not None:
+            return PROSE_READY, cached
+        with _lock:
+            future = _jobs.get(key)
+            if future is None:
+                future = _executor.submit(_generate, list(recommendations))
+                future.add_done_callback(_mark_finished)
+                _jobs[key] = future
+                _forget_finished()
+
+    if future.done():
+        prose, final = _outcome(future, recommendations)
+        if final:
+            with _lock:
+                if _jobs.get(key) is future:
+                    del _jobs[key]
+        return PROSE_READY, prose
+    return PROSE_PENDING, fallback_recommendations_prose(recommendations)
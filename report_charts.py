@@ -0,0 +1,133 @@
+"""
+Fluir — Graficos do relatorio PPT (radar por categoria e barras por dimensao)
+Usa a API orientada a objetos do matplotlib (Figure + FigureCanvasAgg), sem o estado
+global do pyplot. Eixos e rotulos sao montados uma vez por conjunto de rotulos; cada
+render so atualiza os artistas de dados. O PNG e memoizado pelo hash dos scores.
+"""
+
+import hashlib
+import io
+import json
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+STATUS_COLORS = {"green": "#6B9F7E", "yellow": "#D4A843", "red": "#C46B6B"}
+DEFAULT_COLOR = "#D4A843"
+LINE_COLOR = "#6B82A8"
+DPI = 120
+# PNGs memoizados (por processo); cada grafico tem ~50-100 KB.
+MAX_MEMO_ENTRIES = 64
+
+
+class _RadarTemplate:
+    """Figura polar com eixos e rotulos fixos; so linha e area mudam entre renders."""
+
+    def __init__(self, labels: Tuple[str, ...]):
+        self.lock = threading.Lock()
+        self.fig = Figure(figsize=(8, 6))
+        FigureCanvasAgg(self.fig)
+        ax = self.fig.add_subplot(projection="polar")
+        num = len(labels)
+        self.angles = [2 * math.pi * i / num for i in range(num)] + [0.0]
+        zeros = [0.0] * (num + 1)
+        (self.line,) = ax.plot(self.angles, zeros, "o-", linewidth=2, color=LINE_COLOR)
+        (self.area,) = ax.fill(self.angles, zeros, alpha=0.15, color=LINE_COLOR)
+        ax.set_xticks(self.angles[:-1])
+        ax.set_xticklabels(labels, size=9, wrap=True)
+        ax.set_ylim(0, 5)
+        ax.set_yticks([1, 2, 3, 4, 5])
+
+    def render(self, values: List[float]) -> bytes:
+        closed = list(values) + [values[0]]
+        with self.lock:
+            self.line.set_ydata(closed)
+            self.area.set_xy(list(zip(self.angles, closed)))
+            return _to_png(self.fig)
+
+
+class _BarTemplate:
+    """Barras horizontais com rotulos fixos; so largura e cor de cada barra mudam."""
+
+    def __init__(self, labels: Tuple[str, ...]):
+        self.lock = threading.Lock()
+        self.fig = Figure(figsize=(12, 8))
+        FigureCanvasAgg(self.fig)
+        ax = self.fig.add_subplot()
+        y_pos = range(len(labels))
+        self.bars = ax.barh(y_pos, [0.0] * len(labels), height=0.7)
+        ax.set_yticks(y_pos)
+        ax.set_yticklabels(labels, fontsize=9)
+        ax.set_xlim(0, 5)
+        ax.set_xlabel("Score")
+
+    def render(self, values: List[float], colors: List[str]) -> bytes:
+        with self.lock:
+            for bar, value, color in zip(self.bars, values, colors):
+                bar.set_width(value)
+                bar.set_color(color)
+            return _to_png(self.fig)
+
+
+_lock = threading.Lock()
+_templates: Dict[Tuple[str, Tuple[str, ...]], Any] = {}
+_memo: "OrderedDict[str, bytes]" = OrderedDict()
+_stats = {"hits": 0, "renders": 0}
+
+
+def _to_png(fig: Figure) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=DPI, bbox_inches="tight")
+    return buf.getvalue()
+
+
+def _template(kind: str, labels: Tuple[str, ...]):
+    with _lock:
+        tpl = _templates.get((kind, labels))
+        if tpl is None:
+            tpl = (_RadarTemplate if kind == "radar" else _BarTemplate)(labels)
+            _templates[(kind, labels)] = tpl
+        return tpl
+
+
+def _memoized(kind: str, labels: Tuple[str, ...], values: List[float], colors: List[str], render) -> bytes:
+    key = hashlib.sha256(
+        json.dumps([kind, labels, values, colors], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    with _lock:
+        png = _memo.get(key)
+        if png is not None:
+            _memo.move_to_end(key)
+            _stats["hits"] += 1
+            return png
+    png = render()
+    with _lock:
+        _memo[key] = png
+        while len(_memo) > MAX_MEMO_ENTRIES:
+            _memo.popitem(last=False)
+        _stats["renders"] += 1
+    return png
+
+
+def render_radar_png(category_scores: Dict[str, Dict[str, Any]]) -> bytes:
+    """Radar das categorias ({nome: {avg, status, ...}}) como bytes PNG."""
+    labels = tuple(category_scores.keys())
+    values = [float(category_scores[l]["avg"]) for l in labels]
+    return _memoized("radar", labels, values, [], lambda: _template("radar", labels).render(values))
+
+
+def render_bar_png(dim_scores_agg: List[Dict[str, Any]]) -> bytes:
+    """Barras horizontais das dimensoes (score e status) como bytes PNG."""
+    labels = tuple(d.get("name", "")[:20] for d in dim_scores_agg)
+    values = [float(d.get("score", 0)) for d in dim_scores_agg]
+    colors = [STATUS_COLORS.get(d.get("status", "yellow"), DEFAULT_COLOR) for d in dim_scores_agg]
+    return _memoized("bar", labels, values, colors, lambda: _template("bar", labels).render(values, colors))
+
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_stats, memo_entries=len(_memo))
@@ -0,0 +1,283 @@
+"""
+Fluir — Importacao em lote de respostas (questionarios em papel digitados em planilha)
+Le CSV ou XLSX linha a linha (openpyxl em modo read_only; o upload fica em arquivo
+temporario), valida cada linha com as mesmas regras do envio online e insere em lotes
+(executemany) numa unica transacao. Por padrao e tudo ou nada: qualquer linha invalida
+desfaz a importacao e o relatorio lista os erros por linha.
+
+Cabecalho: uma coluna por questao ("1".."41" ou "Q1".."Q41") e, opcionalmente,
+display_id, submitted_at e os campos de segmentacao da pesquisa.
+"""
+
+import codecs
+import csv
+import io
+import os
+import re
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from copsoq_calculator import QUESTION_IDS, answer_counts
+from database import (
+    SEGMENT_FIELDS, Respondent, generate_uuid, pack_answers, record_answer_counts,
+    record_respondents, reset_generated_recommendations,
+)
+
+IMPORT_BATCH = 1000
+MAX_ROWS = int(os.getenv("FLUIR_IMPORT_MAX_ROWS", "100000"))
+# Erros detalhados no relatorio; alem disso so a contagem
+MAX_REPORTED_ERRORS = 500
+# Amostra usada para detectar o separador do CSV (Excel em pt-BR exporta com ';')
+_SNIFF_BYTES = 16 * 1024
+
+# Caminho rapido: celula de CSV ja com o valor exato da escala
+_SCALE_TEXT = {str(v): v for v in range(1, 6)}
+
+_QUESTION_HEADER = re.compile(r"^(?:q|questao|questão)?\s*0*(\d+)$", re.IGNORECASE)
+
+
+class ImportFormatError(ValueError):
+    """Arquivo ilegivel, formato nao suportado ou cabecalho sem as questoes."""
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    imported: int = 0
+    skipped_empty: int = 0
+    invalid: int = 0
+    ignored_columns: List[str] = field(default_factory=list)
+    errors: List[dict] = field(default_factory=list)
+    dry_run: bool = False
+
+    def add_error(self, row: int, messages: List[str]) -> None:
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": messages})
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "skipped_empty": self.skipped_empty,
+            "invalid": self.invalid,
+            "ignored_columns": self.ignored_columns,
+            "errors": self.errors,
+            "errors_truncated": self.invalid > len(self.errors),
+            "dry_run": self.dry_run,
+        }
+
+
+# ────── Leitura ──────
+
+def _iter_csv(fileobj) -> Iterator[tuple]:
+    sample = fileobj.read(_SNIFF_BYTES)
+    fileobj.seek(0)
+    if isinstance(sample, bytes):
+        # Corta no ultimo byte completo para nao quebrar um caractere UTF-8 no meio
+        sample = codecs.getincrementaldecoder("utf-8-sig")(errors="replace").decode(sample)
+        fileobj = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        for row in csv.reader(fileobj, dialect):
+            yield tuple(row)
+    except UnicodeDecodeError:
+        raise ImportFormatError("CSV deve estar em UTF-8.")
+
+
+def _iter_xlsx(fileobj) -> Iterator[tuple]:
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as exc:
+        raise ImportFormatError(f"Nao foi possivel ler a planilha: {exc}")
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_rows(fileobj, filename: str) -> Iterator[tuple]:
+    """Linhas (cabecalho primeiro) de um CSV ou XLSX, sem carregar o arquivo inteiro."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext == ".csv":
+        return _iter_csv(fileobj)
+    if ext in (".xlsx", ".xlsm"):
+        return _iter_xlsx(fileobj)
+    raise ImportFormatError("Formato nao suportado: envie um arquivo .csv ou .xlsx.")
+
+
+# ────── Validacao ──────
+
+def _column_map(header: tuple, segment_fields) -> tuple:
+    """({question_id: coluna}, {campo: coluna}, colunas ignoradas)."""
+    questions, extras, ignored = {}, {}, []
+    for idx, raw in enumerate(header):
+        name = str(raw).strip() if raw is not None else ""
+        if not name:
+            continue
+        m = _QUESTION_HEADER.match(name)
+        key = name.lower()
+        if m and int(m.group(1)) in QUESTION_IDS:
+            questions[int(m.group(1))] = idx
+        elif key in ("display_id", "submitted_at") or key in segment_fields:
+            extras[key] = idx
+        else:
+            ignored.append(name)
+    missing = [q for q in QUESTION_IDS if q not in questions]
+    if missing:
+        raise ImportFormatError(
+            f"Cabecalho sem as questoes {', '.join(map(str, missing[:10]))}{'...' if len(missing) > 10 else ''}. "
+            "Use uma coluna por questao (1 a 41 ou Q1 a Q41)."
+        )
+    return questions, extras, ignored
+
+
+def _cell(row: tuple, idx: int):
+    value = row[idx] if idx < len(row) else None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _parse_answer(value) -> Optional[int]:
+    """Inteiro da celula (3, 3.0, "3", "3,0"); None se nao for inteiro."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        number = float(str(value).replace(",", "."))
+    except ValueError:
+        return None
+    return int(number) if number.is_integer() else None
+
+
+def _parse_submitted_at(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(str(value), fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_row(row: tuple, questions: dict, extras: dict, segment_options: dict, now: datetime):
+    """(valores para o INSERT, lista de erros). Mesmas regras de valor do envio online."""
+    errors = []
+    responses = {}
+    width = len(row)
+    for q in QUESTION_IDS:
+        idx = questions[q]
+        raw = row[idx] if idx < width else None
+        if type(raw) is str and raw in _SCALE_TEXT:
+            responses[q] = _SCALE_TEXT[raw]
+            continue
+        value = _cell(row, idx)
+        if value is None:
+            errors.append(f"Questão {q}: sem resposta.")
+            continue
+        answer = _parse_answer(value)
+        if answer is None or not (1 <= answer <= 5):
+            errors.append(f"Questão {q}: valor deve ser entre 1 e 5.")
+            continue
+        responses[q] = answer
+
+    record = {"submitted_at": now}
+    display_id = _cell(row, extras["display_id"]) if "display_id" in extras else None
+    if display_id is not None and len(str(display_id)) > 10:
+        errors.append("display_id: no maximo 10 caracteres.")
+    record["display_id"] = str(display_id) if display_id is not None else f"I{uuid.uuid4().hex[:8]}"
+    if "submitted_at" in extras:
+        raw = _cell(row, extras["submitted_at"])
+        if raw is not None:
+            parsed = _parse_submitted_at(raw)
+            if parsed is None:
+                errors.append("submitted_at: data invalida (use AAAA-MM-DD ou DD/MM/AAAA).")
+            record["submitted_at"] = parsed or now
+    for field_name in SEGMENT_FIELDS:
+        if field_name not in extras:
+            continue
+        value = _cell(row, extras[field_name])
+        if value is not None and str(value) not in segment_options.get(field_name, ()):
+            errors.append(f"{field_name}: valor invalido ({value}).")
+        record[field_name] = str(value) if value is not None else None
+    if not errors:
+        record["answers"] = pack_answers(responses)
+    return record, errors
+
+
+# ────── Importacao ──────
+
+def import_responses(db, survey, fileobj, filename: str, skip_invalid: bool = False, dry_run: bool = False) -> ImportReport:
+    """Valida e insere as linhas do arquivo na pesquisa, numa unica transacao.
+
+    skip_invalid: importa as linhas validas mesmo havendo invalidas (padrao: tudo ou nada).
+    dry_run: so valida. Levanta ImportFormatError para arquivo ou cabecalho invalido.
+    """
+    rows = iter_rows(fileobj, filename)
+    header = next(rows, None)
+    if header is None:
+        raise ImportFormatError("Arquivo vazio.")
+    segment_options = survey.segment_options
+    questions, extras, ignored = _column_map(header, segment_options)
+    report = ImportReport(ignored_columns=ignored, dry_run=dry_run)
+    now = datetime.now(timezone.utc)
+    table = Respondent.__table__
+    counts = np.zeros((len(QUESTION_IDS), 5), dtype=np.int64)
+    batch: List[Dict] = []
+
+    def flush():
+        nonlocal counts
+        # Tudo ou nada e ja ha linha invalida: so continua validando para o relatorio
+        if batch and not dry_run and not (report.invalid and not skip_invalid):
+            db.execute(table.insert(), batch)
+            counts += answer_counts(Respondent.answers_matrix([r["answers"] for r in batch]))
+        report.imported += len(batch)
+        batch.clear()
+
+    try:
+        for row_number, row in enumerate(rows, start=2):
+            if not any(v is not None and str(v).strip() for v in row):
+                report.skipped_empty += 1
+                continue
+            report.rows += 1
+            if report.rows > MAX_ROWS:
+                raise ImportFormatError(f"Limite de {MAX_ROWS} linhas por arquivo.")
+            record, errors = _parse_row(row, questions, extras, segment_options, now)
+            if errors:
+                report.add_error(row_number, errors)
+                continue
+            record["id"] = generate_uuid()
+            record["survey_id"] = survey.id
+            batch.append(record)
+            if len(batch) >= IMPORT_BATCH:
+                flush()
+        flush()
+
+        if dry_run or not report.imported or (report.invalid and not skip_invalid):
+            db.rollback()
+            if not dry_run:
+                report.imported = 0
+            return report
+        record_respondents(db, survey.id, report.imported)
+        record_answer_counts(db, survey.id, counts)
+        reset_generated_recommendations(db, survey.id)
+        db.commit()
+        return report
+    except Exception:
+        db.rollback()
+        raise
@@ -217,7 +217,7 @@ function selectSurvey(id, navigate = true) {
 
 async function loadDashboard(id) {
     try {
-        document.getElementById('recsContent').innerHTML = '<p class="text-muted">Gerando análise com IA...</p>';
+        document.getElementById('recsContent').innerHTML = '<p class="text-muted">Carregando análise...</p>';
 
         const res = await fetch(`/api/admin/surveys/${id}/dashboard?admin_code=${ADMIN_CODE}`);
         if (!res.ok) return;
@@ -227,9 +227,34 @@ async function loadDashboard(id) {
         renderRecommendationsConsolidated(dashboardData.recommendations_prose, dashboardData.recommendations);
         renderCharts(dashboardData);
         renderTransposedTable(dashboardData);
+        if (dashboardData.prose_status === 'pending') pollDashboardProse(id);
     } catch (err) { console.error(err); }
 }
 
+// Prosa da IA e gerada em segundo plano: exibe o fallback e substitui quando ficar pronta.
+async function pollDashboardProse(id, attempt = 0) {
+    const MAX_ATTEMPTS = 30;
+    if (attempt >= MAX_ATTEMPTS || currentSurveyId !== id) return;
+    const note = document.createElement('p');
+    note.className = 'text-muted';
+    note.textContent = 'Gerando análise com IA...';
+    if (attempt === 0) document.getElementById('recsContent').appendChild(note);
+    await new Promise(resolve => setTimeout(resolve, 2000));
+    try {
+        const res = await fetch(`/api/admin/surveys/${id}/dashboard/prose?admin_code=${ADMIN_CODE}`);
+        if (!res.ok) return;
+        const data = await res.json();
+        if (currentSurveyId !== id || !dashboardData) return;
+        if (data.prose_status === 'ready') {
+            dashboardData.recommendations_prose = data.recommendations_prose;
+            dashboardData.prose_status = 'ready';
+            renderRecommendationsConsolidated(data.recommendations_prose, dashboardData.recommendations);
+            return;
+        }
+    } catch (err) { console.error(err); }
+    pollDashboardProse(id, attempt + 1);
+}
+
 function renderKPIs(kpis) {
     const container = document.getElementById('kpiGrid');
     container.innerHTML = Object.values(kpis).map(k => `
@@ -591,5 +616,35 @@ async function copyLink() {
 }
 
 function exportReport(id, type) {
+    if (type === 'pptx') return exportPptxJob(id);
     window.open(`/api/admin/surveys/${id}/export/${type}?admin_code=${ADMIN_CODE}`, '_blank');
 }
+
+// PPTX e gerado em segundo plano: cria o job e consulta ate o servidor devolver o arquivo.
+async function exportPptxJob(id) {
+    const base = `/api/admin/surveys/${id}/export/pptx/jobs`;
+    try {
+        const res = await fetch(`${base}?admin_code=${ADMIN_CODE}`, { method: 'POST' });
+        if (!res.ok) { showToast('Erro ao gerar PPT.', 'error'); return; }
+        const job = await res.json();
+        showToast('Gerando PPT...', 'success');
+        for (let attempt = 0; attempt < 90; attempt++) {
+            const poll = await fetch(`${base}/${job.job_id}?admin_code=${ADMIN_CODE}`);
+            if (!poll.ok) break;
+            if ((poll.headers.get('content-type') || '').includes('presentation')) {
+                const match = /filename="([^"]+)"/.exec(poll.headers.get('content-disposition') || '');
+                const link = document.createElement('a');
+                link.href = URL.createObjectURL(await poll.blob());
+                link.download = match ? match[1] : 'fluir.pptx';
+                link.click();
+                setTimeout(() => URL.revokeObjectURL(link.href), 1000);
+                return;
+            }
+            const status = await poll.json();
+            if (status.status === 'error') break;
+            await new Promise(resolve => setTimeout(resolve, 2000));
+        }
+        showToast('Erro ao gerar PPT.', 'error');
+    } catch (err) { console.error(err); showToast('Erro ao gerar PPT.', 'error'); }
+}
+
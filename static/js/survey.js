@@ -8,6 +8,7 @@ let pages = [];
 let totalQuestions = 0;
 let currentPage = -1;
 let responses = {};
+let attributes = {};
 
 async function init() {
     try {
@@ -19,9 +20,43 @@ async function init() {
         pages = await res.json();
         totalQuestions = pages.reduce((n, p) => n + p.questions.length, 0);
         buildPages();
+        buildSegmentFields();
     } catch (err) { console.error(err); }
 }
 
+async function buildSegmentFields() {
+    // Perguntas opcionais de perfil (departamento, unidade, tempo de empresa) definidas pela empresa
+    const res = await fetch(`/api/survey/${surveyCode}/info`);
+    if (!res.ok) return;
+    const info = await res.json();
+    if (!info.segments || !info.segments.length) return;
+    const container = document.getElementById('segmentFields');
+    container.innerHTML = `
+        <p style="margin-top:16px; color: var(--text-600);">Perfil (opcional): usado apenas em resultados de grupos com varias pessoas.</p>
+        ${info.segments.map(s => `
+            <div class="form-group">
+                <label for="seg-${s.field}">${s.label}</label>
+                <select id="seg-${s.field}" class="form-control" onchange="setSegmentAttribute('${s.field}', this.value)">
+                    <option value="">Prefiro nao informar</option>
+                    ${s.options.map(o => `<option value="${escapeHtml(o)}">${escapeHtml(o)}</option>`).join('')}
+                </select>
+            </div>
+        `).join('')}
+    `;
+    container.classList.remove('hidden');
+}
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML.replace(/"/g, '&quot;');
+}
+
+function setSegmentAttribute(field, value) {
+    if (value) attributes[field] = value;
+    else delete attributes[field];
+}
+
 function buildPages() {
     const container = document.getElementById('pagesContainer');
     pages.forEach((page, idx) => {
@@ -142,7 +177,8 @@ async function submitSurvey() {
             body: JSON.stringify({
                 responses: Object.fromEntries(
                     Object.entries(responses).map(([k, v]) => [String(k), v])
-                )
+                ),
+                attributes
             })
         });
         if (!res.ok) { const d = await res.json(); throw new Error(d.detail || 'Erro'); }
@@ -0,0 +1,134 @@
+"""
+Fluir — Paginas e assets estaticos pre-carregados
+Na inicializacao le static/, calcula o hash do conteudo de cada asset e reescreve
+as referencias (/static/... no HTML, @import/url() no CSS) para /assets/<hash>/<caminho>.
+Essas URLs mudam quando o arquivo muda, entao podem ser servidas com cache imutavel;
+as paginas HTML sao revalidadas por ETag. Tudo fica em memoria, ja comprimido com gzip.
+Alteracoes em static/ exigem reiniciar o processo.
+"""
+
+import hashlib
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+from http_cache import StaticPayload, precompressed
+
+ASSET_PREFIX = "/assets"
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Paginas: sempre revalidar (ETag -> 304); os assets referenciados nunca mudam de URL
+PAGE_CACHE_CONTROL = "no-cache"
+# Hash antigo (deploy anterior) ainda pedido por HTML em cache: serve o atual sem fixar
+STALE_ASSET_CACHE_CONTROL = "no-cache"
+
+ASSET_DIRS = ("css", "js", "img")
+_COMPRESSIBLE = {".css", ".js", ".svg", ".html", ".json", ".txt"}
+
+_HTML_REF = re.compile(r'''(?P<attr>href|src)=(?P<q>["'])/static/(?P<path>[^"'?#]+)(?:[?#][^"']*)?(?P=q)''')
+_CSS_IMPORT = re.compile(r'''@import\s+(?P<q>["'])(?P<ref>[^"']+)(?P=q)''')
+_CSS_URL = re.compile(r'''url\(\s*(?P<q>["']?)(?P<ref>[^"')]+)(?P=q)\s*\)''')
+
+
+def _is_external(ref: str) -> bool:
+    return ref.startswith(("http:", "https:", "//", "data:", "#"))
+
+
+def _resolve(ref: str, base: str) -> Optional[str]:
+    """Caminho relativo a static/ de uma referencia feita no arquivo base (ou None se externa)."""
+    if _is_external(ref):
+        return None
+    ref = ref.split("?", 1)[0].split("#", 1)[0]
+    if ref.startswith("/static/"):
+        return ref[len("/static/"):]
+    if ref.startswith("/"):
+        return None
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), ref))
+
+
+class AssetRegistry:
+    """Assets (css/js/img) e paginas HTML de um diretorio static, prontos para servir."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._sources: Dict[str, bytes] = {}
+        for sub in ASSET_DIRS:
+            base = self.root / sub
+            if not base.is_dir():
+                continue
+            for path in sorted(base.rglob("*")):
+                if path.is_file():
+                    self._sources[path.relative_to(self.root).as_posix()] = path.read_bytes()
+        self._assets: Dict[str, StaticPayload] = {}
+        self._digests: Dict[str, str] = {}
+        for rel in self._sources:
+            self._build(rel, ())
+        self._pages: Dict[str, StaticPayload] = {}
+        for path in sorted(self.root.glob("*.html")):
+            html = self.rewrite_html(path.read_text(encoding="utf-8"))
+            self._pages[path.name] = precompressed(html.encode("utf-8"), "text/html")
+
+    def _build(self, rel: str, stack: tuple) -> None:
+        if rel in self._assets:
+            return
+        body = self._sources[rel]
+        if rel.endswith(".css") and rel not in stack:
+            body = self._rewrite_css(body.decode("utf-8"), rel, stack + (rel,)).encode("utf-8")
+        suffix = posixpath.splitext(rel)[1].lower()
+        media_type = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        self._assets[rel] = precompressed(body, media_type, compress=suffix in _COMPRESSIBLE)
+        # Hash do conteudo ja reescrito: mudar um CSS importado muda a URL de quem o importa
+        self._digests[rel] = hashlib.sha256(body).hexdigest()[:12]
+
+    def _rewrite_css(self, css: str, rel: str, stack: tuple) -> str:
+        def asset_ref(ref: str) -> Optional[str]:
+            target = _resolve(ref, rel)
+            if target is None or target not in self._sources or target in stack:
+                return None
+            self._build(target, stack)
+            return self.url_for(target)
+
+        def import_sub(m):
+            url = asset_ref(m.group("ref"))
+            return m.group(0) if url is None else f'@import {m.group("q")}{url}{m.group("q")}'
+
+        def url_sub(m):
+            url = asset_ref(m.group("ref"))
+            return m.group(0) if url is None else f'url({m.group("q")}{url}{m.group("q")})'
+
+        return _CSS_URL.sub(url_sub, _CSS_IMPORT.sub(import_sub, css))
+
+    def url_for(self, rel: str) -> str:
+        return f"{ASSET_PREFIX}/{self._digests[rel]}/{rel}"
+
+    def rewrite_html(self, html: str) -> str:
+        """Troca href/src="/static/..." (com ou sem ?v=) pela URL com hash do conteudo."""
+        def sub(m):
+            rel = m.group("path")
+            if rel not in self._assets:
+                return m.group(0)
+            q = m.group("q")
+            return f"{m.group('attr')}={q}{self.url_for(rel)}{q}"
+
+        return _HTML_REF.sub(sub, html)
+
+    def page(self, name: str) -> StaticPayload:
+        return self._pages[name]
+
+    def asset(self, digest: str, rel: str):
+        """(payload, cache_control) do asset; None se o caminho nao existir."""
+        payload = self._assets.get(rel)
+        if payload is None:
+            return None
+        if self._digests[rel] != digest:
+            return payload, STALE_ASSET_CACHE_CONTROL
+        return payload, ASSET_CACHE_CONTROL
+
+    def stats(self) -> dict:
+        return {
+            "assets": len(self._assets),
+            "pages": len(self._pages),
+            "bytes": sum(len(p.body) for p in self._assets.values()),
+            "gzip_bytes": sum(len(p.gzip_body or p.body) for p in self._assets.values()),
+        }
@@ -0,0 +1,171 @@
+"""
+Fluir — Group commit das submissoes de questionario (opt-in: FLUIR_SUBMIT_BATCHING=1)
+Em picos (QR code exibido numa reuniao geral) cada submissao validada entra numa fila;
+um writer unico grava lotes com INSERT em massa, atualiza contadores/recomendacoes
+uma vez por pesquisa e faz um unico commit. Quem submeteu so recebe o display_id
+depois que o lote dele foi gravado.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from database import SEGMENT_FIELDS, SessionLocal, Respondent, generate_uuid, record_answers, record_respondents, reset_generated_recommendations
+
+ENABLED = os.getenv("FLUIR_SUBMIT_BATCHING", "").lower() in ("1", "true", "yes")
+MAX_BATCH = int(os.getenv("FLUIR_SUBMIT_BATCH_SIZE", "64"))
+MAX_WAIT_MS = float(os.getenv("FLUIR_SUBMIT_BATCH_WAIT_MS", "5"))
+# Tempo maximo que uma requisicao espera pelo commit do lote
+SUBMIT_TIMEOUT_S = float(os.getenv("FLUIR_SUBMIT_TIMEOUT_S", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class SubmissionTimeout(Exception):
+    """O lote nao foi gravado dentro de SUBMIT_TIMEOUT_S."""
+
+
+class SurveyClosed(Exception):
+    """A pesquisa foi excluida ou encerrada (o survey_cache deste worker estava defasado)."""
+
+
+@dataclass
+class _Pending:
+    survey_id: str
+    display_id: str
+    answers: bytes
+    attributes: Dict[str, str] = field(default_factory=dict)
+    submitted_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    future: Future = field(default_factory=Future)
+
+
+_queue: "queue.Queue[_Pending]" = queue.Queue()
+_lock = threading.Lock()
+_writer: threading.Thread = None
+_stats = {"batches": 0, "rows": 0, "failures": 0}
+
+
+def _ensure_writer() -> None:
+    global _writer
+    with _lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_writer_loop, name="fluir-submit-writer", daemon=True)
+            _writer.start()
+
+
+def submit(survey_id: str, display_id: str, answers: bytes, attributes: Optional[Dict[str, str]] = None) -> str:
+    """Enfileira a submissao e bloqueia ate o commit do lote. Retorna o display_id."""
+    pending = _Pending(survey_id=survey_id, display_id=display_id, answers=answers, attributes=attributes or {})
+    _ensure_writer()
+    _queue.put(pending)
+    try:
+        pending.future.result(timeout=SUBMIT_TIMEOUT_S)
+    except FutureTimeout:
+        # Ainda na fila: cancela para o writer descartar (evita gravar algo que o cliente vai reenviar)
+        if pending.future.cancel():
+            raise SubmissionTimeout(display_id)
+        # Lote ja em gravacao: o resultado sai em instantes
+        pending.future.result()
+    return display_id
+
+
+async def submit_async(survey_id: str, display_id: str, answers: bytes, attributes: Optional[Dict[str, str]] = None) -> str:
+    """Versao para endpoints async: espera o commit sem ocupar uma thread."""
+    pending = _Pending(survey_id=survey_id, display_id=display_id, answers=answers, attributes=attributes or {})
+    _ensure_writer()
+    _queue.put(pending)
+    waiter = asyncio.wrap_future(pending.future)
+    # asyncio.wait nao cancela o waiter no timeout (cancelar aqui propagaria ao Future do lote)
+    done, _ = await asyncio.wait({waiter}, timeout=SUBMIT_TIMEOUT_S)
+    if not done:
+        if pending.future.cancel():
+            raise SubmissionTimeout(display_id)
+    await waiter
+    return display_id
+
+
+def _collect() -> List[_Pending]:
+    """Bloqueia ate a primeira submissao e junta o que chegar ate MAX_BATCH ou MAX_WAIT_MS."""
+    batch = [_queue.get()]
+    deadline = time.monotonic() + MAX_WAIT_MS / 1000
+    while len(batch) < MAX_BATCH:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _writer_loop() -> None:
+    while True:
+        # Marca como em execucao; descarta o que expirou na fila
+        batch = [p for p in _collect() if p.future.set_running_or_notify_cancel()]
+        if not batch:
+            continue
+        try:
+            _flush(batch)
+        except Exception:
+            # Um registro invalido nao deve derrubar os demais: regrava um a um
+            logger.exception("Falha ao gravar lote de %s submissoes; regravando individualmente", len(batch))
+            for pending in batch:
+                try:
+                    _flush([pending])
+                except Exception as exc:
+                    _stats["failures"] += 1
+                    pending.future.set_exception(exc)
+
+
+def _flush(batch: List[_Pending]) -> None:
+    db = SessionLocal()
+    closed: List[_Pending] = []
+    try:
+        # Contador primeiro: o UPDATE condicional confirma no banco que a pesquisa segue ativa
+        counts = Counter(p.survey_id for p in batch)
+        live = {sid for sid, n in counts.items() if record_respondents(db, sid, n, only_active=True)}
+        closed = [p for p in batch if p.survey_id not in live]
+        batch = [p for p in batch if p.survey_id in live]
+        if batch:
+            db.execute(
+                Respondent.__table__.insert(),
+                [
+                    {
+                        "id": generate_uuid(),
+                        "survey_id": p.survey_id,
+                        "display_id": p.display_id,
+                        "answers": p.answers,
+                        "submitted_at": p.submitted_at,
+                        **{f: p.attributes.get(f) for f in SEGMENT_FIELDS},
+                    }
+                    for p in batch
+                ],
+            )
+        for survey_id in live:
+            record_answers(db, survey_id, Respondent.answers_matrix([p.answers for p in batch if p.survey_id == survey_id]))
+            reset_generated_recommendations(db, survey_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    _stats["batches"] += 1
+    _stats["rows"] += len(batch)
+    for pending in batch:
+        pending.future.set_result(pending.display_id)
+    for pending in closed:
+        pending.future.set_exception(SurveyClosed(pending.survey_id))
+
+
+def stats() -> dict:
+    return {"enabled": ENABLED, "queued": _queue.qsize(), **_stats}
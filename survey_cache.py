@@ -0,0 +1,125 @@
+"""
+Fluir — Cache em memoria das pesquisas por codigo (endpoints do respondente)
+Uma sessao de respondente consulta a mesma pesquisa varias vezes (pagina, info,
+questoes, envio, agradecimento). Guarda so os campos usados nesses endpoints, com TTL;
+update_settings/delete_survey invalidam explicitamente. Codigos inexistentes nao sao
+guardados. Com varios workers, cada processo tem o seu cache e a invalidacao so vale no
+processo local: nos demais, /info e /questions de uma pesquisa encerrada ou excluida
+continuam respondendo por ate TTL_SECONDS. O envio nao depende do cache: o UPDATE do
+contador so afeta pesquisa existente e ativa (ver record_respondents(only_active=True)).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from database import Survey
+
+# Defasagem maxima entre workers para leituras (o envio reconfere no banco)
+TTL_SECONDS = float(os.getenv("FLUIR_SURVEY_CACHE_TTL", "60"))
+MAX_ENTRIES = int(os.getenv("FLUIR_SURVEY_CACHE_MAX", "1024"))
+# Invalidacoes mais antigas que isso sao esquecidas: nenhuma leitura do banco dura tanto
+INVALIDATION_WINDOW_S = 60.0
+
+
+@dataclass(frozen=True)
+class SurveyInfo:
+    id: str
+    code: str
+    is_active: bool
+    company_name: str
+    thank_you_title: Optional[str]
+    thank_you_message: Optional[str]
+    segment_options: Dict[str, List[str]] = field(default_factory=dict)
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, Tuple[float, SurveyInfo]]" = OrderedDict()
+# codigo -> instante da ultima invalidacao (ordem cronologica): leituras iniciadas antes
+# nao repopulam o cache. Podado por INVALIDATION_WINDOW_S para nao crescer sem limite.
+_invalidated: "OrderedDict[str, float]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _lookup(code: str):
+    """(info em cache ou None, instante de inicio da leitura no banco)."""
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(code)
+        if entry is not None and entry[0] > now:
+            _entries.move_to_end(code)
+            _stats["hits"] += 1
+            return entry[1], None
+        _stats["misses"] += 1
+        return None, now
+
+
+def _store(code: str, started: float, survey) -> Optional[SurveyInfo]:
+    if survey is None:
+        return None
+    info = SurveyInfo(
+        id=survey.id,
+        code=survey.code,
+        is_active=bool(survey.is_active),
+        company_name=survey.company_name,
+        thank_you_title=survey.thank_you_title,
+        thank_you_message=survey.thank_you_message,
+        segment_options=survey.segment_options,
+    )
+    with _lock:
+        invalidated = _invalidated.get(code)
+        if invalidated is None or invalidated < started:
+            _entries[code] = (time.monotonic() + TTL_SECONDS, info)
+            _entries.move_to_end(code)
+            while len(_entries) > MAX_ENTRIES:
+                _entries.popitem(last=False)
+    return info
+
+
+def get_by_code(db, code: str) -> Optional[SurveyInfo]:
+    """Pesquisa pelo codigo (ativa ou nao), do cache ou do banco; None se nao existir."""
+    info, started = _lookup(code)
+    if info is not None:
+        return info
+    return _store(code, started, db.query(Survey).filter(Survey.code == code).first())
+
+
+async def get_by_code_async(db, code: str) -> Optional[SurveyInfo]:
+    """Mesmo que get_by_code, com AsyncSession."""
+    info, started = _lookup(code)
+    if info is not None:
+        return info
+    result = await db.execute(select(Survey).where(Survey.code == code).limit(1))
+    return _store(code, started, result.scalars().first())
+
+
+def invalidate(code: str) -> None:
+    now = time.monotonic()
+    with _lock:
+        _entries.pop(code, None)
+        _invalidated[code] = now
+        _invalidated.move_to_end(code)
+        while _invalidated and next(iter(_invalidated.values())) < now - INVALIDATION_WINDOW_S:
+            _invalidated.popitem(last=False)
+        _stats["invalidations"] += 1
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+        _invalidated.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "hit_ratio": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
@@ -4,6 +4,7 @@ Configura banco de testes em memoria antes de importar a aplicacao.
 """
 import os
 import sys
+import tempfile
 
 # Deve rodar ANTES de qualquer import que use database.
 # Usa arquivo no diretorio do projeto para que engine e sessions compartilhem o mesmo schema.
@@ -12,6 +13,7 @@ os.chdir(_root)  # Garante que caminhos relativos funcionem
 os.environ["TEST_DATABASE_URL"] = "sqlite:///./test_fluir.db"
 os.environ["FLUIR_ADMIN_CODE"] = "test_admin"
 os.environ["ADMIN_RECOVERY_EMAIL"] = ""  # Evita seed durante testes
+os.environ["FLUIR_EXPORT_CACHE_DIR"] = tempfile.mkdtemp(prefix="fluir_exports_")
 
 # Garante que o diretorio raiz esteja no path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -41,6 +43,8 @@ def db():
 def client(db):
     """TestClient do FastAPI com get_db sobrescrito para usar a sessao de teste."""
     def override_get_db():
+        # Como numa sessao nova por requisicao: ve o que os endpoints async gravaram
+        db.expire_all()
         try:
             yield db
         finally:
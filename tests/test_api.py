@@ -121,6 +121,38 @@ class TestSurveyCRUD:
         assert not any(s["id"] == survey_id for s in surveys_list_after), "Pesquisa 'paifhoausfh' ainda aparece na listagem apos exclusao"
 
 
+class TestRespondentCounts:
+    """Contagem de respondentes: GROUP BY nas listagens e contador desnormalizado."""
+
+    def test_listagem_conta_respondentes(self, client, survey):
+        for _ in range(2):
+            client.post(f"/api/survey/{survey.code}/submit", json={"responses": {str(i): 3 for i in range(1, 42)}})
+        data = client.get("/api/admin/surveys", params={"admin_code": "test_admin"}).json()
+        assert next(s for s in data if s["id"] == survey.id)["respondent_count"] == 2
+        detalhe = client.get(f"/api/admin/surveys/{survey.id}", params={"admin_code": "test_admin"}).json()
+        assert detalhe["respondent_count"] == 2
+
+    def test_excluir_respondente_decrementa(self, client, db, survey):
+        r = client.post(f"/api/survey/{survey.code}/submit", json={"responses": {str(i): 3 for i in range(1, 42)}})
+        display_id = r.json()["display_id"]
+        r = client.post(
+            f"/api/admin/surveys/{survey.id}/respondents/delete",
+            params={"admin_code": "test_admin", "display_id": display_id},
+        )
+        assert r.status_code == 200
+        db.expire_all()
+        assert survey.respondent_count == 0
+
+    def test_reconciliacao_corrige_divergencia(self, db, survey_with_responses):
+        from database import reconcile_respondent_counts
+
+        survey_with_responses.respondent_count = 99
+        db.commit()
+        assert reconcile_respondent_counts(db) >= 1
+        db.expire_all()
+        assert survey_with_responses.respondent_count == 1
+
+
 class TestSurveySubmit:
     """Testes do envio de respostas pelo respondente."""
 
@@ -143,6 +175,490 @@ class TestSurveySubmit:
         assert r.status_code == 404
 
 
+class TestQuestionnairePayload:
+    """Testes do questionario pre-serializado com cache HTTP."""
+
+    def test_payload_igual_ao_montado(self, client, survey):
+        import json
+        from main import _questionnaire_pages
+
+        r = client.get(f"/api/survey/{survey.code}/questions")
+        assert r.status_code == 200
+        assert r.json() == json.loads(json.dumps(_questionnaire_pages()))
+        assert r.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in r.headers["vary"]
+        assert "max-age" in r.headers["cache-control"]
+
+    def test_sem_gzip_envia_identidade(self, client, survey):
+        from main import QUESTIONNAIRE
+
+        r = client.get(f"/api/survey/{survey.code}/questions", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in r.headers
+        assert r.headers["etag"] == QUESTIONNAIRE.etag
+        assert r.content == QUESTIONNAIRE.body
+
+    def test_if_none_match_retorna_304(self, client, survey):
+        etag = client.get(f"/api/survey/{survey.code}/questions").headers["etag"]
+        r = client.get(f"/api/survey/{survey.code}/questions", headers={"If-None-Match": etag})
+        assert r.status_code == 304
+        assert r.content == b""
+
+    def test_etag_estavel_entre_processos(self):
+        from http_cache import precompressed
+        from main import QUESTIONNAIRE
+
+        # Outro worker serializa os mesmos bytes: mesmos ETags e mesmo gzip
+        outro = precompressed(bytes(QUESTIONNAIRE.body), "application/json")
+        assert outro == QUESTIONNAIRE
+
+    def test_pesquisa_encerrada_404(self, client, db, survey):
+        import survey_cache
+
+        survey.is_active = False
+        db.commit()
+        survey_cache.invalidate(survey.code)
+        r = client.get(f"/api/survey/{survey.code}/questions")
+        assert r.status_code == 404
+
+
+class TestSurveyCache:
+    """Testes do cache de pesquisas por codigo nos endpoints do respondente."""
+
+    def test_sessao_do_respondente_consulta_banco_uma_vez(self, client, survey):
+        import survey_cache
+
+        survey_cache.invalidate(survey.code)
+        antes = survey_cache.stats()
+        client.get(f"/api/survey/{survey.code}/info")
+        client.get(f"/api/survey/{survey.code}/questions")
+        client.post(f"/api/survey/{survey.code}/submit", json={"responses": {str(i): 3 for i in range(1, 42)}})
+        client.get(f"/api/survey/{survey.code}/thanks")
+        depois = survey_cache.stats()
+        assert depois["misses"] - antes["misses"] == 1
+        assert depois["hits"] - antes["hits"] == 3
+
+    def test_update_settings_invalida(self, client, survey):
+        assert client.get(f"/api/survey/{survey.code}/info").status_code == 200
+        r = client.put(
+            f"/api/admin/surveys/{survey.id}/settings",
+            params={"admin_code": "test_admin"},
+            json={"is_active": False, "company_name": "Nova"},
+        )
+        assert r.status_code == 200
+        assert client.get(f"/api/survey/{survey.code}/info").status_code == 404
+        assert client.get(f"/api/survey/{survey.code}/thanks").status_code == 200
+
+    def test_delete_survey_invalida(self, client, survey):
+        assert client.get(f"/api/survey/{survey.code}/thanks").status_code == 200
+        r = client.post(
+            "/api/admin/surveys/delete",
+            params={"survey_id": survey.id, "admin_code": "test_admin"},
+        )
+        assert r.status_code == 200
+        assert client.get(f"/api/survey/{survey.code}/thanks").status_code == 404
+
+    def test_codigo_inexistente_nao_fica_em_cache(self, db):
+        import survey_cache
+
+        assert survey_cache.get_by_code(db, "zz000000") is None
+        s = Survey(company_name="Tardia", admin_code="test_admin", code="zz000000")
+        db.add(s)
+        db.commit()
+        try:
+            assert survey_cache.get_by_code(db, "zz000000").id == s.id
+        finally:
+            db.delete(s)
+            db.commit()
+            survey_cache.invalidate("zz000000")
+
+
+    def test_invalidacoes_antigas_sao_podadas(self, monkeypatch):
+        import time
+        import survey_cache
+
+        monkeypatch.setattr(survey_cache, "INVALIDATION_WINDOW_S", 0.0)
+        for i in range(50):
+            survey_cache.invalidate(f"poda{i:04d}")
+        time.sleep(0.01)
+        survey_cache.invalidate("poda_fim")
+        assert list(survey_cache._invalidated) == ["poda_fim"]
+
+    @pytest.mark.parametrize("batching", [False, True])
+    def test_envio_reconfere_pesquisa_encerrada_em_outro_worker(self, client, db, survey, monkeypatch, batching):
+        import submission_buffer
+
+        monkeypatch.setattr(submission_buffer, "ENABLED", batching)
+        assert client.get(f"/api/survey/{survey.code}/info").status_code == 200
+        # Encerrada por outro processo: o cache local nao foi invalidado
+        db.query(Survey).filter(Survey.id == survey.id).update({"is_active": False})
+        db.commit()
+        r = client.post(f"/api/survey/{survey.code}/submit", json={"responses": {str(i): 3 for i in range(1, 42)}})
+        assert r.status_code == 404
+        db.expire_all()
+        assert db.query(Respondent).filter(Respondent.survey_id == survey.id).count() == 0
+        assert db.get(Survey, survey.id).respondent_count in (0, None)
+        # A recusa invalida o cache deste worker
+        assert client.get(f"/api/survey/{survey.code}/info").status_code == 404
+
+
+class TestSubmitBatching:
+    """Testes do group commit opcional das submissoes."""
+
+    def test_submit_com_batching_grava_antes_de_responder(self, client, db, survey, monkeypatch):
+        import submission_buffer
+
+        monkeypatch.setattr(submission_buffer, "ENABLED", True)
+        r = client.post(
+            f"/api/survey/{survey.code}/submit",
+            json={"responses": {str(i): 4 for i in range(1, 42)}},
+        )
+        assert r.status_code == 200
+        display_id = r.json()["display_id"]
+        db.expire_all()
+        respondent = db.query(Respondent).filter(Respondent.display_id == display_id).one()
+        assert respondent.responses == {str(i): 4 for i in range(1, 42)}
+        assert db.get(Survey, survey.id).respondent_count == 1
+
+    def test_submissoes_concorrentes_agrupadas(self, db, survey):
+        from concurrent.futures import ThreadPoolExecutor
+        import submission_buffer
+        from database import pack_answers
+
+        answers = pack_answers({i: 2 for i in range(1, 42)})
+        ids = [f"RB{i:03d}" for i in range(30)]
+        with ThreadPoolExecutor(max_workers=30) as pool:
+            result = list(pool.map(lambda d: submission_buffer.submit(survey.id, d, answers), ids))
+        assert result == ids
+        db.expire_all()
+        gravados = {r.display_id for r in db.query(Respondent).filter(Respondent.survey_id == survey.id)}
+        assert gravados == set(ids)
+        assert db.get(Survey, survey.id).respondent_count == 30
+
+
+class TestQuestionHistogram:
+    """Histograma de respostas mantido nas submissoes/exclusoes e o endpoint /distribution."""
+
+    def _distribution(self, client, survey):
+        r = client.get(f"/api/admin/surveys/{survey.id}/distribution", params={"admin_code": survey.admin_code})
+        assert r.status_code == 200
+        return r.json()
+
+    def test_submissao_e_exclusao_atualizam_histograma(self, client, survey):
+        for value in (1, 5, 5):
+            r = client.post(f"/api/survey/{survey.code}/submit", json={"responses": {str(i): value for i in range(1, 42)}})
+            assert r.status_code == 200
+        data = self._distribution(client, survey)
+        assert data["total_respondents"] == 3
+        q1 = data["questions"][0]
+        assert q1["counts"] == [1, 0, 0, 0, 2]
+        assert q1["median"] == 5.0
+        assert q1["text"] and q1["dimension"] == "exigencias_quantitativas"
+        assert len(data["dim_scores"]) == 26 and data["kpis"]
+
+        client.post(
+            f"/api/admin/surveys/{survey.id}/respondents/delete",
+            params={"display_id": r.json()["display_id"], "admin_code": survey.admin_code},
+        )
+        data = self._distribution(client, survey)
+        assert data["total_respondents"] == 2
+        assert data["questions"][0]["counts"] == [1, 0, 0, 0, 1]
+        assert data["questions"][0]["median"] == 3.0
+
+    def test_scores_conferem_com_dashboard(self, client, survey):
+        import random
+
+        rng = random.Random(3)
+        for _ in range(12):
+            client.post(f"/api/survey/{survey.code}/submit", json={"responses": {str(i): rng.randint(1, 5) for i in range(1, 42)}})
+        dist = {d["dimension_id"]: d["score"] for d in self._distribution(client, survey)["dim_scores"]}
+        dash = client.get(f"/api/admin/surveys/{survey.id}/dashboard", params={"admin_code": survey.admin_code}).json()
+        for d in dash["dim_scores"]:
+            assert abs(dist[d["dimension_id"]] - d["score"]) <= 0.01 + 1e-9
+
+    def test_lote_do_group_commit_atualiza_histograma(self, db, survey):
+        from concurrent.futures import ThreadPoolExecutor
+        import submission_buffer
+        from database import pack_answers, question_histogram
+
+        answers = pack_answers({i: 2 for i in range(1, 42)})
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            list(pool.map(lambda d: submission_buffer.submit(survey.id, d, answers), [f"RH{i}" for i in range(10)]))
+        db.expire_all()
+        counts = question_histogram(db, survey.id)
+        assert (counts[:, 1] == 10).all() and counts.sum() == 410
+
+    def test_rebuild_igual_ao_incremental(self, client, db, survey):
+        from database import question_histogram, rebuild_question_histogram
+
+        for value in (2, 3, 4):
+            client.post(f"/api/survey/{survey.code}/submit", json={"responses": {str(i): value for i in range(1, 42)}})
+        incremental = question_histogram(db, survey.id)
+        rebuild_question_histogram(db, survey.id)
+        db.commit()
+        assert (question_histogram(db, survey.id) == incremental).all()
+
+    def test_exclusao_da_pesquisa_remove_histograma(self, client, db, survey):
+        from database import QuestionHistogram
+
+        client.post(f"/api/survey/{survey.code}/submit", json={"responses": {str(i): 3 for i in range(1, 42)}})
+        survey_id = survey.id
+        client.post("/api/admin/surveys/delete", params={"survey_id": survey_id, "admin_code": survey.admin_code})
+        assert db.query(QuestionHistogram).filter(QuestionHistogram.survey_id == survey_id).count() == 0
+
+    def test_distribuicao_exige_admin(self, client, survey):
+        r = client.get(f"/api/admin/surveys/{survey.id}/distribution", params={"admin_code": "errado"})
+        assert r.status_code in (401, 403, 404)
+
+
+class TestSegmentation:
+    """Atributos opcionais do respondente e dashboard?group_by=."""
+
+    def _configure(self, client, survey, options):
+        r = client.put(
+            f"/api/admin/surveys/{survey.id}/settings",
+            params={"admin_code": survey.admin_code},
+            json={"segment_options": options},
+        )
+        return r
+
+    def _submit(self, client, survey, value=3, **attributes):
+        return client.post(
+            f"/api/survey/{survey.code}/submit",
+            json={"responses": {str(i): value for i in range(1, 42)}, "attributes": attributes},
+        )
+
+    def _dashboard(self, client, survey, group_by="department"):
+        return client.get(
+            f"/api/admin/surveys/{survey.id}/dashboard",
+            params={"admin_code": survey.admin_code, "group_by": group_by},
+        )
+
+    def test_opcoes_no_info_e_validacao(self, client, survey):
+        assert self._configure(client, survey, {"department": [" RH ", "TI", "RH", ""]}).status_code == 200
+        info = client.get(f"/api/survey/{survey.code}/info").json()
+        assert info["segments"] == [{"field": "department", "label": "Departamento / Area", "options": ["RH", "TI"]}]
+        assert self._configure(client, survey, {"cargo": ["A"]}).status_code == 400
+
+    def test_submissao_grava_atributos(self, client, db, survey):
+        self._configure(client, survey, {"department": ["RH", "TI"], "site": ["SP"]})
+        r = self._submit(client, survey, department="TI", site="")
+        assert r.status_code == 200
+        db.expire_all()
+        respondent = db.query(Respondent).filter(Respondent.display_id == r.json()["display_id"]).one()
+        assert (respondent.department, respondent.site, respondent.tenure_band) == ("TI", None, None)
+
+    def test_valor_fora_das_opcoes_rejeitado(self, client, survey):
+        self._configure(client, survey, {"department": ["RH"]})
+        assert self._submit(client, survey, department="Financeiro").status_code == 400
+        assert self._submit(client, survey, tenure_band="1-3 anos").status_code == 400
+
+    def test_group_by_com_supressao(self, client, survey, monkeypatch):
+        import main
+
+        monkeypatch.setattr(main, "MIN_SEGMENT_SIZE", 3)
+        self._configure(client, survey, {"department": ["RH", "TI", "Vendas"]})
+        for _ in range(5):
+            self._submit(client, survey, value=5, department="RH")
+        for _ in range(4):
+            self._submit(client, survey, value=1, department="TI")
+        for _ in range(3):
+            self._submit(client, survey, value=3)
+        self._submit(client, survey, department="Vendas")
+
+        data = self._dashboard(client, survey).json()
+        seg = data["segments"]
+        assert data["total_respondents"] == 13
+        # Vendas (1) abaixo do minimo; como 1 < 3, o menor visivel (nao informado) tambem sai
+        assert seg["suppressed_groups"] == 2 and seg["suppressed_respondents"] == 4
+        assert {g["value"]: g["respondents"] for g in seg["groups"]} == {"RH": 5, "TI": 4}
+        rh = next(g for g in seg["groups"] if g["value"] == "RH")
+        assert all(d["score"] == 5.0 for d in rh["dim_scores"]) and rh["kpis"]
+
+    def test_grupo_igual_ao_agregado_do_subconjunto(self, client, survey, monkeypatch):
+        import random
+        import main
+        from copsoq_calculator import calc_dimension_scores
+
+        monkeypatch.setattr(main, "MIN_SEGMENT_SIZE", 1)
+        self._configure(client, survey, {"site": ["SP", "RJ"]})
+        rng = random.Random(5)
+        by_site = {"SP": [], "RJ": []}
+        for i in range(10):
+            site = "SP" if i % 3 else "RJ"
+            responses = {str(q): rng.randint(1, 5) for q in range(1, 42)}
+            by_site[site].append(responses)
+            client.post(f"/api/survey/{survey.code}/submit", json={"responses": responses, "attributes": {"site": site}})
+        groups = {g["value"]: g for g in self._dashboard(client, survey, "site").json()["segments"]["groups"]}
+        for site, responses_list in by_site.items():
+            expected = main._aggregate_dim_scores([calc_dimension_scores(r) for r in responses_list])
+            assert groups[site]["dim_scores"] == expected
+
+    def test_group_by_invalido(self, client, survey):
+        assert self._dashboard(client, survey, group_by="cargo").status_code == 400
+
+
+class TestCompareWaves:
+    """Comparacao longitudinal entre pesquisas (/api/admin/compare)."""
+
+    def _wave(self, client, value, n=2, admin_code="test_admin"):
+        survey = client.post("/api/admin/surveys", json={"company_name": "Onda", "admin_code": admin_code}).json()
+        for _ in range(n):
+            client.post(f"/api/survey/{survey['code']}/submit", json={"responses": {str(i): value for i in range(1, 42)}})
+        return survey["id"]
+
+    def test_compara_ondas_com_deltas_e_transicoes(self, client):
+        first, second = self._wave(client, 3), self._wave(client, 5, n=3)
+        # Ordem dos parametros nao importa: ondas saem em ordem cronologica
+        r = client.get("/api/admin/compare", params={"survey_ids": [second, first], "admin_code": "test_admin"})
+        assert r.status_code == 200
+        data = r.json()
+        assert [w["survey_id"] for w in data["waves"]] == [first, second]
+        assert [w["respondents"] for w in data["waves"]] == [2, 3]
+
+        burnout = next(d for d in data["dimensions"] if d["dimension_id"] == "burnout")
+        assert burnout["scores"] == [3.0, 5.0] and burnout["delta"] == 2.0
+        assert burnout["direction"] == "worsened"  # risco: subir e piorar
+        assert burnout["transitions"] == [{"from_wave": 0, "to_wave": 1, "from": "yellow", "to": "red", "direction": "worsened"}]
+
+        safety = data["kpi_deltas"]["safety_index"]
+        assert safety["values"] == [2.0, 0.0] and safety["delta"] == -2.0 and safety["direction"] == "worsened"
+
+    def test_scores_iguais_ao_dashboard(self, client):
+        import random
+
+        ids = []
+        rng = random.Random(11)
+        for _ in range(2):
+            survey = client.post("/api/admin/surveys", json={"company_name": "Onda", "admin_code": "test_admin"}).json()
+            for _ in range(6):
+                client.post(f"/api/survey/{survey['code']}/submit", json={"responses": {str(i): rng.randint(1, 5) for i in range(1, 42)}})
+            ids.append(survey["id"])
+        waves = client.get("/api/admin/compare", params={"survey_ids": ids, "admin_code": "test_admin"}).json()["waves"]
+        for wave in waves:
+            dash = client.get(f"/api/admin/surveys/{wave['survey_id']}/dashboard", params={"admin_code": "test_admin"}).json()
+            assert wave["dim_scores"] == dash["dim_scores"]
+            assert wave["kpis"] == dash["kpis"]
+
+    def test_onda_sem_respostas(self, client):
+        first, empty = self._wave(client, 4), self._wave(client, 4, n=0)
+        data = client.get("/api/admin/compare", params={"survey_ids": [first, empty], "admin_code": "test_admin"}).json()
+        assert data["waves"][1]["respondents"] == 0 and data["waves"][1]["dim_scores"] == []
+        assert data["dimensions"][0]["scores"][1] is None and data["dimensions"][0]["transitions"] == []
+
+    def test_validacao_e_acesso(self, client):
+        mine, other = self._wave(client, 3, n=1), self._wave(client, 3, n=1, admin_code="outra_empresa")
+        assert client.get("/api/admin/compare", params={"survey_ids": [mine], "admin_code": "test_admin"}).status_code == 400
+        assert client.get("/api/admin/compare", params={"survey_ids": [mine, "nao-existe"], "admin_code": "test_admin"}).status_code == 404
+        assert client.get("/api/admin/compare", params={"survey_ids": [mine, other], "admin_code": "outra_empresa"}).status_code == 403
+
+
+class TestResponseImport:
+    """Importacao em lote (CSV/XLSX) de questionarios em papel."""
+
+    HEADER = [f"Q{i}" for i in range(1, 42)]
+
+    def _csv(self, rows, header=None, sep=";"):
+        lines = [sep.join(header or self.HEADER)] + [sep.join(str(v) for v in row) for row in rows]
+        return ("respostas.csv", ("\n".join(lines) + "\n").encode("utf-8"), "text/csv")
+
+    def _import(self, client, survey, upload, **params):
+        return client.post(
+            f"/api/admin/surveys/{survey.id}/import",
+            params={"admin_code": survey.admin_code, **params},
+            files={"file": upload},
+        )
+
+    def _count(self, db, survey):
+        db.expire_all()
+        return db.query(Respondent).filter(Respondent.survey_id == survey.id).count()
+
+    def test_csv_atualiza_contagem_histograma_e_dashboard(self, client, db, survey):
+        from database import question_histogram
+
+        r = self._import(client, survey, self._csv([[4] * 41, [2] * 41, [4] * 41]))
+        assert r.status_code == 200
+        assert r.json()["imported"] == 3 and r.json()["invalid"] == 0
+        assert self._count(db, survey) == 3
+        db.refresh(survey)
+        assert survey.respondent_count == 3
+        hist = question_histogram(db, survey.id)
+        assert hist[:, 3].tolist() == [2] * 41 and hist[:, 1].tolist() == [1] * 41
+        dash = client.get(f"/api/admin/surveys/{survey.id}/dashboard", params={"admin_code": survey.admin_code}).json()
+        assert dash["total_respondents"] == 3
+
+    def test_xlsx_com_colunas_extras(self, client, db, survey):
+        import io
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        ws = wb.active
+        ws.append(["display_id", "submitted_at", "Observacao"] + [str(i) for i in range(1, 42)])
+        ws.append(["P001", "15/03/2026", "ok"] + [3] * 41)
+        ws.append(["P002", None, None] + [5.0] * 41)
+        buf = io.BytesIO()
+        wb.save(buf)
+        upload = ("papel.xlsx", buf.getvalue(), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        r = self._import(client, survey, upload)
+        assert r.status_code == 200 and r.json()["imported"] == 2
+        assert r.json()["ignored_columns"] == ["Observacao"]
+        db.expire_all()
+        p1 = db.query(Respondent).filter(Respondent.survey_id == survey.id, Respondent.display_id == "P001").one()
+        assert p1.submitted_at.date().isoformat() == "2026-03-15"
+        assert p1.responses["1"] == 3
+
+    def test_linha_invalida_cancela_tudo(self, client, db, survey):
+        rows = [[3] * 41, [3] * 40 + [7], [3] * 40 + [""]]
+        r = self._import(client, survey, self._csv(rows))
+        assert r.status_code == 422
+        body = r.json()
+        assert body["imported"] == 0 and body["invalid"] == 2
+        assert [e["row"] for e in body["errors"]] == [3, 4]
+        assert "Questão 41" in body["errors"][0]["errors"][0]
+        assert self._count(db, survey) == 0
+
+    def test_skip_invalid_importa_as_validas(self, client, db, survey):
+        rows = [[3] * 41, ["x"] * 41, [], [1] * 41]
+        r = self._import(client, survey, self._csv(rows), skip_invalid=True)
+        assert r.status_code == 200
+        assert (r.json()["imported"], r.json()["invalid"], r.json()["skipped_empty"]) == (2, 1, 1)
+        assert self._count(db, survey) == 2
+
+    def test_dry_run_nao_grava(self, client, db, survey):
+        r = self._import(client, survey, self._csv([[3] * 41] * 2, sep=","), dry_run=True)
+        assert r.status_code == 200
+        assert r.json()["dry_run"] and r.json()["imported"] == 2
+        assert self._count(db, survey) == 0
+
+    def test_segmentos_validados_pelas_opcoes(self, client, db, survey):
+        client.put(
+            f"/api/admin/surveys/{survey.id}/settings",
+            params={"admin_code": survey.admin_code},
+            json={"segment_options": {"department": ["RH", "TI"]}},
+        )
+        header = ["department"] + self.HEADER
+        r = self._import(client, survey, self._csv([["TI"] + [3] * 41, ["Vendas"] + [3] * 41], header=header))
+        assert r.status_code == 422 and "department" in r.json()["errors"][0]["errors"][0]
+        r = self._import(client, survey, self._csv([["TI"] + [3] * 41, [""] + [3] * 41], header=header))
+        assert r.status_code == 200
+        db.expire_all()
+        departments = sorted(d or "" for (d,) in db.query(Respondent.department).filter(Respondent.survey_id == survey.id))
+        assert departments == ["", "TI"]
+
+    def test_arquivo_invalido(self, client, survey):
+        assert self._import(client, survey, self._csv([[3] * 40], header=self.HEADER[:40])).status_code == 400
+        assert self._import(client, survey, ("dados.txt", b"1;2", "text/plain")).status_code == 400
+        assert self._import(client, survey, ("vazio.csv", b"", "text/csv")).status_code == 400
+        assert self._import(client, survey, ("ruim.xlsx", b"nao e zip", "application/octet-stream")).status_code == 400
+
+    def test_codigo_admin_errado(self, client, survey):
+        r = client.post(
+            f"/api/admin/surveys/{survey.id}/import",
+            params={"admin_code": "errado"},
+            files={"file": self._csv([[3] * 41])},
+        )
+        assert r.status_code == 403
+
+
 class TestDashboard:
     """Testes do dashboard administrativo."""
 
@@ -168,6 +684,282 @@ class TestDashboard:
         assert "kpis" in data
         assert "recommendations" in data
 
+    def test_dashboard_materializa_snapshot(self, client, db, survey_with_responses):
+        from database import DashboardSnapshot
+        r = client.get(
+            f"/api/admin/surveys/{survey_with_responses.id}/dashboard",
+            params={"admin_code": "test_admin"},
+        )
+        assert r.status_code == 200
+        db.expire_all()
+        snap = db.query(DashboardSnapshot).filter(DashboardSnapshot.survey_id == survey_with_responses.id).first()
+        assert snap is not None
+        assert snap.data_version == survey_with_responses.data_version
+        assert snap.payload["dim_scores"] == r.json()["dim_scores"]
+
+    def test_submit_invalida_snapshot(self, client, db, survey_with_responses):
+        params = {"admin_code": "test_admin"}
+        url = f"/api/admin/surveys/{survey_with_responses.id}/dashboard"
+        assert client.get(url, params=params).json()["total_respondents"] == 1
+        version_before = survey_with_responses.data_version
+        r = client.post(
+            f"/api/survey/{survey_with_responses.code}/submit",
+            json={"responses": {str(i): 5 for i in range(1, 42)}},
+        )
+        assert r.status_code == 200
+        db.expire_all()
+        assert survey_with_responses.data_version == version_before + 1
+        data = client.get(url, params=params).json()
+        assert data["total_respondents"] == 2
+
+
+class TestDashboardProse:
+    """Prosa da IA gerada em segundo plano (dashboard nao espera o Gemini)."""
+
+    def test_sem_chave_prosa_pronta_imediatamente(self, client, survey_with_responses, monkeypatch):
+        monkeypatch.delenv("FLUIR_GEMINI_API_KEY", raising=False)
+        monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+        r = client.get(
+            f"/api/admin/surveys/{survey_with_responses.id}/dashboard",
+            params={"admin_code": "test_admin"},
+        )
+        assert r.json()["prose_status"] == "ready"
+
+    def test_dashboard_pendente_e_endpoint_de_prosa(self, client, survey_with_responses, monkeypatch):
+        import threading
+        import prose_jobs
+
+        liberar = threading.Event()
+        ia = {"imediata": "Prosa IA", "curto_prazo": "", "medio_prazo": ""}
+
+        def fake_generate(recs, check_cache=True):
+            liberar.wait(5)
+            return ia
+
+        monkeypatch.setenv("FLUIR_GEMINI_API_KEY", "fake")
+        monkeypatch.setattr(prose_jobs, "generate_recommendations_prose", fake_generate)
+        monkeypatch.setattr(prose_jobs, "cached_recommendations_prose", lambda recs: None)
+        prose_jobs._jobs.clear()
+
+        params = {"admin_code": "test_admin"}
+        r = client.get(f"/api/admin/surveys/{survey_with_responses.id}/dashboard", params=params)
+        data = r.json()
+        assert data["recommendations"], "pesquisa de teste deve gerar recomendacoes"
+        assert data["prose_status"] == "pending"
+        assert data["kpis"]
+
+        url = f"/api/admin/surveys/{survey_with_responses.id}/dashboard/prose"
+        assert client.get(url, params=params).json()["prose_status"] == "pending"
+        liberar.set()
+        next(iter(prose_jobs._jobs.values())).result(timeout=5)
+        body = client.get(url, params=params).json()
+        assert body == {"prose_status": "ready", "recommendations_prose": ia}
+        prose_jobs._jobs.clear()
+
+    def test_fallback_apos_falha_nao_fica_fixado(self, monkeypatch):
+        import prose_jobs
+
+        chamadas = []
+        ia = {"imediata": "Prosa IA", "curto_prazo": "", "medio_prazo": ""}
+        fallback = {"imediata": "Fallback", "curto_prazo": "", "medio_prazo": ""}
+        recs = [{"priority": "imediata", "title": "Acao", "description": "Fazer X."}]
+
+        def fake_generate(recs, check_cache=True):
+            chamadas.append(1)
+            return fallback if len(chamadas) == 1 else ia
+
+        monkeypatch.setenv("FLUIR_GEMINI_API_KEY", "fake")
+        monkeypatch.setattr(prose_jobs, "generate_recommendations_prose", fake_generate)
+        monkeypatch.setattr(prose_jobs, "cached_recommendations_prose", lambda recs: None)
+        monkeypatch.setattr(prose_jobs, "prose_is_final", lambda recs: len(chamadas) > 1)
+        prose_jobs._jobs.clear()
+
+        prose_jobs.request_prose(recs)
+        next(iter(prose_jobs._jobs.values())).result(timeout=5)
+        # Dentro do intervalo de nova tentativa: fallback pronto, sem nova chamada
+        assert prose_jobs.request_prose(recs) == (prose_jobs.PROSE_READY, fallback)
+        assert len(chamadas) == 1
+
+        monkeypatch.setattr(prose_jobs, "RETRY_AFTER_S", 0.0)
+        assert prose_jobs.request_prose(recs)[0] in (prose_jobs.PROSE_PENDING, prose_jobs.PROSE_READY)
+        next(iter(prose_jobs._jobs.values())).result(timeout=5)
+        assert prose_jobs.request_prose(recs) == (prose_jobs.PROSE_READY, ia)
+        assert len(chamadas) == 2
+        # Prosa final nao fica no registro de jobs (proximos acessos vem do prose_cache)
+        assert prose_jobs._jobs == {}
+
+
+class TestExportCache:
+    """Cache dos arquivos exportados com ETag / If-None-Match."""
+
+    def test_excel_etag_e_304(self, client, survey_with_responses):
+        url = f"/api/admin/surveys/{survey_with_responses.id}/export/excel"
+        params = {"admin_code": "test_admin"}
+        r1 = client.get(url, params=params)
+        assert r1.status_code == 200
+        etag = r1.headers["etag"]
+        r2 = client.get(url, params=params)
+        assert r2.headers["etag"] == etag
+        assert r2.content == r1.content
+        r3 = client.get(url, params=params, headers={"If-None-Match": etag})
+        assert r3.status_code == 304
+        assert r3.content == b""
+
+    def test_nova_resposta_muda_etag(self, client, survey_with_responses):
+        url = f"/api/admin/surveys/{survey_with_responses.id}/export/excel"
+        params = {"admin_code": "test_admin"}
+        etag = client.get(url, params=params).headers["etag"]
+        client.post(
+            f"/api/survey/{survey_with_responses.code}/submit",
+            json={"responses": {str(i): 1 for i in range(1, 42)}},
+        )
+        r = client.get(url, params=params, headers={"If-None-Match": etag})
+        assert r.status_code == 200
+        assert r.headers["etag"] != etag
+
+    def test_pptx_servido_do_cache(self, client, survey_with_responses, monkeypatch):
+        import main
+
+        monkeypatch.delenv("FLUIR_GEMINI_API_KEY", raising=False)
+        monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+        url = f"/api/admin/surveys/{survey_with_responses.id}/export/pptx"
+        params = {"admin_code": "test_admin"}
+        r1 = client.get(url, params=params)
+        assert r1.status_code == 200
+
+        def nao_deve_renderizar(*args, **kwargs):
+            raise AssertionError("export_pptx chamado com artefato em cache")
+
+        monkeypatch.setattr(main, "export_pptx", nao_deve_renderizar)
+        r2 = client.get(url, params=params)
+        assert r2.status_code == 200
+        assert r2.content == r1.content
+
+    def test_pptx_com_prosa_de_fallback_sem_etag(self, client, survey_with_responses, monkeypatch):
+        import main
+
+        monkeypatch.setattr(main, "prose_is_final", lambda recommendations: False)
+        url = f"/api/admin/surveys/{survey_with_responses.id}/export/pptx"
+        r = client.get(url, params={"admin_code": "test_admin"})
+        assert r.status_code == 200
+        assert "etag" not in r.headers
+        assert r.headers["cache-control"] == "no-store"
+
+
+class TestExportJobs:
+    """Jobs de exportacao PPTX em segundo plano (process pool)."""
+
+    def test_job_pptx_conclui_e_devolve_arquivo(self, client, survey_with_responses, monkeypatch):
+        import time
+        import export_jobs
+
+        monkeypatch.delenv("FLUIR_GEMINI_API_KEY", raising=False)
+        monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+        base = f"/api/admin/surveys/{survey_with_responses.id}/export/pptx/jobs"
+        params = {"admin_code": "test_admin"}
+        r = client.post(base, params=params)
+        assert r.status_code == 202
+        job_id = r.json()["job_id"]
+        # Job identico da mesma pesquisa e reaproveitado
+        assert client.post(base, params=params).json()["job_id"] == job_id
+
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            r = client.get(f"{base}/{job_id}", params=params)
+            if "presentation" in r.headers["content-type"]:
+                break
+            assert r.json()["status"] in (export_jobs.JOB_QUEUED, export_jobs.JOB_PROSE, export_jobs.JOB_RENDERING)
+            time.sleep(0.2)
+        assert r.status_code == 200
+        assert r.content[:2] == b"PK"
+        assert r.headers["etag"]
+
+    def test_job_com_prosa_de_fallback_nao_e_reaproveitado(self, monkeypatch):
+        import export_jobs
+
+        monkeypatch.setattr(export_jobs._coordinator, "submit", lambda *args: None)
+        monkeypatch.setattr(export_jobs, "_jobs", export_jobs.OrderedDict())
+        key = "pptx-fallback-teste"
+        provisorio = export_jobs.ExportJob(id="a", survey_id="s1", key=key, status=export_jobs.JOB_DONE, content=b"PK")
+        export_jobs._jobs[provisorio.id] = provisorio
+        novo = export_jobs.submit_pptx_job("s1", key, {}, [])
+        assert novo.id != provisorio.id and novo.status == export_jobs.JOB_QUEUED
+        # Em andamento: deduplicado
+        assert export_jobs.submit_pptx_job("s1", key, {}, []).id == novo.id
+
+    def test_job_inexistente_404(self, client, survey):
+        r = client.get(
+            f"/api/admin/surveys/{survey.id}/export/pptx/jobs/naoexiste",
+            params={"admin_code": "test_admin"},
+        )
+        assert r.status_code == 404
+
+
+class TestResponsesPagination:
+    """Paginacao por keyset e modo NDJSON de /responses."""
+
+    def _submit(self, client, survey, n):
+        for i in range(n):
+            r = client.post(
+                f"/api/survey/{survey.code}/submit",
+                json={"responses": {str(q): (i % 5) + 1 for q in range(1, 42)}},
+            )
+            assert r.status_code == 200
+
+    def test_paginas_cobrem_todos_sem_repeticao(self, client, survey):
+        self._submit(client, survey, 5)
+        url = f"/api/admin/surveys/{survey.id}/responses"
+        vistos, cursor = [], None
+        while True:
+            params = {"admin_code": "test_admin", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            r = client.get(url, params=params)
+            assert r.status_code == 200
+            page = r.json()
+            assert len(page) <= 2
+            vistos += [row["display_id"] for row in page]
+            cursor = r.headers.get("x-next-cursor")
+            if not cursor:
+                break
+        completo = client.get(url, params={"admin_code": "test_admin"}).json()
+        assert vistos == [row["display_id"] for row in completo]
+        assert len(vistos) == 5
+
+    def test_cursor_invalido_400(self, client, survey):
+        r = client.get(
+            f"/api/admin/surveys/{survey.id}/responses",
+            params={"admin_code": "test_admin", "cursor": "@@@"},
+        )
+        assert r.status_code == 400
+
+    def test_ndjson(self, client, survey):
+        import json
+
+        self._submit(client, survey, 3)
+        r = client.get(
+            f"/api/admin/surveys/{survey.id}/responses",
+            params={"admin_code": "test_admin"},
+            headers={"Accept": "application/x-ndjson"},
+        )
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        linhas = [json.loads(l) for l in r.text.splitlines()]
+        assert len(linhas) == 3
+        assert set(linhas[0]) == {"display_id", "submitted_at", "scores", "statuses"}
+
+    def test_dashboard_respondents_limit(self, client, survey):
+        self._submit(client, survey, 3)
+        params = {"admin_code": "test_admin", "respondents_limit": 2}
+        data = client.get(f"/api/admin/surveys/{survey.id}/dashboard", params=params).json()
+        assert len(data["respondents"]) == 2
+        assert data["total_respondents"] == 3
+        resto = client.get(
+            f"/api/admin/surveys/{survey.id}/responses",
+            params={"admin_code": "test_admin", "cursor": data["respondents_next_cursor"]},
+        ).json()
+        assert len(resto) == 1
+
 
 class TestLandingPage:
     """Testes da pagina de landing."""
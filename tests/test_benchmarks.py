@@ -0,0 +1,42 @@
+"""
+Testes do gerador de dados e da comparacao com baseline da suite de benchmarks.
+"""
+import numpy as np
+
+from benchmarks.datagen import answer_matrix
+from benchmarks.suite import compare_results
+
+
+def test_gerador_deterministico():
+    a = answer_matrix(200, seed=7)
+    assert a.shape == (200, 41)
+    assert a.min() >= 1 and a.max() <= 5
+    assert np.array_equal(a, answer_matrix(200, seed=7))
+    assert not np.array_equal(a, answer_matrix(200, seed=8))
+
+
+def test_gerador_usa_toda_a_escala():
+    counts = np.bincount(answer_matrix(2000, seed=1).ravel(), minlength=6)[1:]
+    assert (counts > 0).all()
+
+
+def _result(**metrics):
+    return {"results": {name: {"kind": kind, "value": value} for name, (kind, value) in metrics.items()}}
+
+
+def test_compare_detecta_regressao_de_tempo():
+    base = _result(**{"dashboard_cold/1000": ("time", 1.0), "export_excel/1000": ("time", 2.0)})
+    atual = _result(**{"dashboard_cold/1000": ("time", 1.3), "export_excel/1000": ("time", 2.1)})
+    regressoes = compare_results(atual, base, threshold=0.2)
+    assert [r["metric"] for r in regressoes] == ["dashboard_cold/1000"]
+
+
+def test_compare_throughput_maior_e_melhor():
+    base = _result(submit_throughput=("rate", 100.0))
+    assert compare_results(_result(submit_throughput=("rate", 150.0)), base, 0.2) == []
+    assert len(compare_results(_result(submit_throughput=("rate", 70.0)), base, 0.2)) == 1
+
+
+def test_compare_ignora_metricas_ausentes():
+    base = _result(**{"export_pptx/50000": ("time", 10.0)})
+    assert compare_results(_result(), base, 0.2) == []
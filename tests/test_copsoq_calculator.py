@@ -1,12 +1,27 @@
 """
 Testes unitarios do motor de calculo COPSOQ II.
 """
+import random
+
+import numpy as np
 import pytest
 from copsoq_calculator import (
     get_status,
     calc_dimension_scores,
     calc_kpis,
     calc_summary,
+    build_response_matrix,
+    calc_dimension_scores_batch,
+    aggregate_dimension_scores,
+    dimension_maps,
+    answer_counts,
+    histogram_dimension_scores,
+    histogram_medians,
+    answer_distribution,
+    dimension_trends,
+    kpi_deltas,
+    DIMENSION_IDS,
+    DIMENSION_MATRIX,
     LOWER_TERCILE,
     UPPER_TERCILE,
 )
@@ -112,3 +127,119 @@ class TestCalcSummary:
         dim_scores = calc_dimension_scores(responses)
         s = calc_summary(dim_scores)
         assert 0 <= s["health_score"] <= 100
+
+
+class TestBatchEngine:
+    """Equivalencia do motor vetorizado com o caminho escalar (calc_dimension_scores + agregado)."""
+
+    def _random_responses(self, n, seed=42, missing_rate=0.0):
+        rng = random.Random(seed)
+        result = []
+        for _ in range(n):
+            result.append({
+                q: rng.randint(1, 5) for q in range(1, 42) if rng.random() >= missing_rate
+            })
+        return result
+
+    def test_matriz_de_dimensoes_cobre_41_questoes(self):
+        assert DIMENSION_MATRIX.shape == (41, 26)
+        assert (DIMENSION_MATRIX.sum(axis=1) == 1).all()
+
+    def test_scores_e_status_iguais_ao_escalar(self):
+        responses_list = self._random_responses(300, missing_rate=0.05)
+        scores, statuses = calc_dimension_scores_batch(build_response_matrix(responses_list))
+        assert scores.shape == (300, 26)
+        for responses, (scores_map, statuses_map) in zip(responses_list, dimension_maps(scores, statuses)):
+            expected = calc_dimension_scores(responses)
+            assert scores_map == {d["dimension_id"]: d["score"] for d in expected}
+            assert statuses_map == {d["dimension_id"]: d["status"] for d in expected}
+
+    @pytest.mark.parametrize("n", [1, 2, 7, 8, 250])
+    def test_agregado_igual_ao_escalar(self, n):
+        from main import _aggregate_dim_scores
+
+        responses_list = self._random_responses(n, seed=n)
+        scores, _ = calc_dimension_scores_batch(build_response_matrix(responses_list))
+        expected = _aggregate_dim_scores([calc_dimension_scores(r) for r in responses_list])
+        assert aggregate_dimension_scores(scores) == expected
+
+    def test_aceita_chaves_string(self):
+        matrix = build_response_matrix([{str(i): 3 for i in range(1, 42)}])
+        scores, statuses = calc_dimension_scores_batch(matrix)
+        assert np.all(scores == 3.0)
+        assert [s for s in dimension_maps(scores, statuses)[0][1].values()] == ["yellow"] * len(DIMENSION_IDS)
+
+    def test_dimensao_sem_respostas_e_omitida(self):
+        scores, statuses = calc_dimension_scores_batch(build_response_matrix([{1: 4, 2: 4}]))
+        scores_map, _ = dimension_maps(scores, statuses)[0]
+        assert scores_map == {"exigencias_quantitativas": 4.0}
+        assert [d["dimension_id"] for d in aggregate_dimension_scores(scores)] == ["exigencias_quantitativas"]
+
+
+class TestHistogramas:
+    """Agregados a partir do histograma 41 x 5 (survey_question_histogram)."""
+
+    def _matrix(self, n, seed=0):
+        rng = np.random.default_rng(seed)
+        return rng.integers(1, 6, size=(n, 41), dtype=np.uint8)
+
+    def test_contagem_ignora_sem_resposta(self):
+        counts = answer_counts(build_response_matrix([{1: 5, 2: 3}, {1: 5}]))
+        assert counts.shape == (41, 5)
+        assert counts[0].tolist() == [0, 0, 0, 0, 2]
+        assert counts[1].tolist() == [0, 0, 1, 0, 0]
+        assert counts.sum() == 3
+
+    def test_histograma_e_aditivo(self):
+        m = self._matrix(50)
+        assert (answer_counts(m) == answer_counts(m[:20]) + answer_counts(m[20:])).all()
+
+    @pytest.mark.parametrize("n", [1, 2, 7, 8, 101])
+    def test_mediana_igual_ao_numpy(self, n):
+        m = self._matrix(n, seed=n)
+        assert np.array_equal(histogram_medians(answer_counts(m)), np.median(m, axis=0))
+
+    @pytest.mark.parametrize("n", [1, 3, 250])
+    def test_scores_proximos_do_caminho_por_linha(self, n):
+        m = self._matrix(n, seed=n)
+        expected = aggregate_dimension_scores(calc_dimension_scores_batch(m)[0])
+        result = histogram_dimension_scores(answer_counts(m))
+        assert [d["dimension_id"] for d in result] == [d["dimension_id"] for d in expected]
+        for got, exp in zip(result, expected):
+            # Diferenca apenas do arredondamento por respondente no caminho por linha
+            assert abs(got["score"] - exp["score"]) <= 0.01 + 1e-9
+
+    def test_histograma_vazio(self):
+        counts = np.zeros((41, 5), dtype=np.int64)
+        assert histogram_dimension_scores(counts) == []
+        dist = answer_distribution(counts)
+        assert dist[0] == {"question_id": 1, "counts": [0, 0, 0, 0, 0], "n": 0, "mean": None, "median": None}
+
+    def test_distribuicao_por_questao(self):
+        counts = answer_counts(build_response_matrix([{1: 1}, {1: 2}, {1: 5}, {1: 5}]))
+        q1 = answer_distribution(counts)[0]
+        assert q1 == {"question_id": 1, "counts": [1, 1, 0, 0, 2], "n": 4, "mean": 3.25, "median": 3.5}
+
+
+class TestComparacaoOndas:
+    def _wave(self, value):
+        return calc_dimension_scores({q: value for q in range(1, 42)})
+
+    def test_recurso_subir_e_melhora(self):
+        trends = {d["dimension_id"]: d for d in dimension_trends([self._wave(2), self._wave(3), self._wave(4)])}
+        lid = trends["qualidade_lideranca"]
+        assert lid["scores"] == [2.0, 3.0, 4.0] and lid["delta"] == 2.0 and lid["direction"] == "improved"
+        assert [(t["from"], t["to"], t["direction"]) for t in lid["transitions"]] == [
+            ("red", "yellow", "improved"), ("yellow", "green", "improved"),
+        ]
+
+    def test_sem_mudanca_e_estavel(self):
+        trends = dimension_trends([self._wave(3), self._wave(3)])
+        assert all(d["direction"] == "stable" and d["transitions"] == [] for d in trends)
+
+    def test_kpi_deltas_consecutivos(self):
+        kpis = [calc_kpis(self._wave(v)) for v in (2, 4, 3)]
+        wellbeing = kpi_deltas(kpis)["wellbeing_index"]
+        assert wellbeing["values"] == [2.0, 4.0, 3.0]
+        assert wellbeing["deltas"] == [2.0, -1.0] and wellbeing["delta"] == 1.0
+        assert wellbeing["direction"] == "improved"
@@ -14,6 +14,7 @@ from database import (
     Respondent,
     generate_uuid,
     generate_code,
+    pack_answers,
     SessionLocal,
 )
 
@@ -59,3 +60,153 @@ class TestModels:
         db.commit()
         db.refresh(r)
         assert r.responses == responses
+
+    def test_respondent_answers_compactos(self, db, survey):
+        responses = {str(i): (i % 5) + 1 for i in range(1, 42)}
+        r = Respondent(survey_id=survey.id, display_id="R2", answers=pack_answers(responses))
+        db.add(r)
+        db.commit()
+        db.refresh(r)
+        assert len(r.answers) == 41
+        assert r.responses == responses
+        assert r.answers_row().tolist() == [(i % 5) + 1 for i in range(1, 42)]
+
+    def test_answers_matrix_mistura_formatos(self, db, survey):
+        legado = Respondent(survey_id=survey.id, display_id="R3", responses_json=json.dumps({"1": 2}))
+        novo = Respondent(survey_id=survey.id, display_id="R4", answers=pack_answers({i: 4 for i in range(1, 42)}))
+        matrix = Respondent.answers_matrix([legado, novo])
+        assert matrix.shape == (2, 41)
+        assert matrix[0, 0] == 2 and matrix[0, 1:].sum() == 0
+        assert (matrix[1] == 4).all()
+
+    def test_migracao_responses_json_para_answers(self, db, survey):
+        from database import engine
+        from migrations import pack_legacy_responses
+
+        r = Respondent(survey_id=survey.id, display_id="R5", responses_json=json.dumps({"1": 3, "41": 5}))
+        db.add(r)
+        db.commit()
+        pack_legacy_responses(engine)
+        db.refresh(r)
+        assert r.responses_json is None
+        assert r.responses == {"1": 3, "41": 5}
+
+
+class TestMigrations:
+    """Testes do runner de migracoes versionadas."""
+
+    def test_init_db_registra_versoes(self, db):
+        from database import SchemaVersion
+        from migrations import MIGRATIONS
+
+        init_db()
+        versions = {v.version for v in db.query(SchemaVersion).all()}
+        assert versions == {m[0] for m in MIGRATIONS}
+
+    def test_indices_quentes_existem(self):
+        from sqlalchemy import inspect
+        from database import engine
+
+        init_db()
+        insp = inspect(engine)
+        assert "ix_respondents_survey_submitted" in {i["name"] for i in insp.get_indexes("respondents")}
+        assert "ix_surveys_admin_code" in {i["name"] for i in insp.get_indexes("surveys")}
+        assert "ix_recommendations_survey_order" in {i["name"] for i in insp.get_indexes("recommendations")}
+
+    def test_migracao_aplicada_uma_unica_vez(self):
+        from database import engine
+        from migrations import run_migrations
+
+        chamadas = []
+        migracao = [(9001, "teste_unica_vez", lambda eng: chamadas.append(1))]
+        try:
+            assert run_migrations(engine, migracao) == [9001]
+            assert run_migrations(engine, migracao) == []
+            assert chamadas == [1]
+        finally:
+            from database import SchemaVersion, SessionLocal
+            s = SessionLocal()
+            s.query(SchemaVersion).filter(SchemaVersion.version == 9001).delete()
+            s.commit()
+            s.close()
+
+    def test_schema_lock_postgres_reentrante(self):
+        from types import SimpleNamespace
+        from migrations import schema_lock
+
+        executados = []
+
+        class Conexao:
+            def execute(self, stmt, params=None):
+                executados.append(str(stmt).split("(")[0].replace("SELECT ", ""))
+
+            def close(self):
+                executados.append("close")
+
+        eng = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), connect=Conexao)
+        with schema_lock(eng):
+            # run_migrations dentro do init_db: nao abre um segundo lock (deadlock entre conexoes)
+            with schema_lock(eng):
+                executados.append("ddl")
+        assert executados == ["pg_advisory_lock", "ddl", "pg_advisory_unlock", "close"]
+
+    def test_relax_recria_tabela_sqlite_com_indices(self, tmp_path):
+        from sqlalchemy import create_engine, inspect, text
+        from migrations import run_migrations
+
+        eng = create_engine(f"sqlite:///{tmp_path / 'legado.db'}")
+        with eng.begin() as conn:
+            conn.execute(text("CREATE TABLE surveys (id VARCHAR PRIMARY KEY, admin_code VARCHAR(50))"))
+            conn.execute(text("CREATE TABLE recommendations (id VARCHAR PRIMARY KEY, survey_id VARCHAR, order_index INTEGER)"))
+            conn.execute(text(
+                "CREATE TABLE respondents (id VARCHAR PRIMARY KEY, survey_id VARCHAR NOT NULL, "
+                "display_id VARCHAR(10) NOT NULL, responses_json TEXT NOT NULL, answers BLOB, submitted_at DATETIME)"
+            ))
+            conn.execute(text(
+                "INSERT INTO respondents (id, survey_id, display_id, responses_json) "
+                "VALUES ('r1', 's1', 'R1', '{\"1\": 3}')"
+            ))
+        run_migrations(eng)
+        insp = inspect(eng)
+        col = next(c for c in insp.get_columns("respondents") if c["name"] == "responses_json")
+        assert col["nullable"]
+        assert "ix_respondents_survey_submitted" in {i["name"] for i in insp.get_indexes("respondents")}
+        with eng.connect() as conn:
+            answers, raw = conn.execute(text("SELECT answers, responses_json FROM respondents")).one()
+        assert raw is None and answers[0] == 3
+
+
+    def test_backfill_do_histograma(self, db, survey_with_responses):
+        from database import engine, question_histogram
+        from migrations import backfill_question_histograms
+
+        # O fixture grava o respondente direto (sem record_answers), como dados anteriores a tabela
+        assert question_histogram(db, survey_with_responses.id).sum() == 0
+        backfill_question_histograms(engine)
+        db.expire_all()
+        counts = question_histogram(db, survey_with_responses.id)
+        assert (counts[:, 2] == 1).all() and counts.sum() == 41
+
+
+class TestAsyncEngine:
+    """Testes da camada async (endpoints do respondente)."""
+
+    def test_async_url_troca_driver(self):
+        from database import _async_url
+
+        assert _async_url("sqlite:///./fluir.db").drivername == "sqlite+aiosqlite"
+        pg = _async_url("postgresql://u:p@host/db?sslmode=require")
+        assert pg.drivername == "postgresql+asyncpg"
+        assert dict(pg.query) == {"ssl": "require"}
+
+    def test_sessao_async_le_o_mesmo_banco(self, survey):
+        import asyncio
+        from sqlalchemy import select
+        from database import AsyncSessionLocal
+
+        async def buscar():
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(Survey.company_name).where(Survey.id == survey.id))
+                return result.scalar_one()
+
+        assert asyncio.run(buscar()) == "Empresa Teste"
@@ -0,0 +1,88 @@
+"""
+Testes do perfil de SQL por requisicao (FLUIR_DB_PROFILE).
+"""
+import logging
+
+import pytest
+from sqlalchemy import text
+
+import db_profiler
+from database import engine, async_engine, SessionLocal
+
+
+@pytest.fixture
+def profiling(monkeypatch):
+    db_profiler.install(engine, async_engine)
+    monkeypatch.setattr(db_profiler, "ENABLED", True)
+
+
+class TestPerfil:
+    def test_formato_normaliza_espacos_e_listas_in(self):
+        a = db_profiler.statement_shape("SELECT *\n  FROM t WHERE id IN (?, ?, ?)")
+        b = db_profiler.statement_shape("SELECT * FROM t WHERE id IN (?,?)")
+        assert a == b == "SELECT * FROM t WHERE id IN (?...)"
+
+    def test_conta_consultas_e_marca_repeticoes(self, profiling):
+        db_profiler.install(engine)  # idempotente
+        profile = db_profiler.RequestProfile()
+        token = db_profiler._current.set(profile)
+        session = SessionLocal()
+        try:
+            for i in range(db_profiler.REPEAT_THRESHOLD):
+                session.execute(text("SELECT :i"), {"i": i})
+            session.execute(text("SELECT 1 + 1"))
+        finally:
+            session.close()
+            db_profiler._current.reset(token)
+        assert profile.queries == db_profiler.REPEAT_THRESHOLD + 1
+        assert profile.db_seconds > 0
+        assert profile.repeated() == [("SELECT ?", db_profiler.REPEAT_THRESHOLD)]
+
+    def test_fora_de_requisicao_nao_registra(self, profiling):
+        session = SessionLocal()
+        try:
+            session.execute(text("SELECT 1"))
+        finally:
+            session.close()
+        assert db_profiler.current() is None
+
+
+class TestCabecalhos:
+    def test_desligado_sem_cabecalhos(self, client, survey):
+        r = client.get(f"/api/admin/surveys/{survey.id}", params={"admin_code": survey.admin_code})
+        assert "x-fluir-db-queries" not in r.headers
+
+    def test_endpoint_sync(self, client, survey, profiling):
+        r = client.get(f"/api/admin/surveys/{survey.id}", params={"admin_code": survey.admin_code})
+        assert r.status_code == 200
+        assert int(r.headers["x-fluir-db-queries"]) >= 1
+        assert r.headers["server-timing"].startswith("db;dur=")
+
+    def test_endpoint_async(self, client, survey, profiling):
+        responses = {str(i): 3 for i in range(1, 42)}
+        r = client.post(f"/api/survey/{survey.code}/submit", json={"responses": responses})
+        assert r.status_code == 200
+        # Consultas do AsyncSession (greenlet) tambem sao atribuidas a requisicao
+        assert int(r.headers["x-fluir-db-queries"]) >= 2
+
+    def test_n_mais_um_no_cabecalho_e_no_log(self, client, survey_with_responses, profiling, monkeypatch, caplog):
+        monkeypatch.setattr(db_profiler, "REPEAT_THRESHOLD", 1)
+        with caplog.at_level(logging.WARNING, logger="db_profiler"):
+            r = client.get(
+                f"/api/admin/surveys/{survey_with_responses.id}/dashboard",
+                params={"admin_code": survey_with_responses.admin_code},
+            )
+        assert r.status_code == 200
+        assert "x-fluir-db-repeated" in r.headers
+        assert "Provavel N+1" in caplog.text
+
+    def test_consultas_do_streaming_vao_para_o_log(self, client, survey_with_responses, profiling, caplog):
+        with caplog.at_level(logging.INFO, logger="db_profiler"):
+            r = client.get(
+                f"/api/admin/surveys/{survey_with_responses.id}/responses",
+                params={"admin_code": survey_with_responses.admin_code},
+                headers={"Accept": "application/x-ndjson"},
+            )
+        assert r.status_code == 200 and r.text.strip()
+        # A consulta do yield_per roda depois dos cabecalhos
+        assert "DB no streaming" in caplog.text
@@ -0,0 +1,45 @@
+"""
+Testes do cache em disco de arquivos exportados (LRU por tamanho).
+"""
+import os
+import time
+
+import pytest
+
+import export_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_cache, "CACHE_DIR", tmp_path)
+    return tmp_path
+
+
+def test_put_e_get(cache_dir):
+    export_cache.put("a" * 64, b"conteudo")
+    assert export_cache.get("a" * 64) == b"conteudo"
+    assert export_cache.get("b" * 64) is None
+
+
+def test_eviction_remove_menos_usado(cache_dir, monkeypatch):
+    monkeypatch.setattr(export_cache, "MAX_BYTES", 25)
+    export_cache.put("k1", b"x" * 10)
+    export_cache.put("k2", b"x" * 10)
+    antigo = time.time() - 100
+    os.utime(cache_dir / "k1.bin", (antigo, antigo))
+    os.utime(cache_dir / "k2.bin", (antigo + 1, antigo + 1))
+    export_cache.get("k1")  # k1 passa a ser o mais recente
+    export_cache.put("k3", b"x" * 10)
+    assert export_cache.get("k2") is None
+    assert export_cache.get("k1") is not None
+    assert export_cache.get("k3") is not None
+
+
+def test_chave_muda_com_versao_e_recomendacoes():
+    h1 = export_cache.recommendations_hash([{"title": "A"}])
+    h2 = export_cache.recommendations_hash([{"title": "B"}])
+    assert h1 != h2
+    k1 = export_cache.make_key("pptx", "s1", 1, h1, "2.0", "20260101")
+    assert k1 != export_cache.make_key("pptx", "s1", 2, h1, "2.0", "20260101")
+    assert k1 != export_cache.make_key("pptx", "s1", 1, h2, "2.0", "20260101")
+    assert k1 != export_cache.make_key("pptx", "s1", 1, h1, "2.1", "20260101")
@@ -0,0 +1,235 @@
+"""
+Testes do envio de emails em segundo plano (email_outbox) contra um servidor SMTP local.
+"""
+import email
+import socketserver
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import mail_outbox
+from database import AdminRecoveryEmail, EmailOutbox
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Servidor SMTP minimo (EHLO/MAIL/RCPT/DATA/NOOP/QUIT), no estilo do aiosmtpd."""
+
+    def _reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self._reply("220 stub ESMTP")
+        rcpts, mail_from = [], None
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            cmd = raw.decode().strip()
+            verb = cmd.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250 stub")
+            elif verb == "MAIL":
+                mail_from, rcpts = cmd, []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                if server.fail_next:
+                    server.fail_next -= 1
+                    self._reply("451 Tente mais tarde")
+                else:
+                    rcpts.append(cmd.split(":", 1)[1].strip("<> "))
+                    self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline().decode()
+                    if line in (".\r\n", ".\n", ""):
+                        break
+                    lines.append(line)
+                server.messages.append((rcpts, "".join(lines)))
+                self._reply("250 OK")
+            elif verb in ("NOOP", "RSET"):
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Not implemented")
+
+
+class _SmtpStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SmtpHandler)
+        self.messages = []
+        self.connections = 0
+        self.fail_next = 0
+
+
+@pytest.fixture
+def smtp_stub(monkeypatch, db):
+    server = _SmtpStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(server.server_address[1]))
+    monkeypatch.setenv("SMTP_FROM", "fluir@teste.com")
+    monkeypatch.setenv("SMTP_STARTTLS", "0")
+    # O teste chama process_once diretamente; sem thread de sender em paralelo
+    monkeypatch.setattr(mail_outbox, "ensure_sender", lambda: None)
+    mail_outbox._clients.clear()
+    db.query(EmailOutbox).delete()
+    db.commit()
+    yield server
+    if mail_outbox._connection is not None:
+        mail_outbox._connection.close()
+    mail_outbox._connection = None
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def email_cadastrado(db):
+    rec = db.query(AdminRecoveryEmail).filter(AdminRecoveryEmail.email == "admin@teste.com").first()
+    if rec is None:
+        db.add(AdminRecoveryEmail(email="admin@teste.com"))
+        db.commit()
+    return "admin@teste.com"
+
+
+def test_endpoint_apenas_enfileira(client, db, smtp_stub, email_cadastrado):
+    r = client.post("/api/admin/recover-code", json={"email": email_cadastrado})
+    assert r.status_code == 200
+    assert smtp_stub.messages == []
+    db.expire_all()
+    row = db.query(EmailOutbox).one()
+    assert row.status == mail_outbox.STATUS_PENDING
+    assert row.to_address == email_cadastrado
+
+
+def test_envia_chave_para_email_cadastrado(client, smtp_stub, email_cadastrado):
+    client.post("/api/admin/recover-code", json={"email": email_cadastrado})
+    assert mail_outbox.process_once() == 1
+    assert len(smtp_stub.messages) == 1
+    rcpts, data = smtp_stub.messages[0]
+    assert rcpts == [email_cadastrado]
+    msg = email.message_from_string(data)
+    texto = next(p for p in msg.walk() if p.get_content_type() == "text/plain").get_payload(decode=True).decode()
+    assert "test_admin" in texto
+
+
+def test_email_nao_cadastrado_descartado_sem_envio(client, db, smtp_stub):
+    r = client.post("/api/admin/recover-code", json={"email": "naoexiste@teste.com"})
+    assert r.json()["message"] == client.post(
+        "/api/admin/recover-code", json={"email": "outro@teste.com"}
+    ).json()["message"]
+    mail_outbox.process_once()
+    assert smtp_stub.messages == []
+    db.expire_all()
+    assert db.query(EmailOutbox).count() == 0
+
+
+def test_lote_reaproveita_conexao(client, db, smtp_stub):
+    emails = [f"admin{i}@teste.com" for i in range(6)]
+    for addr in emails:
+        if db.query(AdminRecoveryEmail).filter(AdminRecoveryEmail.email == addr).first() is None:
+            db.add(AdminRecoveryEmail(email=addr))
+    db.commit()
+    for addr in emails[:5]:
+        client.post("/api/admin/recover-code", json={"email": addr})
+    mail_outbox.process_once()
+    client.post("/api/admin/recover-code", json={"email": emails[5]})
+    mail_outbox.process_once()
+    assert len(smtp_stub.messages) == 6
+    assert smtp_stub.connections == 1
+
+
+def test_pedidos_repetidos_para_o_mesmo_email_absorvidos(client, db, smtp_stub, email_cadastrado):
+    for _ in range(5):
+        assert client.post("/api/admin/recover-code", json={"email": email_cadastrado}).status_code == 200
+    db.expire_all()
+    assert db.query(EmailOutbox).count() == 1
+    mail_outbox.process_once()
+    # Ja enviado, mas dentro de RESEND_INTERVAL_S
+    client.post("/api/admin/recover-code", json={"email": email_cadastrado})
+    assert mail_outbox.process_once() == 0
+    assert len(smtp_stub.messages) == 1
+
+
+def test_limite_por_cliente(client, smtp_stub, monkeypatch):
+    monkeypatch.setattr(mail_outbox, "CLIENT_LIMIT", 3)
+    codes = [client.post("/api/admin/recover-code", json={"email": f"x{i}@teste.com"}).status_code for i in range(5)]
+    assert codes == [200, 200, 200, 429, 429]
+
+
+@pytest.mark.parametrize("hops", [0, 1])
+def test_x_forwarded_for_forjado_nao_reinicia_o_limite(client, smtp_stub, monkeypatch, hops):
+    import main
+
+    monkeypatch.setattr(main, "TRUSTED_PROXY_HOPS", hops)
+    monkeypatch.setattr(mail_outbox, "CLIENT_LIMIT", 3)
+    codes = [
+        client.post(
+            "/api/admin/recover-code",
+            json={"email": f"x{i}@teste.com"},
+            # Cliente troca a entrada da esquerda; o proxy acrescenta o IP real a direita
+            headers={"X-Forwarded-For": f"10.0.0.{i}, 203.0.113.7"},
+        ).status_code
+        for i in range(5)
+    ]
+    assert codes == [200, 200, 200, 429, 429]
+
+
+def test_prune_apaga_linhas_antigas(db, smtp_stub):
+    antigo = datetime.now(timezone.utc) - timedelta(seconds=mail_outbox.RETENTION_S + 60)
+    for status in (mail_outbox.STATUS_SENT, mail_outbox.STATUS_FAILED, mail_outbox.STATUS_PENDING):
+        db.add(EmailOutbox(kind="recover_code", to_address=f"{status}@teste.com", status=status, created_at=antigo))
+    db.add(EmailOutbox(kind="recover_code", to_address="novo@teste.com", status=mail_outbox.STATUS_SENT))
+    db.commit()
+    assert mail_outbox.prune() == 2
+    db.expire_all()
+    assert sorted(r.to_address for r in db.query(EmailOutbox)) == ["novo@teste.com", "pending@teste.com"]
+
+
+def test_falha_temporaria_reagenda_com_backoff(client, db, smtp_stub, email_cadastrado):
+    smtp_stub.fail_next = 1
+    client.post("/api/admin/recover-code", json={"email": email_cadastrado})
+    mail_outbox.process_once()
+    db.expire_all()
+    row = db.query(EmailOutbox).one()
+    assert row.status == mail_outbox.STATUS_PENDING
+    assert row.attempts == 1
+    assert "451" in row.last_error
+    assert row.next_attempt_at.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc) + timedelta(seconds=20)
+    # Ainda dentro do backoff: nada a fazer
+    assert mail_outbox.process_once() == 0
+
+    row.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.commit()
+    assert mail_outbox.process_once() == 1
+    db.expire_all()
+    assert db.query(EmailOutbox).one().status == mail_outbox.STATUS_SENT
+    assert len(smtp_stub.messages) == 1
+
+
+def test_falha_apos_max_tentativas(client, db, smtp_stub, email_cadastrado, monkeypatch):
+    monkeypatch.setattr(mail_outbox, "MAX_ATTEMPTS", 1)
+    smtp_stub.fail_next = 1
+    client.post("/api/admin/recover-code", json={"email": email_cadastrado})
+    mail_outbox.process_once()
+    db.expire_all()
+    assert db.query(EmailOutbox).one().status == mail_outbox.STATUS_FAILED
+
+
+def test_sem_smtp_configurado_nao_enfileira(client, db, monkeypatch):
+    monkeypatch.delenv("SMTP_HOST", raising=False)
+    db.query(EmailOutbox).delete()
+    db.commit()
+    r = client.post("/api/admin/recover-code", json={"email": "admin@teste.com"})
+    assert r.status_code == 200
+    assert db.query(EmailOutbox).count() == 0
@@ -0,0 +1,87 @@
+"""
+Testes do registro de metricas e do endpoint /api/admin/metrics.
+"""
+import metrics
+
+
+def _sample(text: str, prefix: str) -> float:
+    """Valor da primeira linha que comeca com prefix (nome + labels)."""
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{prefix} nao encontrado")
+
+
+class TestRegistro:
+    def test_histograma_buckets_cumulativos(self):
+        h = metrics.Histogram("t_seconds", "teste", ("route",), buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 0.5, 3.0):
+            h.observe(v, route="/x")
+        text = "\n".join(h.render())
+        assert 't_seconds_bucket{route="/x",le="0.1"} 1' in text
+        assert 't_seconds_bucket{route="/x",le="1"} 3' in text
+        assert 't_seconds_bucket{route="/x",le="+Inf"} 4' in text
+        assert 't_seconds_count{route="/x"} 4' in text
+        assert _sample(text, 't_seconds_sum{route="/x"}') == 4.05
+        assert "# TYPE t_seconds histogram" in text
+
+    def test_counter_escapa_labels(self):
+        c = metrics.Counter("t_total", "teste", ("kind",))
+        c.inc(kind='a"b')
+        c.inc(2, kind='a"b')
+        assert c.value(kind='a"b') == 3
+        assert 't_total{kind="a\\"b"} 3' in c.render()
+
+    def test_coletor_expoe_stats_numericos(self):
+        metrics.register_collector("t_coletor", lambda: {"hits": 2, "enabled": True, "nome": "x"})
+        try:
+            text = metrics.render()
+        finally:
+            metrics._collectors.pop()
+        assert "t_coletor_hits 2" in text
+        assert "t_coletor_enabled 1" in text
+        assert "t_coletor_nome" not in text
+
+
+class TestEndpointMetricas:
+    def test_exige_codigo_admin_global(self, client):
+        assert client.get("/api/admin/metrics", params={"admin_code": "errado"}).status_code == 401
+        # Codigo de uma pesquisa (nao o global) nao da acesso as metricas do processo
+        client.post("/api/admin/surveys", json={"company_name": "Outra", "admin_code": "cliente_x"})
+        assert client.get("/api/admin/metrics", params={"admin_code": "cliente_x"}).status_code == 401
+        assert client.get("/api/admin/metrics").status_code == 422
+
+    def test_formato_prometheus(self, client):
+        r = client.get("/api/admin/metrics", params={"admin_code": "test_admin"})
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE fluir_http_request_duration_seconds histogram" in r.text
+        assert "fluir_survey_cache_hits" in r.text
+        assert "fluir_submit_buffer_enabled" in r.text
+
+    def test_latencia_por_template_de_rota(self, client, survey):
+        client.get(f"/api/survey/{survey.code}/info")
+        client.get("/api/survey/INEXISTENTE/info")
+        client.get("/nao-existe")
+        text = client.get("/api/admin/metrics", params={"admin_code": "test_admin"}).text
+        assert 'route="/api/survey/{code}/info",status="200"' in text
+        assert 'route="/api/survey/{code}/info",status="404"' in text
+        assert 'route="<unmatched>",status="404"' in text
+        assert survey.code not in text
+
+    def test_conta_submissoes(self, client, survey):
+        before = metrics.SUBMISSIONS.value(mode="direct", result="ok")
+        invalid = metrics.SUBMISSIONS.value(mode="direct", result="invalid")
+        responses = {str(i): 3 for i in range(1, 42)}
+        assert client.post(f"/api/survey/{survey.code}/submit", json={"responses": responses}).status_code == 200
+        assert client.post(f"/api/survey/{survey.code}/submit", json={"responses": {"1": 3}}).status_code == 400
+        assert metrics.SUBMISSIONS.value(mode="direct", result="ok") == before + 1
+        assert metrics.SUBMISSIONS.value(mode="direct", result="invalid") == invalid + 1
+
+    def test_conta_renderizacao_de_exportacao(self, client, survey_with_responses):
+        before = metrics.EXPORT_RENDER_SECONDS.count(format="xlsx", source="request")
+        url = f"/api/admin/surveys/{survey_with_responses.id}/export/excel"
+        params = {"admin_code": survey_with_responses.admin_code}
+        assert client.get(url, params=params).status_code == 200
+        assert client.get(url, params=params).status_code == 200  # cache: sem nova renderizacao
+        assert metrics.EXPORT_RENDER_SECONDS.count(format="xlsx", source="request") == before + 1
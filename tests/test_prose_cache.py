@@ -0,0 +1,121 @@
+"""
+Testes do cache de prosa de recomendacoes (LRU em memoria + tabela prose_cache).
+"""
+import sys
+import types
+
+import pytest
+
+import prose_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_limpo(db):
+    prose_cache.clear()
+    yield
+    prose_cache.clear()
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch):
+    """Substitui google.genai por um cliente falso que conta chamadas."""
+    calls = []
+
+    class _Models:
+        def generate_content(self, model, contents):
+            calls.append(model)
+            return types.SimpleNamespace(
+                text='{"imediata": "Texto IA", "curto_prazo": "Curto IA", "medio_prazo": "Medio IA"}'
+            )
+
+    class _Client:
+        def __init__(self, api_key):
+            self.models = _Models()
+
+    genai = types.ModuleType("google.genai")
+    genai.Client = _Client
+    google = types.ModuleType("google")
+    google.genai = genai
+    monkeypatch.setitem(sys.modules, "google", google)
+    monkeypatch.setitem(sys.modules, "google.genai", genai)
+    monkeypatch.setenv("FLUIR_GEMINI_API_KEY", "fake")
+    return calls
+
+
+RECS = [{"priority": "imediata", "title": "Acao", "description": "Fazer X."}]
+
+
+def test_segunda_chamada_usa_cache(fake_gemini):
+    from gemini_prose_service import generate_recommendations_prose
+
+    first = generate_recommendations_prose(RECS)
+    second = generate_recommendations_prose(RECS)
+    assert first == second == {"imediata": "Texto IA", "curto_prazo": "Curto IA", "medio_prazo": "Medio IA"}
+    assert len(fake_gemini) == 1
+    stats = prose_cache.stats()
+    assert stats["misses"] == 1
+    assert stats["memory_hits"] == 1
+
+
+def test_cache_persistido_na_tabela(fake_gemini):
+    from gemini_prose_service import generate_recommendations_prose
+
+    generate_recommendations_prose(RECS)
+    prose_cache._memory.clear()
+    generate_recommendations_prose(RECS)
+    assert len(fake_gemini) == 1
+    assert prose_cache.stats()["db_hits"] == 1
+
+
+def test_conteudo_diferente_gera_nova_chamada(fake_gemini):
+    from gemini_prose_service import generate_recommendations_prose
+
+    generate_recommendations_prose(RECS)
+    generate_recommendations_prose([{"priority": "curto", "title": "Outra", "description": "Y."}])
+    assert len(fake_gemini) == 2
+
+
+def test_fallback_nao_e_armazenado(monkeypatch):
+    from gemini_prose_service import generate_recommendations_prose
+
+    monkeypatch.delenv("FLUIR_GEMINI_API_KEY", raising=False)
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    generate_recommendations_prose(RECS)
+    assert prose_cache.stats()["stores"] == 0
+
+
+def test_entrada_expirada_e_ignorada(monkeypatch):
+    prose_cache.put("k1", "m", {"imediata": "a"})
+    monkeypatch.setattr(prose_cache, "TTL_SECONDS", -1)
+    prose_cache._memory.clear()
+    assert prose_cache.get("k1") is None
+
+
+def test_limite_de_tamanho_remove_menos_usadas(monkeypatch):
+    monkeypatch.setattr(prose_cache, "MAX_ENTRIES", 2)
+    prose_cache.put("k1", "m", {"imediata": "1"})
+    prose_cache.put("k2", "m", {"imediata": "2"})
+    prose_cache.put("k3", "m", {"imediata": "3"})
+    prose_cache._memory.clear()
+    assert prose_cache.get("k1") is None
+    assert prose_cache.get("k3") == {"imediata": "3"}
+    assert prose_cache.stats()["evictions"] == 1
+
+
+def test_uma_contagem_por_consulta_logica(fake_gemini):
+    import prose_jobs
+    from gemini_prose_service import generate_recommendations_prose, prose_is_final
+
+    prose_jobs._jobs.clear()
+    # Dashboard: uma falta; o job em segundo plano nao consulta de novo
+    assert prose_jobs.request_prose(RECS)[0] == prose_jobs.PROSE_PENDING
+    next(iter(prose_jobs._jobs.values())).result(timeout=5)
+    assert prose_cache.stats()["misses"] == 1
+    prose_jobs._jobs.clear()
+    # Nova carga do dashboard e exportacao (geracao + prose_is_final): um acerto cada
+    assert prose_jobs.request_prose(RECS)[0] == prose_jobs.PROSE_READY
+    generate_recommendations_prose(RECS)
+    assert prose_is_final(RECS)
+    stats = prose_cache.stats()
+    assert (stats["misses"], stats["memory_hits"]) == (1, 2)
+    assert len(fake_gemini) == 1
@@ -0,0 +1,36 @@
+"""
+Testes do renderizador de graficos do relatorio (Figure sem pyplot, PNG memoizado).
+"""
+import report_charts
+
+CATEGORIAS = {f"Categoria {i}": {"avg": 1 + i * 0.5, "status": "yellow"} for i in range(8)}
+DIMENSOES = [
+    {"name": f"Dimensao {i}", "score": 1 + (i % 5) * 0.8, "status": ("green", "yellow", "red")[i % 3]}
+    for i in range(26)
+]
+
+
+def test_radar_retorna_png():
+    png = report_charts.render_radar_png(CATEGORIAS)
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+
+
+def test_barras_retorna_png():
+    png = report_charts.render_bar_png(DIMENSOES)
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+
+
+def test_mesmos_scores_reaproveitam_png():
+    primeiro = report_charts.render_bar_png(DIMENSOES)
+    renders = report_charts.stats()["renders"]
+    segundo = report_charts.render_bar_png(DIMENSOES)
+    assert segundo is primeiro
+    assert report_charts.stats()["renders"] == renders
+
+
+def test_scores_diferentes_geram_novo_png_no_mesmo_template():
+    a = report_charts.render_radar_png(CATEGORIAS)
+    outros = {k: dict(v, avg=v["avg"] + 0.25) for k, v in CATEGORIAS.items()}
+    b = report_charts.render_radar_png(outros)
+    assert a != b
+    assert ("radar", tuple(CATEGORIAS)) in report_charts._templates
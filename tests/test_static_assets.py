@@ -0,0 +1,92 @@
+"""
+Testes das paginas e assets pre-carregados com URLs versionadas pelo conteudo.
+"""
+import gzip
+import re
+
+import pytest
+
+from static_assets import AssetRegistry, ASSET_CACHE_CONTROL
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "css" / "base").mkdir(parents=True)
+    (tmp_path / "js").mkdir()
+    (tmp_path / "img").mkdir()
+    (tmp_path / "css" / "base" / "vars.css").write_text(":root { --cor: #000; }")
+    (tmp_path / "css" / "styles.css").write_text(
+        '@import "base/vars.css";\n@import url("https://fonts.example.com/x.css");\n'
+        "body { background: url('/static/img/fundo.png'); }"
+    )
+    (tmp_path / "js" / "app.js").write_text("console.log('ok');")
+    (tmp_path / "img" / "fundo.png").write_bytes(b"\x89PNG fake")
+    (tmp_path / "index.html").write_text(
+        '<link rel="stylesheet" href="/static/css/styles.css">'
+        '<script src="/static/js/app.js?v=2"></script>'
+        '<img src="/static/img/inexistente.png">'
+    )
+    return tmp_path
+
+
+def test_html_reescrito_com_hash(static_dir):
+    reg = AssetRegistry(static_dir)
+    html = reg.page("index.html").body.decode()
+    assert f'href="{reg.url_for("css/styles.css")}"' in html
+    assert f'src="{reg.url_for("js/app.js")}"' in html
+    assert 'src="/static/img/inexistente.png"' in html
+
+
+def test_css_importado_e_url_reescritos(static_dir):
+    reg = AssetRegistry(static_dir)
+    css = reg.asset(reg.url_for("css/styles.css").split("/")[2], "css/styles.css")[0].body.decode()
+    assert reg.url_for("css/base/vars.css") in css
+    assert reg.url_for("img/fundo.png") in css
+    assert "https://fonts.example.com/x.css" in css
+
+
+def test_mudanca_em_css_importado_muda_hash_de_quem_importa(static_dir):
+    antes = AssetRegistry(static_dir).url_for("css/styles.css")
+    (static_dir / "css" / "base" / "vars.css").write_text(":root { --cor: #fff; }")
+    depois = AssetRegistry(static_dir).url_for("css/styles.css")
+    assert antes != depois
+
+
+def test_png_nao_recomprimido(static_dir):
+    reg = AssetRegistry(static_dir)
+    digest = reg.url_for("img/fundo.png").split("/")[2]
+    payload, _ = reg.asset(digest, "img/fundo.png")
+    assert payload.gzip_body is None
+    css_payload, _ = reg.asset(reg.url_for("css/styles.css").split("/")[2], "css/styles.css")
+    assert gzip.decompress(css_payload.gzip_body) == css_payload.body
+
+
+class TestAssetRoutes:
+    """Rotas das paginas e de /assets na aplicacao."""
+
+    def test_asset_imutavel_e_comprimido(self, client):
+        html = client.get("/admin").text
+        url = re.search(r'href="(/assets/[^"]+styles\.css)"', html).group(1)
+        r = client.get(url)
+        assert r.status_code == 200
+        assert r.headers["cache-control"] == ASSET_CACHE_CONTROL
+        assert r.headers["content-encoding"] == "gzip"
+        assert r.headers["content-type"].startswith("text/css")
+
+    def test_hash_antigo_serve_sem_cache_imutavel(self, client):
+        r = client.get("/assets/000000000000/css/styles.css")
+        assert r.status_code == 200
+        assert r.headers["cache-control"] == "no-cache"
+
+    def test_asset_inexistente_404(self, client):
+        assert client.get("/assets/000000000000/css/nao_existe.css").status_code == 404
+
+    def test_pagina_revalida_com_etag(self, client):
+        r = client.get("/")
+        assert r.status_code == 200
+        assert r.headers["cache-control"] == "no-cache"
+        r2 = client.get("/", headers={"If-None-Match": r.headers["etag"]})
+        assert r2.status_code == 304
+
+    def test_static_legado_continua_servido(self, client):
+        assert client.get("/static/js/survey.js").status_code == 200